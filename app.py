@@ -4,9 +4,14 @@ import webview
 import uvicorn
 
 from main import app
+from app.settings import load_app_settings
 
 # 启动服务
-t = threading.Thread(target=uvicorn.run, args=(app,), kwargs={"host": "127.0.0.1", "port": 8000})
+t = threading.Thread(target=uvicorn.run, args=(app,), kwargs={
+    "host": "127.0.0.1",
+    "port": 8000,
+    "ws_per_message_deflate": load_app_settings().WEBSOCKET.PER_MESSAGE_DEFLATE,
+})
 t.daemon = True
 t.start()
 
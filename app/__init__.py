@@ -1,4 +1,5 @@
 # 导入系统库
+import asyncio
 import json
 import os.path
 
@@ -8,10 +9,17 @@ from loguru import logger
 
 # 导入自定义库
 # from app.apis import router
-from app.models import Config
+from app.models import Config, Result, RollupDay, Summary
 from app.middlewares import add_cors_middleware
 from app.settings import Settings, load_app_settings, DB_STORE_DIR, LOG_STORE_DIR
-from app.extensions import generate_tables, SessionLocal
+from app.extensions import generate_tables, SessionLocal, engine, config, get_image_store, get_image_encoder, \
+    get_broadcast_hub, get_export_jobs, get_summary_aggregator, get_rollup_rebuilder, get_duplicate_detector, \
+    get_retention_manager
+from app.services.database.migrations import ResultMigration
+from app.services.database.sno_index import ensure_sno_index
+from app.services.database.counters import ensure_result_counter
+from app.services.database.rollups import ensure_rollups
+from app.services.log.log_sink import setup_logging, flush_logs
 
 
 def create_app() -> FastAPI:
@@ -27,27 +35,73 @@ def create_app() -> FastAPI:
     init_dirs()
     register_middlewares(app, settings)
     register_databases()
+    register_events(app)
+    register_metrics()
 
     return app
 
 
 def register_logger(sett: Settings):
-    logger.remove()
-    logger.add(sink=sett.LOGGING.LOG_NAME, rotation="50 MB", retention=sett.LOGGING.RETENTION, level=sett.LOGGING.LEVEL)
+    setup_logging(
+        level=sett.LOGGING.LEVEL,
+        fmt=sett.LOGGING.FORMAT,
+        path=sett.LOGGING.LOG_NAME,
+        module_levels=sett.LOGGING.MODULE_LEVELS,
+        enqueue=sett.LOGGING.ENQUEUE,
+        queue_size=sett.LOGGING.QUEUE_SIZE,
+        json_format=sett.LOGGING.JSON,
+        max_bytes=sett.LOGGING.ROTATION,
+        backup_count=sett.LOGGING.RETENTION,
+        backtrace=sett.LOGGING.TRACEBACK,
+        diagnose=sett.LOGGING.DIAGNOSE,
+        rate_limit_interval=sett.LOGGING.RATE_LIMIT_INTERVAL,
+        rate_limit_burst=sett.LOGGING.RATE_LIMIT_BURST,
+    )
 
 def register_router(app: FastAPI, sett: Settings):
     from app.apis.ws_ctrl_api import router as router_ws
     from app.apis.config_ctrl_api import router as router_config
     from app.apis.data_ctrl_api import router as router_data
+    from app.apis.metrics_api import router as router_metrics
     app.include_router(router_ws, prefix=sett.APP.GLOBAL_API_PREFIX)
     app.include_router(router_config, prefix=sett.APP.GLOBAL_API_PREFIX + '/config')
     app.include_router(router_data, prefix=sett.APP.GLOBAL_API_PREFIX + '/money')
+    app.include_router(router_metrics, prefix=sett.APP.GLOBAL_API_PREFIX)
 
 
 def register_middlewares(app: FastAPI, sett: Settings):
     add_cors_middleware(app, sett)
 
 
+def register_events(app: FastAPI):
+    from app.cores.serial_ctrl import db_writer
+    from app.cores.device_manager import device_manager
+    from app.services.serial.serial_transport import serial_loop
+    # 启动后绑定事件循环，接收线程的消息直接投递给websocket发送任务
+    app.add_event_handler('startup', bind_broadcast_hub)
+    # 退出前停止后台归档和所有设备，写入尚未入库的数据，再关闭图像仓库
+    app.add_event_handler('shutdown', get_retention_manager().stop)
+    app.add_event_handler('shutdown', device_manager.stop_all)
+    app.add_event_handler('shutdown', serial_loop.stop)
+    app.add_event_handler('shutdown', db_writer.stop)
+    app.add_event_handler('shutdown', get_summary_aggregator().stop)
+    app.add_event_handler('shutdown', get_duplicate_detector().stop)
+    app.add_event_handler('shutdown', get_image_store().close)
+    app.add_event_handler('shutdown', get_image_encoder().close)
+    app.add_event_handler('shutdown', get_export_jobs().close)
+    # 最后写入队列中剩余的日志
+    app.add_event_handler('shutdown', flush_logs)
+
+
+def register_metrics():
+    from app.cores.metrics import register_metrics as register_pipeline_metrics
+    register_pipeline_metrics()
+
+
+async def bind_broadcast_hub():
+    get_broadcast_hub().bind(asyncio.get_running_loop())
+
+
 def init_setting():
     base_settings = {
         'port': '',
@@ -75,8 +129,66 @@ def init_setting():
 
 
 def register_databases():
+    # 旧版本数据表在建表前重命名，建表后在后台迁移
+    migration = ResultMigration(engine, Result, on_finished=rebuild_summary)
+    migration.prepare()
     generate_tables()
+    init_image_store()
+    ensure_sno_index(engine)
+    ensure_result_counter(engine)
+    # 预汇总表为空而已有点钞记录时（升级后首次启动）在后台重新统计
+    if ensure_rollups(engine):
+        get_rollup_rebuilder().request()
+    migration.start()
     init_setting()
+    init_summary()
+    init_duplicates()
+    if config.RETENTION.ENABLED:
+        get_retention_manager().start()
+
+
+# 启动时打开图像仓库（创建仓库目录），导入模块时不创建目录
+def init_image_store():
+    store = get_image_store()
+    logger.info(f"image store opened: {store.config.base_dir}")
+
+
+# 加载点钞汇总；汇总表为空而已有点钞记录时（升级后首次启动）从点钞记录重新统计
+def init_summary():
+    aggregator = get_summary_aggregator()
+    with SessionLocal() as db:
+        if db.query(Summary.level).first() is None and db.query(Result.id).first() is not None:
+            aggregator.rebuild(db, Result, floor=get_retention_manager().floor(), rollup_model=RollupDay)
+        else:
+            aggregator.load(db)
+
+
+# 加载冠字号重复检测的状态文件并加入之后的点钞记录；没有状态文件时从全部点钞记录建立
+def init_duplicates():
+    if not config.DUPLICATE.ENABLED:
+        return
+    detector = get_duplicate_detector()
+    loaded = detector.load()
+    with SessionLocal() as db:
+        if loaded:
+            detector.warm(db)
+        else:
+            detector.rebuild(db)
+    detector.save()
+    detector.start()
+
+
+# 旧数据迁移完成后重新统计汇总和预汇总表，重新建立冠字号索引（迁移的记录id在水位之前）
+def rebuild_summary():
+    from app.cores.serial_ctrl import db_writer
+    with SessionLocal() as db:
+        # 统计期间暂停入库提交，已提交的纸币只计一次
+        # 已归档月份的记录不在result表中，从按天预汇总表统计
+        get_summary_aggregator().rebuild(db, Result, pause=db_writer.paused, floor=get_retention_manager().floor(),
+                                         rollup_model=RollupDay)
+        if config.DUPLICATE.ENABLED:
+            get_duplicate_detector().rebuild(db)
+    get_rollup_rebuilder().request()
 
 
 def init_dirs():
@@ -1,11 +1,13 @@
 # 导入第三方库
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Path, Request
 
 # 导入自定义库
 from app.extensions import get_rdbms
 from app.schemas.money import SearchSchema
-from app.cores.money import getMoneyPages, deleteMoney, deleteAllMoney, searchMoney, exportMoney
+from app.cores.money import getMoneyPages, getMoneyImage, getImageBlob, deleteMoney, deleteAllMoney, searchMoney, getMoneyStats, \
+    getMoneyReport, getPartitions, runRetention
+from app.cores.export import exportMoney, getExportFormats, getExportJobs, getExportJob, downloadExport
 
 # 定义全局变量
 router = APIRouter()
@@ -17,8 +19,46 @@ def search(data: SearchSchema, db: Session = Depends(get_rdbms)):
 
 
 @router.get('/pages', status_code=200, description='分页获取所有点钞记录')
-def pages(skip: int = Query(0, ge=0), limit: int = Query(10, gt=0), db: Session = Depends(get_rdbms)):
-    return getMoneyPages(skip, limit, db)
+def pages(skip: int = Query(0, ge=0), limit: int = Query(10, gt=0), after: int = Query(None, ge=0), db: Session = Depends(get_rdbms)):
+    return getMoneyPages(skip, limit, db, after)
+
+
+@router.get('/stats', status_code=200, description='点钞汇总：level为session、day、machine，scope为会话id、日期或机具编号（day默认当天，其他默认全部）')
+def stats(level: str = Query('day'), scope: str = Query(None)):
+    return getMoneyStats(level, scope)
+
+
+@router.get('/report', status_code=200, description='历史统计报表：时间段[start, end)，interval为minute、hour、day（为空时合计），group_by为逗号分隔的machine_number、money_flag、valuta、tf_flag')
+def report(start: str = Query(...), end: str = Query(...), interval: str = Query(None), group_by: str = Query(None),
+           machine_number: str = Query(None), money_flag: str = Query(None), valuta: int = Query(None),
+           tf_flag: int = Query(None), db: Session = Depends(get_rdbms)):
+    filters = {'machine_number': machine_number, 'money_flag': money_flag, 'valuta': valuta, 'tf_flag': tf_flag}
+    return getMoneyReport(db, start, end, interval, group_by, filters)
+
+
+@router.get('/partitions', status_code=200, description='归档分区信息：result表的记录数、各月归档分区及最近一次归档的结果')
+def partitions(db: Session = Depends(get_rdbms)):
+    return getPartitions(db)
+
+
+@router.post('/retention/run', status_code=200, description='立即在后台执行一次过期清理、归档和压缩')
+def retention_run():
+    return runRetention()
+
+
+@router.get('/image/blob/{ref}', status_code=200, description='按哈希获取点钞图像（PNG）')
+def image_blob(request: Request, ref: str = Path(pattern='^[0-9a-f]{32}$'), db: Session = Depends(get_rdbms)):
+    return getImageBlob(ref, request, db)
+
+
+@router.get('/image/{id}', status_code=200, description='获取点钞记录的图像（PNG）')
+def image(id: int, request: Request, db: Session = Depends(get_rdbms)):
+    return getMoneyImage(id, request, db)
+
+
+@router.delete('/delete/all', status_code=200, description='删除所有点钞记录（后台任务，返回任务信息）')
+def delete_all_money(db: Session = Depends(get_rdbms)):
+    return deleteAllMoney(db)
 
 
 @router.delete('/delete/{id}', status_code=200, description='删除点钞记录')
@@ -26,11 +66,26 @@ def delete_money(id: int, db: Session = Depends(get_rdbms)):
     return deleteMoney(id, db)
 
 
-@router.delete('/delete/all', status_code=200, description='删除所有点钞记录')
-def delete_money(db: Session = Depends(get_rdbms)):
-    return deleteAllMoney(db)
+@router.post('/export', status_code=200, description='导出搜索出的点钞记录（后台任务，进度通过websocket的export_progress消息推送），格式：excel、csv、ndjson、parquet、fsn')
+def export(data:SearchSchema, format: str = Query('excel')):
+    return exportMoney(data, format)
+
+
+@router.get('/export/formats', status_code=200, description='获取可用的导出格式')
+def export_formats():
+    return getExportFormats()
+
+
+@router.get('/export/jobs', status_code=200, description='获取导出任务列表')
+def export_jobs():
+    return getExportJobs()
+
+
+@router.get('/export/{job_id}', status_code=200, description='获取导出任务状态')
+def export_job(job_id: str):
+    return getExportJob(job_id)
 
 
-@router.post('/export', status_code=200, description='导出搜索出的点钞记录')
-def export(data:SearchSchema, db: Session = Depends(get_rdbms)):
-    return exportMoney(data, db)
\ No newline at end of file
+@router.get('/export/{job_id}/download', status_code=200, description='下载导出文件')
+def export_download(job_id: str):
+    return downloadExport(job_id)
\ No newline at end of file
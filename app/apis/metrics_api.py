@@ -0,0 +1,24 @@
+# 导入系统库
+
+# 导入第三方库
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+# 导入自定义库
+from app.cores.metrics import render_metrics, build_stats_message
+
+# 定义全局变量
+router = APIRouter()
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# 获取指标（Prometheus文本格式），在事件循环中执行，读取连接状态时不会与推送任务并发
+@router.get("/metrics", description='获取采集链路指标（Prometheus格式）', response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# 获取指标（JSON格式，与websocket的stats消息一致）
+@router.get("/metrics/json", description='获取采集链路指标（JSON格式）')
+async def get_metrics_json():
+    return build_stats_message()["data"]
@@ -1,59 +1,90 @@
 # 导入系统库
 import asyncio
 import json
-import threading
 
 # 导入第三方库
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, WebSocketException, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, WebSocketException, Depends, status
 from loguru import logger
 from sqlalchemy.orm import Session
 
 # 导入自定义库
-from app.extensions import get_ws_manager, get_rdbms, WebSocketManager
-from app.cores.serial_ctrl import message_queue, SerialController
+from app.extensions import get_ws_manager, get_rdbms, get_image_encoder
+from app.cores.device_manager import device_manager
+from app.cores.metrics import build_stats_message
+from app.services.websocket.websocket_manager import WebSocketManager, WebSocketClient, POLICIES
+from app.services.websocket.message_codec import encode_notes, note_to_json
+from app.settings import load_app_settings
 
 # 定义全局变量
 router = APIRouter()
-
-total_count = 0
+settings = load_app_settings()
 
 # 定义websocket端点
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, ws_manager: WebSocketManager = Depends(get_ws_manager), db: Session = Depends(get_rdbms)):
+    # 连接参数policy无效时拒绝连接
+    policy = websocket.query_params.get("policy")
+    if policy is not None and policy not in POLICIES:
+        logger.warning(f"reject websocket: unknown slow consumer policy: {policy}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=f"unknown policy: {policy}")
+        return
+    send_task = None
+    stats_task = None
+    client = None
     try:
         logger.info(f"ready to connect websocket: {websocket}")
-        # 建立连接
-        await ws_manager.connect(websocket)
+        # 建立连接（每个连接独立订阅串口数据）
+        client = await ws_manager.connect(websocket, policy)
 
-        # 创建异步任务：接受串口数据并推送给前端 TODO:将该异步任务放置线程中去执行
-        asyncio.create_task(send_serial_data(websocket))
+        # 创建异步任务：推送串口数据给前端（连接参数可选择格式和是否合并发送）
+        batch = websocket.query_params.get("batch", str(int(settings.WEBSOCKET.BATCH))) in ("1", "true")
+        binary = websocket.query_params.get("format", settings.WEBSOCKET.FORMAT) == "binary"
+        send_task = asyncio.create_task(send_serial_data(client, batch, binary))
+        # 连接参数stats：按指定间隔（秒）推送stats消息
+        if "stats" in websocket.query_params:
+            stats_task = asyncio.create_task(send_stats(client, parse_stats_interval(websocket.query_params["stats"])))
 
         # 处理客户端请求
-        await handle_client_request(websocket, db)
+        await handle_client_request(websocket, db, client.id)
     except Exception as e:
         logger.error(f"websocket error: {str(e)}, websocket: {websocket}")
     finally:
         logger.info(f"ready to disconnect websocket: {websocket}")
-        await ws_manager.disconnect()
+        if send_task:
+            send_task.cancel()
+        if stats_task:
+            stats_task.cancel()
+        if client:
+            # 停止本连接启动的设备
+            await asyncio.to_thread(device_manager.stop_all, client.id)
+            await ws_manager.disconnect(client)
+
+
+# 获取各设备的采集状态
+@router.get("/devices", description='获取设备采集状态')
+def devices():
+    return {"data": device_manager.stats(), "total": len(device_manager.sessions)}
+
+
+# 获取各websocket连接的发送情况（积压、丢弃、延迟）
+@router.get("/ws/clients", description='获取websocket连接状态')
+def websocket_clients(ws_manager: WebSocketManager = Depends(get_ws_manager)):
+    return {"data": ws_manager.stats(), "total": len(ws_manager.clients)}
 
 
 # 定义task： 接受串口数据并推送给前端
-async def send_serial_data(websocket: WebSocket):
+async def send_serial_data(client: WebSocketClient, batch: bool = False, binary: bool = False):
+    websocket = client.websocket
     try:
         logger.debug("entry send serial data")
-        global total_count
         while True:
-            if not message_queue.empty():
-                # 打印队列长度
-                logger.debug(f"queue length: {message_queue.qsize()}")
-                message = message_queue.get()
-                # 推送给前端
-                await websocket.send_json(message)
-                total_count += 1
-                logger.info(f"send serial data to front: {total_count}")
-                # logger.debug(f"send serial data to front: {message}")
-                # 等待0.1秒
-            await asyncio.sleep(0.01)
+            # 等待消息到达，并取出已到达的其余消息
+            messages = await client.get_batch(settings.WEBSOCKET.MAX_BATCH)
+            # 推送给前端
+            if binary:
+                await send_binary_messages(websocket, messages, batch)
+            else:
+                await send_json_messages(websocket, messages, batch)
     except WebSocketDisconnect as e:
         logger.warning("websocket has disconnected!")
         return
@@ -64,12 +95,64 @@ async def send_serial_data(websocket: WebSocket):
         logger.error(f"run time error: {str(e)}")
         return
 
+
+# 定义task：定时推送采集链路指标（放入连接的缓冲区，与点钞数据一起按顺序发送）
+async def send_stats(client: WebSocketClient, interval: float):
+    while True:
+        client.push(build_stats_message())
+        await asyncio.sleep(interval)
+
+
+def parse_stats_interval(value: str) -> float:
+    try:
+        interval = float(value)
+    except ValueError:
+        interval = settings.METRICS.STATS_INTERVAL
+    return max(interval, settings.METRICS.MIN_STATS_INTERVAL)
+
+
+# JSON格式：batch为True时多条消息合并为一条batch消息
+async def send_json_messages(websocket: WebSocket, messages: list, batch: bool):
+    messages = [await to_json_message(message) for message in messages]
+    if batch and len(messages) > 1:
+        await websocket.send_json({"type": "batch", "data": messages})
+    else:
+        for message in messages:
+            await websocket.send_json(message)
+
+
+# 二进制格式：batch为True时连续的点钞数据编码为一个二进制帧，其他消息仍以JSON发送
+async def send_binary_messages(websocket: WebSocket, messages: list, batch: bool):
+    notes = []
+    for message in messages:
+        if message.get("type") == "serial_data":
+            notes.append(message)
+            if not batch:
+                await websocket.send_bytes(encode_notes(notes))
+                notes = []
+            continue
+        if notes:
+            await websocket.send_bytes(encode_notes(notes))
+            notes = []
+        await websocket.send_json(message)
+    if notes:
+        await websocket.send_bytes(encode_notes(notes))
+
+
+# 点钞数据转换为JSON格式，原始像素在编码线程池中编码为image_data
+# 同一条消息会分发给所有连接，这里返回新的消息，不修改原消息
+async def to_json_message(message: dict) -> dict:
+    if message.get("type") != "serial_data":
+        return message
+    data = message["data"]
+    image_data = await get_image_encoder().encode_base64_async(data["image"]) if data.get("image") else None
+    return {**message, "data": note_to_json(data, image_data)}
+
+
 # 定义task：处理前端请求
-async def handle_client_request(websocket: WebSocket, db: Session):
+async def handle_client_request(websocket: WebSocket, db: Session, client_id: int = None):
     try:
         logger.debug("entry handle client request")
-        # 创建串口控制器
-        serial_ctrl = SerialController(db)
         message = ""
 
         while True:
@@ -87,37 +170,52 @@ async def handle_client_request(websocket: WebSocket, db: Session):
             cmd = await websocket.receive_json()
             logger.info(f"front request: {cmd}")
 
-            # 处理前端start请求
+            # 处理前端start请求（每个串口启动一台设备，可以同时启动多台）
             if cmd["cmd"] == "start":
                 logger.info("handle front request: start")
-                serial_ctrl.set_serial_param(cmd["param"])
-                if not serial_ctrl.open_connection():
+                ok, detail = await asyncio.to_thread(device_manager.start, cmd["param"], client_id)
+                if not ok:
                     message = {
                         "type": "error",
-                        "data": "serial connect failed"
+                        "device": cmd["param"].get("port"),
+                        "data": detail
                     }
                     logger.warning(message)
                     await websocket.send_json(message)
                     continue
-                recv_thread = threading.Thread(target=serial_ctrl.recv_and_save_data, daemon=True)
-                recv_thread.start()
                 message = {
                     "type": "notification",
+                    "device": cmd["param"].get("port"),
                     "data": "serial connect successfully"
                 }
                 await websocket.send_json(message)
                 logger.info("handle front request: start successfully")
                 
-            # 处理前端stop请求
+            # 处理前端stop请求（指定port时只停止该设备，否则停止本连接启动的全部设备）
             elif cmd["cmd"] == "stop":
                 logger.info("handle front request: stop")
-                serial_ctrl.close_connection()
+                port = (cmd.get("param") or {}).get("port")
+                if port:
+                    await asyncio.to_thread(device_manager.stop, port)
+                else:
+                    await asyncio.to_thread(device_manager.stop_all, client_id)
                 message = {
                     "type": "notification",
+                    "device": port,
                     "data": "serial close successfully"
                 }
                 await websocket.send_json(message)
                 logger.info("handle front request: stop successfully")
+            # 查询设备状态
+            elif cmd["cmd"] == "devices":
+                message = {
+                    "type": "devices",
+                    "data": device_manager.stats()
+                }
+                await websocket.send_json(message)
+            # 查询采集链路指标
+            elif cmd["cmd"] == "stats":
+                await websocket.send_json(build_stats_message())
             # 处理心跳
             elif cmd["cmd"] == "heart":
                 logger.debug("handle front request: heart")
@@ -137,13 +235,10 @@ async def handle_client_request(websocket: WebSocket, db: Session):
                 await websocket.send_json(message)
     except WebSocketDisconnect as e:
         logger.info("websocket has disconnected!")
-        serial_ctrl.close_connection()
         return
     except WebSocketException as e:
         logger.info("websocket exception")
-        serial_ctrl.close_connection()
         return
     except RuntimeError as e:
-        serial_ctrl.close_connection()
         logger.error(f"run time error: {str(e)}")
-        return
\ No newline at end of file
+        return
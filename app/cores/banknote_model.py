@@ -1,6 +1,7 @@
+import struct
 from typing import NewType
 from dataclasses import dataclass
-from datetime import date
+from datetime import date as date_type
 
 # 定义类型别名增强可读性
 UInt16 = NewType('UInt16', int)
@@ -15,6 +16,13 @@ CURRENCY_MAP = {
     'RUB': '卢布', 'KRW': '韩元'
 }
 
+# 纸币信息结构（协议位置8-1651，共1644字节），模块加载时预编译
+BANKNOTE_STRUCT = struct.Struct('<HHHIH4HHHH12H24HH4H1536s')
+BANKNOTE_OFFSET = 2  # 帧消息体中纸币信息的偏移（跳过2字节模式标志）
+VALID_CURRENCY_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+# 冠字号码字符表：只保留字母和数字，其余字符用空格代替
+_SNO_CHARS = tuple(chr(c) if chr(c).isascii() and chr(c).isalnum() else ' ' for c in range(128))
+
 @dataclass
 class TImageSNo:
     undefine: list[Int16]  # 4个Int16（协议明确要求）
@@ -37,14 +45,14 @@ class BanknoteInfo:
     image_sno: TImageSNo          # 图像数据（位置108-1643）
 
     @property
-    def parsed_date(self) -> date:
+    def parsed_date(self) -> date_type:
         """解析日期字段（UInt16）为实际日期"""
         # 协议公式：Date = ((Year-1980)<<9) + (Month<<5) + Day
         encoded = self.date
         year = (encoded >> 9) + 1980
         month = (encoded >> 5) & 0b1111
         day = encoded & 0b11111
-        return date(year, month, day)
+        return date_type(year, month, day)
     
     @property
     def parsed_time(self) -> tuple[int, int, int]:
@@ -71,7 +79,177 @@ class BanknoteInfo:
 
     def __post_init__(self):
         # 验证币种标志
-        valid_chars = set(chr(c) for c in range(65, 91))  # A-Z
         for c in self.currency_code:
-            if c not in valid_chars:
-                raise ValueError(f"无效币种字符: {c}") 
\ No newline at end of file
+            if c not in VALID_CURRENCY_CHARS:
+                raise ValueError(f"无效币种字符: {c}")
+
+
+
+class BanknoteRecord:
+    """
+    紧凑的纸币信息记录
+    只保存unpack_from得到的字段元组，日期、时间、币种和冠字号码等在首次访问时解析并缓存
+    """
+    __slots__ = ('fields', '_parsed_date', '_parsed_time', '_currency_code', '_serial_number', '_machine_number_text')
+
+    def __init__(self, fields: tuple):
+        self.fields = fields
+        self._parsed_date = None
+        self._parsed_time = None
+        self._currency_code = None
+        self._serial_number = None
+        self._machine_number_text = None
+
+    # 原始字段
+    @property
+    def date(self) -> UInt16:
+        return self.fields[0]
+
+    @property
+    def time(self) -> UInt16:
+        return self.fields[1]
+
+    @property
+    def tf_flag(self) -> UInt16:
+        return self.fields[2]
+
+    @property
+    def valuta(self) -> UInt32:
+        return self.fields[3]
+
+    @property
+    def fsn_count(self) -> UInt16:
+        return self.fields[4]
+
+    @property
+    def money_flag(self) -> tuple[UInt16, ...]:
+        return self.fields[5:9]
+
+    @property
+    def ver(self) -> UInt16:
+        return self.fields[9]
+
+    @property
+    def undefine(self) -> UInt16:
+        return self.fields[10]
+
+    @property
+    def char_num(self) -> UInt16:
+        return self.fields[11]
+
+    @property
+    def sno(self) -> tuple[UInt16, ...]:
+        return self.fields[12:24]
+
+    @property
+    def machine_number(self) -> tuple[UInt16, ...]:
+        return self.fields[24:48]
+
+    @property
+    def reserve1(self) -> UInt16:
+        return self.fields[48]
+
+    @property
+    def image_undefine(self) -> tuple[Int16, ...]:
+        return self.fields[49:53]
+
+    @property
+    def image(self) -> bytes:
+        """96*16的8位灰度图像原始数据"""
+        return self.fields[53]
+
+    # 解析字段（惰性计算并缓存）
+    @property
+    def parsed_date(self) -> date_type:
+        """解析日期字段（UInt16）为实际日期"""
+        if self._parsed_date is None:
+            # 协议公式：Date = ((Year-1980)<<9) + (Month<<5) + Day
+            encoded = self.fields[0]
+            self._parsed_date = date_type((encoded >> 9) + 1980, (encoded >> 5) & 0b1111, encoded & 0b11111)
+        return self._parsed_date
+
+    @property
+    def parsed_time(self) -> tuple[int, int, int]:
+        """解析时间字段（UInt16）为时分秒"""
+        if self._parsed_time is None:
+            # 协议公式：Time = (Hour<<11) + (Minute<<5) + Second//2
+            encoded = self.fields[1]
+            self._parsed_time = (encoded >> 11, (encoded >> 5) & 0b111111, (encoded & 0b11111) * 2)
+        return self._parsed_time
+
+    @property
+    def currency_code(self) -> str:
+        """解析币种标志为3-4位字母代码"""
+        if self._currency_code is None:
+            self._currency_code = ''.join(chr(c) for c in self.fields[5:9] if c != 0).strip().upper()
+        return self._currency_code
+
+    @property
+    def parsed_currency(self) -> str:
+        """获取币种中文名称"""
+        code = self.currency_code
+        return CURRENCY_MAP.get(code, f"未知币种({code})")
+
+    @property
+    def serial_number(self) -> str:
+        """冠字号码字符串（非字母数字字符替换为空格）"""
+        if self._serial_number is None:
+            self._serial_number = ''.join(_SNO_CHARS[c] if c < 128 else ' ' for c in self.fields[12:24])
+        return self._serial_number
+
+    @property
+    def machine_number_text(self) -> str:
+        """机具编号字符串"""
+        if self._machine_number_text is None:
+            self._machine_number_text = ''.join(chr(c) for c in self.fields[24:48])
+        return self._machine_number_text
+
+    def validate(self):
+        """验证币种标志"""
+        code = self.currency_code
+        if not VALID_CURRENCY_CHARS.issuperset(code):
+            invalid = next(c for c in code if c not in VALID_CURRENCY_CHARS)
+            raise ValueError(f"无效币种字符: {invalid}")
+
+
+def decode_banknote(buffer, offset: int = BANKNOTE_OFFSET) -> BanknoteRecord:
+    """
+    从帧消息体中解析纸币信息
+    :param buffer: 支持缓冲区协议的对象（bytes、bytearray、memoryview）
+    :param offset: 纸币信息在buffer中的偏移
+    :return: 纸币信息记录
+    :raises struct.error: 数据长度不足
+    :raises ValueError: 币种标志无效
+    """
+    record = BanknoteRecord(BANKNOTE_STRUCT.unpack_from(buffer, offset))
+    record.validate()
+    return record
+
+
+def encode_banknote(note_date, note_time, tf_flag: int, valuta: int, fsn_count: int, money_flag: str, ver: int,
+                    undefine: int, char_num: int, sno: str, machine_number: str, reserve1: int,
+                    image: bytes = b'') -> bytes:
+    """
+    将纸币信息编码为协议中的纸币信息结构（1644字节），与decode_banknote互逆
+    :param note_date: 验钞日期（date），为None时编码为0
+    :param note_time: 验钞时间（time），为None时编码为0
+    :param image: 96*16的8位灰度原始像素，不足时补0
+    """
+    encoded_date = ((note_date.year - 1980) << 9) + (note_date.month << 5) + note_date.day if note_date else 0
+    encoded_time = (note_time.hour << 11) + (note_time.minute << 5) + note_time.second // 2 if note_time else 0
+    return BANKNOTE_STRUCT.pack(
+        encoded_date,
+        encoded_time,
+        tf_flag or 0,
+        valuta or 0,
+        fsn_count or 0,
+        *(ord(c) & 0xFFFF for c in (money_flag or '')[:4].ljust(4, '\x00')),
+        ver or 0,
+        undefine or 0,
+        char_num or 0,
+        *(ord(c) & 0xFFFF for c in (sno or '')[:12].ljust(12, '\x00')),
+        *(ord(c) & 0xFFFF for c in (machine_number or '')[:24].ljust(24, '\x00')),
+        reserve1 or 0,
+        0, 0, 0, 0,
+        image or b'',
+    )
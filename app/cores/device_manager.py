@@ -0,0 +1,125 @@
+# 导入系统库
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 导入第三方库
+from loguru import logger
+
+# 导入自定义库
+from app.cores.serial_ctrl import SerialController
+from app.settings import load_app_settings
+
+# 定义全局变量
+settings = load_app_settings()
+
+
+@dataclass
+class DeviceSession:
+    """一台设备的采集会话"""
+    controller: SerialController
+    thread: Optional[threading.Thread] = None  # 接收线程（asyncio模式下为None）
+    owner: Optional[int] = None     # 启动该设备的websocket连接id
+    started_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def running(self) -> bool:
+        if self.thread is not None:
+            return self.thread.is_alive()
+        return self.controller.running
+
+
+# 定义设备管理器
+class DeviceManager:
+    '''
+    功能：同时管理多台点钞设备（每个串口一台）
+        1. 每台设备有独立的串口控制器（帧解析状态、计数、错误提示相互独立），
+           按配置在独立的接收线程中或在共用的串口事件循环中接收数据
+        2. 所有设备的数据带设备标识推送到同一个消息广播中心，并写入共用的批量入库线程
+    '''
+    def __init__(self, max_devices: int = 8, transport: str = 'thread'):
+        if transport not in ('thread', 'asyncio'):
+            raise ValueError(f"unknown serial transport: {transport}")
+        self.max_devices = max_devices
+        self.transport = transport
+        self.sessions: Dict[str, DeviceSession] = {}
+        self._lock = threading.Lock()
+
+    # 启动设备采集
+    def start(self, serial_param: dict, owner: Optional[int] = None) -> Tuple[bool, str]:
+        port = serial_param.get("port")
+        if not port:
+            return False, "serial port is required"
+        with self._lock:
+            self._remove_stopped()
+            if port in self.sessions:
+                return False, f"device {port} is already started"
+            if len(self.sessions) >= self.max_devices:
+                return False, f"too many devices: {len(self.sessions)}/{self.max_devices}"
+
+            controller = SerialController(data_source=settings.DATA_SOURCE.REAL_OR_TEST, device=port)
+            controller.set_serial_param(serial_param)
+            if not controller.open_connection():
+                return False, f"serial connect failed: {port}"
+            if self.transport == 'asyncio':
+                controller.start_async()
+                self.sessions[port] = DeviceSession(controller, None, owner)
+            else:
+                thread = threading.Thread(target=controller.recv_and_save_data, name=f"serial-{port}", daemon=True)
+                self.sessions[port] = DeviceSession(controller, thread, owner)
+                thread.start()
+        logger.info(f"device started: {port}, devices: {len(self.sessions)}")
+        return True, f"serial connect successfully: {port}"
+
+    # 停止设备采集
+    def stop(self, port: str) -> bool:
+        with self._lock:
+            session = self.sessions.pop(port, None)
+        if session is None:
+            return False
+        session.controller.close_connection()
+        # 读取已被唤醒，等待接收线程退出，避免重复启动时残留线程
+        if session.thread is not None:
+            session.thread.join(timeout=settings.SERIAL.READ_TIMEOUT + 1)
+            if session.thread.is_alive():
+                logger.warning(f"recv thread of {port} did not stop in time")
+        logger.info(f"device stopped: {port}, devices: {len(self.sessions)}")
+        return True
+
+    # 停止某个连接启动的全部设备（owner为None时停止所有设备）
+    def stop_all(self, owner: Optional[int] = None) -> List[str]:
+        with self._lock:
+            ports = [port for port, session in self.sessions.items() if owner is None or session.owner == owner]
+        for port in ports:
+            self.stop(port)
+        return ports
+
+    # 移除接收线程已退出的设备（如串口被拔出）
+    def _remove_stopped(self):
+        for port in [port for port, session in self.sessions.items() if not session.running]:
+            logger.info(f"remove stopped device: {port}")
+            self.sessions.pop(port).controller.close_connection()
+
+    # 各设备的串口控制器
+    def controllers(self) -> List[SerialController]:
+        with self._lock:
+            return [session.controller for session in self.sessions.values()]
+
+    # 各设备状态
+    def stats(self) -> List[dict]:
+        with self._lock:
+            sessions = list(self.sessions.values())
+        return [
+            {
+                **session.controller.stats(),
+                "running": session.running,
+                "owner": session.owner,
+                "started_at": session.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for session in sessions
+        ]
+
+
+# 设备管理器（所有websocket连接共用）
+device_manager = DeviceManager(max_devices=settings.DEVICES.MAX_DEVICES, transport=settings.SERIAL.TRANSPORT)
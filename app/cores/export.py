@@ -0,0 +1,186 @@
+# 导入系统库
+import base64
+import os
+
+# 导入第三方库
+from loguru import logger
+from fastapi.responses import FileResponse
+
+# 导入自定义库
+from app.models import Result
+from app.extensions import SessionLocal, config, get_export_jobs, get_image_store
+from app.schemas.money import SearchSchema
+from app.responses import ResponseException
+from app.cores.banknote_model import BANKNOTE_STRUCT, encode_banknote
+from app.services.export.export_jobs import ExportJob, DONE
+from app.services.export.file_writers import (CsvFileWriter, NdjsonGzFileWriter, ParquetFileWriter, FsnFileWriter,
+                                              parquet_available)
+from app.services.image.image_store import png_to_raw
+from app.utils.excel_service import ExcelStreamWriter, export_file_path
+from app.cores.money import (build_search_query, validate_search, iter_search_chunks, iter_search_sources, load_pngs,
+                             to_excel_row, EXCEL_HEADERS)
+
+# 定义常量
+MEDIA_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'ndjson.gz': 'application/gzip',
+    'parquet': 'application/vnd.apache.parquet',
+    'fsn': 'application/octet-stream',
+}
+# 批量导出的列（不含图像）及Parquet中的类型
+EXPORT_COLUMNS = [
+    ('id', 'int'),
+    ('create_at', 'datetime'),
+    ('date', 'date'),
+    ('time', 'time'),
+    ('money_flag', 'str'),
+    ('currency_name', 'str'),
+    ('valuta', 'int'),
+    ('tf_flag', 'int'),
+    ('ver', 'int'),
+    ('fsn_count', 'int'),
+    ('char_num', 'int'),
+    ('sno', 'str'),
+    ('machine_number', 'str'),
+    ('image_ref', 'str'),
+]
+# FSN记录需要的列（按encode_banknote的参数顺序），之后是图像列
+FSN_COLUMNS = ['date', 'time', 'tf_flag', 'valuta', 'fsn_count', 'money_flag', 'ver', 'undefine', 'char_num',
+               'sno', 'machine_number', 'reserve1', 'image_ref', 'image_data']
+
+
+# 按批读取搜索结果的指定列（不创建ORM对象，依次查询result表和归档分区），用于批量导出
+def iter_column_chunks(data: SearchSchema, session, columns: list, size: int):
+    for source, partition in iter_search_sources(data, session):
+        query = build_search_query(data, source, partition)
+        rows = []
+        for row in query.with_entities(*(getattr(Result, name) for name in columns)).yield_per(size):
+            rows.append(tuple(row))
+            if len(rows) >= size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def count_search(data: SearchSchema, session) -> int:
+    return sum(build_search_query(data, source, partition).order_by(None).count()
+               for source, partition in iter_search_sources(data, session))
+
+
+# 导出Excel（在导出线程中执行）：按批从数据库游标读取记录，逐行写入只写模式的工作簿
+def export_excel(data: SearchSchema, job: ExportJob, file_path: str) -> str:
+    writer = ExcelStreamWriter(EXCEL_HEADERS)
+    try:
+        with SessionLocal() as session:
+            job.update(0, count_search(data, session))
+            for items in iter_search_chunks(data, session):
+                pngs = load_pngs(items, session)
+                for item in items:
+                    if item.image_ref:
+                        png = pngs.get(item.image_ref)
+                    else:
+                        # 旧数据直接保存的base64图像
+                        png = base64.b64decode(item.image_data) if item.image_data else None
+                    writer.append(to_excel_row(item, None), png, item.image_ref)
+                job.update(writer.row_count)
+    except Exception:
+        writer.close()
+        raise
+    return writer.save(file_path)
+
+
+# 导出CSV、NDJSON.gz、Parquet（在导出线程中执行）
+def export_columns(data: SearchSchema, job: ExportJob, file_path: str, format: str) -> str:
+    names = [name for name, _ in EXPORT_COLUMNS]
+    if format == 'csv':
+        writer = CsvFileWriter(file_path, names)
+    elif format == 'ndjson':
+        writer = NdjsonGzFileWriter(file_path, names, config.EXPORT.NDJSON_COMPRESS_LEVEL)
+    else:
+        writer = ParquetFileWriter(file_path, EXPORT_COLUMNS, config.EXPORT.PARQUET_COMPRESSION)
+    with writer, SessionLocal() as session:
+        job.update(0, count_search(data, session))
+        for rows in iter_column_chunks(data, session, names, config.EXPORT.CHUNK_SIZE):
+            writer.write(rows)
+            job.update(writer.row_count)
+        return writer.close()
+
+
+# 导出FSN（在导出线程中执行）：图像按批从图像仓库读取原始像素
+def export_fsn(data: SearchSchema, job: ExportJob, file_path: str) -> str:
+    image_store = get_image_store()
+    with FsnFileWriter(file_path, BANKNOTE_STRUCT.size) as writer, SessionLocal() as session:
+        job.update(0, count_search(data, session))
+        for rows in iter_column_chunks(data, session, FSN_COLUMNS, config.EXPORT.CHUNK_SIZE):
+            images = image_store.read_many(session, [row[-2] for row in rows if row[-2]])
+            records = []
+            for row in rows:
+                image_ref, image_data = row[-2], row[-1]
+                if image_ref:
+                    image = images.get(image_ref)
+                else:
+                    # 旧数据直接保存的base64图像
+                    image = png_to_raw(base64.b64decode(image_data)) if image_data else None
+                records.append(encode_banknote(*row[:-2], image=image or b''))
+            writer.write(records)
+            job.update(writer.row_count)
+        return writer.close()
+
+
+# 导出格式 -> (文件扩展名, 导出函数)
+EXPORT_FORMATS = {
+    'excel': ('xlsx', export_excel),
+    'csv': ('csv', lambda data, job, file_path: export_columns(data, job, file_path, 'csv')),
+    'ndjson': ('ndjson.gz', lambda data, job, file_path: export_columns(data, job, file_path, 'ndjson')),
+    'parquet': ('parquet', lambda data, job, file_path: export_columns(data, job, file_path, 'parquet')),
+    'fsn': ('fsn', export_fsn),
+}
+
+
+def exportMoney(data: SearchSchema, format: str = 'excel'):
+    if format not in EXPORT_FORMATS:
+        raise ResponseException.HTTP_400_BAD_REQUEST
+    if format == 'parquet' and not parquet_available():
+        logger.warning("parquet export requires pyarrow")
+        raise ResponseException.HTTP_400_BAD_REQUEST
+    validate_search(data)
+
+    ext, export = EXPORT_FORMATS[format]
+    file_path = export_file_path(config.EXPORT.OUTPUT_DIR, 'report', ext)
+    job = get_export_jobs().submit(format, lambda job: export(data, job, file_path))
+    logger.info(f"export job {job.id} submitted: {format}")
+    return {
+        'detail': 'Export started',
+        'job': job.to_dict(),
+        'download_url': f"{config.APP.GLOBAL_API_PREFIX}/money/export/{job.id}/download",
+    }
+
+
+def getExportFormats():
+    return {'data': [name for name in EXPORT_FORMATS if name != 'parquet' or parquet_available()]}
+
+
+def getExportJobs():
+    return {'data': [job.to_dict() for job in reversed(get_export_jobs().jobs())]}
+
+
+def getExportJob(job_id: str):
+    job = get_export_jobs().get(job_id)
+    if job is None:
+        raise ResponseException.HTTP_404_NOT_FOUND
+    return job.to_dict()
+
+
+def downloadExport(job_id: str):
+    job = get_export_jobs().get(job_id)
+    if job is None:
+        raise ResponseException.HTTP_404_NOT_FOUND
+    if job.status != DONE:
+        raise ResponseException.HTTP_409_CONFLICT
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise ResponseException.HTTP_404_NOT_FOUND
+    name = os.path.basename(job.file_path)
+    ext = name.split('.', 1)[1] if '.' in name else ''
+    return FileResponse(job.file_path, media_type=MEDIA_TYPES.get(ext, 'application/octet-stream'), filename=name)
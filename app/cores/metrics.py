@@ -0,0 +1,84 @@
+# 导入系统库
+
+# 导入第三方库
+
+# 导入自定义库
+from app.extensions import get_metrics_registry, get_ws_manager, get_broadcast_hub, get_image_encoder
+from app.cores.serial_ctrl import db_writer
+from app.cores.device_manager import device_manager
+from app.services.log.log_sink import get_log_sink
+
+# 定义全局变量
+metrics = get_metrics_registry()
+
+
+# 注册采集时才取值的指标（队列长度、帧同步统计、各连接的发送情况等），热路径上没有开销
+def register_metrics():
+    ws_manager = get_ws_manager()
+    broadcast_hub = get_broadcast_hub()
+
+    # 入库线程
+    metrics.callback('money_db_queue_pending', 'Rows waiting in the db writer queue',
+                     lambda: [((), db_writer.pending)])
+    metrics.callback('money_db_queue_capacity', 'Capacity of the db writer queue',
+                     lambda: [((), db_writer.capacity)])
+    metrics.callback('money_db_written_total', 'Rows written by the db writer',
+                     lambda: [((), db_writer.written_count)], type='counter')
+    metrics.callback('money_db_failed_total', 'Rows dropped by the db writer',
+                     lambda: [((), db_writer.failed_count)], type='counter')
+    metrics.callback('money_db_batches_total', 'Batches written by the db writer',
+                     lambda: [((), db_writer.batch_count)], type='counter')
+
+    # 各设备的帧解析（设备停止后不再输出）
+    metrics.callback('money_devices', 'Devices being acquired',
+                     lambda: [((), len(device_manager.controllers()))])
+    metrics.callback('money_frames_total', 'Frames found by the frame parser',
+                     lambda: [((c.device,), c.frame_parser.frame_count) for c in device_manager.controllers()],
+                     ['device'], type='counter')
+    metrics.callback('money_frame_resync_total', 'Frame parser resyncs after bad data',
+                     lambda: [((c.device,), c.frame_parser.resync_count) for c in device_manager.controllers()],
+                     ['device'], type='counter')
+    metrics.callback('money_frame_dropped_bytes_total', 'Bytes dropped by the frame parser',
+                     lambda: [((c.device,), c.frame_parser.dropped_bytes) for c in device_manager.controllers()],
+                     ['device'], type='counter')
+    metrics.callback('money_frame_buffered_bytes', 'Bytes waiting in the frame parser buffer',
+                     lambda: [((c.device,), c.frame_parser.buffered) for c in device_manager.controllers()],
+                     ['device'])
+
+    # 消息推送
+    metrics.callback('money_broadcast_published_total', 'Messages dispatched by the broadcast hub',
+                     lambda: [((), broadcast_hub.published_count)], type='counter')
+    metrics.callback('money_ws_clients', 'Connected websocket clients',
+                     lambda: [((), len(ws_manager.clients))])
+    for name, help, attr, type in (
+        ('money_ws_pending', 'Messages waiting in the client buffer', 'pending', 'gauge'),
+        ('money_ws_lag_seconds', 'Age of the oldest pending message', 'lag', 'gauge'),
+        ('money_ws_sent_total', 'Messages sent to the client', 'sent_count', 'counter'),
+        ('money_ws_dropped_total', 'Messages dropped for the slow client', 'dropped_count', 'counter'),
+        ('money_ws_coalesced_total', 'Status messages coalesced for the slow client', 'coalesced_count', 'counter'),
+    ):
+        metrics.callback(name, help,
+                         lambda attr=attr: [((c.id,), getattr(c, attr)) for c in list(ws_manager.clients.values())],
+                         ['client'], type=type)
+
+    # 日志
+    metrics.callback('money_log_dropped_total', 'Log messages dropped because the log queue was full',
+                     lambda: [((), get_log_sink().dropped_count if get_log_sink() else 0)], type='counter')
+    metrics.callback('money_log_suppressed_total', 'Repeated warnings suppressed by the rate limiter',
+                     lambda: [((), get_log_sink().filter.suppressed_count if get_log_sink() else 0)], type='counter')
+
+    # 图像编码缓存
+    metrics.callback('money_image_encode_cache_hits_total', 'Image encoder cache hits',
+                     lambda: [((), get_image_encoder().hit_count)], type='counter')
+    metrics.callback('money_image_encode_cache_misses_total', 'Image encoder cache misses',
+                     lambda: [((), get_image_encoder().miss_count)], type='counter')
+
+
+# Prometheus文本格式
+def render_metrics() -> str:
+    return metrics.render()
+
+
+# websocket的stats消息
+def build_stats_message() -> dict:
+    return {"type": "stats", "data": metrics.snapshot()}
@@ -1,130 +1,404 @@
-from datetime import datetime
+import json
+import time
+import threading
+import base64
+import hashlib
+from contextlib import nullcontext
+from datetime import datetime, date, time as dt_time
+from typing import Optional
 from loguru import logger
 
 from sqlalchemy import func, and_
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
 
 from app.models import Result
+from app.extensions import SessionLocal, engine, config, get_image_store, get_image_encoder, get_summary_aggregator, \
+    get_rollup_rebuilder, get_duplicate_detector, get_retention_manager, get_export_jobs
 from app.schemas.money import SearchSchema
 from app.responses import ResponseException
-from app.utils.excel_service import export_to_excel
+from app.services.database.migrations import drop_legacy_rows
+from app.services.database.sno_index import sno_filter
+from app.services.database.counters import get_result_count
+from app.services.database.rollups import GRAINS, KEY_COLUMNS, query_rollups
+from app.services.database.retention import committed_filter, delete_in_batches
+from app.services.export.export_jobs import ExportJob
+from app.services.stats.aggregator import LEVELS
 
+# 定义常量
+STREAM_BATCH_SIZE = 500  # 流式返回时每次从数据库游标取出的条数
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'  # 按哈希寻址的图像内容不会变化
 
-def getMoneyPages(skip: int, limit: int, db: Session):
-    data = db.query(Result).offset(skip).limit(limit).all()
-    count = db.query(Result).count()
 
-    return {"data": data, "total": count}
+# 真伪标志过滤条件（tf_flag为整数列）
+def tf_flag_filter(code: str):
+    try:
+        return Result.tf_flag == int(code)
+    except ValueError:
+        raise ResponseException.HTTP_400_BAD_REQUEST
 
 
-def deleteMoney(id: int, db: Session):
-    item = db.query(Result).filter_by(id=id).first()
+def image_url(item: Result) -> str:
+    # 图像仓库中的图像按哈希寻址，可以长期缓存；旧数据按记录id获取
+    if item.image_ref:
+        return f"{config.APP.GLOBAL_API_PREFIX}/money/image/blob/{item.image_ref}"
+    return f"{config.APP.GLOBAL_API_PREFIX}/money/image/{item.id}"
+
+
+# 分页数据不再携带图像，前端通过image_url按需获取
+def to_page_row(item: Result) -> dict:
+    row = {name: getattr(item, name) for name in Result.__table__.columns.keys() if name != 'image_data'}
+    row['image_url'] = image_url(item)
+    return row
+
+
+# 批量读取一批记录的图像（PNG），返回图像哈希到PNG的字典（旧数据没有图像哈希，不包含在内）
+def load_pngs(items: list, db: Session) -> dict:
+    encoder = get_image_encoder()
+    pngs = {}
+    for ref in {item.image_ref for item in items if item.image_ref}:
+        png = encoder.get(ref)
+        if png is not None:
+            pngs[ref] = png
+    # 只读取未缓存的图像
+    missing = [item.image_ref for item in items if item.image_ref and item.image_ref not in pngs]
+    if missing:
+        for ref, raw in get_image_store().read_many(db, missing).items():
+            pngs[ref] = encoder.encode_png(raw, ref)
+    return pngs
+
+
+# 批量读取一批记录的图像（base64编码），返回记录id到图像的字典
+def load_images(items: list, db: Session) -> dict:
+    images = {ref: base64.b64encode(png).decode('utf-8') for ref, png in load_pngs(items, db).items()}
+    return {item.id: images.get(item.image_ref) if item.image_ref else item.image_data for item in items}
+
+
+def getMoneyPages(skip: int, limit: int, db: Session, after: Optional[int] = None):
+    # 按id从旧到新：先各归档分区，最后是result表；按偏移量翻页时根据分区条数跳过整个分区，不打开文件
+    manager = get_retention_manager()
+    partitions = manager.partitions(db)[::-1]
+    items = []
+    for partition in partitions + [None]:
+        if len(items) >= limit:
+            break
+        if partition is not None:
+            if after is not None and partition.max_id <= after:
+                continue
+            if after is None and skip >= partition.row_count:
+                skip -= partition.row_count
+                continue
+        with (manager.session(partition) if partition is not None else nullcontext(db)) as session:
+            query = session.query(Result).options(defer(Result.image_data)).order_by(Result.id)
+            if partition is not None:
+                query = query.filter(committed_filter(Result, partition))
+            # 传入上一页最后一条记录的id时按id翻页，不再扫描跳过的记录
+            if after is not None:
+                query = query.filter(Result.id > after)
+            else:
+                query = query.offset(skip)
+                skip = 0
+            items.extend(query.limit(limit - len(items)).all())
+    count = get_result_count(db) + sum(partition.row_count for partition in partitions)
+    next_cursor = items[-1].id if len(items) == limit else None
+
+    return {"data": [to_page_row(item) for item in items], "total": count, "next_cursor": next_cursor}
+
+
+def getMoneyImage(id: int, request: Request, db: Session):
+    item = db.query(Result.image_ref, Result.image_data).filter_by(id=id).first()
     if not item:
+        # 已归档的记录
+        manager = get_retention_manager()
+        partition = manager.find(db, id)
+        if partition is not None:
+            with manager.session(partition) as session:
+                item = session.query(Result.image_ref, Result.image_data).filter_by(id=id).first()
+    if not item or not (item.image_ref or item.image_data):
         raise ResponseException.HTTP_404_NOT_FOUND
+    if item.image_ref:
+        return getImageBlob(item.image_ref, request, db, cache_control='no-cache')
+
+    # 旧数据直接保存的base64图像
+    content = base64.b64decode(item.image_data)
+    etag = '"' + hashlib.md5(content).hexdigest() + '"'
+    return image_response(content, etag, 'no-cache', request)
 
-    db.delete(item)
-    db.commit()
+
+def getImageBlob(ref: str, request: Request, db: Session, cache_control: str = IMMUTABLE_CACHE):
+    etag = f'"{ref}"'
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': cache_control})
+    encoder = get_image_encoder()
+    png = encoder.get(ref)
+    if png is None:
+        raw = get_image_store().read(db, ref)
+        if raw is None:
+            raise ResponseException.HTTP_404_NOT_FOUND
+        png = encoder.encode_png(raw, ref)
+    return image_response(png, etag, cache_control, request)
+
+
+def image_response(content: bytes, etag: str, cache_control: str, request: Request) -> Response:
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content, media_type='image/png', headers=headers)
+
+
+def deleteMoney(id: int, db: Session):
+    item = db.query(Result).filter_by(id=id).first()
+    if item:
+        db.delete(item)
+        db.commit()
+    else:
+        # 已归档的记录
+        row = get_retention_manager().delete_record(id)
+        if row is None:
+            raise ResponseException.HTTP_404_NOT_FOUND
+        item = Result(**row)
+    if item.create_at:
+        get_summary_aggregator().remove(item.create_at.date().isoformat(), item.machine_number or '',
+                                        item.money_flag or '', item.valuta or 0, item.tf_flag or 0)
+    get_duplicate_detector().remove(item.money_flag, item.sno)
 
     return {'detail': '删除成功'}
 
 
+# 解析时间范围
+def parse_date_range(date_range: list) -> tuple:
+    try:
+        start_date = datetime.strptime(date_range[0], '%Y-%m-%d %H:%M:%S')
+        end_date = datetime.strptime(date_range[1], '%Y-%m-%d %H:%M:%S')
+    except (ValueError, IndexError):
+        raise ResponseException.HTTP_400_BAD_REQUEST
+    return start_date, end_date
+
+
+# 构造搜索查询（按id倒序，支持以上一页最后一条记录的id作为游标翻页），partition为查询的归档分区
+def build_search_query(data: SearchSchema, db: Session, partition=None):
+    query = db.query(Result).filter(sno_filter(Result, data.q, use_index=partition is None))
+    if partition is not None:
+        query = query.filter(committed_filter(Result, partition))
+    if data.date_range:
+        logger.debug(data.date_range)
+        start_date, end_date = parse_date_range(data.date_range)
+        query = query.filter(Result.create_at.between(start_date, end_date))
+    if data.code != "all":
+        query = query.filter(tf_flag_filter(data.code))
+    if data.cursor is not None:
+        query = query.filter(Result.id < data.cursor)
+    query = query.order_by(Result.id.desc())
+    if data.limit:
+        query = query.limit(data.limit)
+    return query
+
+
+# 在请求线程中校验查询参数（流式返回和后台导出在响应开始后才执行查询）
+def validate_search(data: SearchSchema):
+    if data.date_range:
+        parse_date_range(data.date_range)
+    if data.code != "all":
+        tf_flag_filter(data.code)
+
+
+# 搜索涉及的归档分区：只包含时间范围内、id在游标之前的分区（按id从新到旧）
+def search_partitions(data: SearchSchema, db: Session) -> list:
+    start_date = end_date = None
+    if data.date_range:
+        start_date, end_date = parse_date_range(data.date_range)
+    partitions = get_retention_manager().partitions(db, start_date, end_date)
+    return [partition for partition in partitions if data.cursor is None or partition.min_id < data.cursor]
+
+
+def iter_search_sources(data: SearchSchema, db: Session):
+    """
+    依次打开搜索涉及的数据源：先result表，再按id从新到旧的归档分区
+    :return: 生成(会话, 分区)，result表的分区为None
+    """
+    yield db, None
+    manager = get_retention_manager()
+    for partition in search_partitions(data, db):
+        with manager.session(partition) as session:
+            yield session, partition
+
+
+# 从数据库游标中按批取出搜索结果（依次查询各数据源），内存占用与结果数量无关
+def iter_search_chunks(data: SearchSchema, db: Session, size: int = STREAM_BATCH_SIZE):
+    remaining = data.limit
+    for session, partition in iter_search_sources(data, db):
+        query = build_search_query(data, session, partition)
+        if remaining is not None:
+            query = query.limit(remaining)
+        items = []
+        for item in query.yield_per(size):
+            items.append(item)
+            if remaining is not None:
+                remaining -= 1
+            if len(items) >= size:
+                yield items
+                items = []
+        if items:
+            yield items
+        if remaining == 0:
+            return
+
+
+def to_pdf_row(item: Result, image_data: Optional[str]) -> dict:
+    return {
+        'id': item.id,
+        'create_at': item.create_at,
+        'money_flag': item.money_flag,
+        'tf_flag': item.tf_flag,
+        'ver': item.ver,
+        'valuta': item.valuta,
+        'machine_number': item.machine_number,
+        'sno': item.sno,
+        'image_data': image_data,
+        'image_url': image_url(item),
+    }
+
+
+EXCEL_HEADERS = ['Data&Time', 'Currency.', 'Denom.', 'Version', 'Code', 'Machine No.', 'S.N.', 'S.N. Image']
+
+
+def to_excel_row(item: Result, image_data: Optional[str]) -> dict:
+    return {
+        'Data&Time': datetime.fromisoformat(str(item.create_at)).strftime('%Y-%m-%d %H:%M:%S'),
+        'Currency.': item.money_flag,
+        'Denom.': item.valuta,
+        'Version': item.ver,
+        'Code': item.tf_flag,
+        'Machine No.': item.machine_number,
+        'S.N.': item.sno,
+        'S.N. Image': image_data,
+    }
+
+
 def searchMoney(data: SearchSchema, db: Session):
-    import time
+    if data.stream:
+        return streamSearchMoney(data)
+
     start_time = time.time()
-    if not data.date_range:
-        # 查找Result.sno包含data.q 的所有结果
-
-        if data.code == "all":
-            items = db.query(Result).filter(Result.sno.like(f'%{data.q}%')).all()
-        else:
-            items = db.query(Result).filter(Result.sno.like(f'%{data.q}%'), Result.tf_flag==data.code).all()
-
-        pdf_data = [
-            {
-                'create_at': item.create_at,
-                'money_flag': item.money_flag,
-                'tf_flag': item.tf_flag,
-                'ver': item.ver,
-                'valuta': item.valuta,
-                'machine_number': item.machine_number,
-                'sno': item.sno,
-                'image_data': item.image_data,
-            } for item in items
-        ]
-
-        excel_data = [
-            {
-                'Data&Time': datetime.fromisoformat(str(item.create_at)).strftime('%Y-%m-%d %H:%M:%S'),
-                'Currency.': item.money_flag,
-                'Denom.': item.valuta,
-                'Version': item.ver,
-                'Code': item.tf_flag,
-                'Machine No.': item.machine_number,
-                'S.N.': item.sno,
-                'S.N. Image': item.image_data,
-            } for item in items
-        ]
-
-        return {"data": pdf_data, "excel_data": excel_data, "total": len(pdf_data)}
-    else:
-        logger.debug(data.date_range)
-        start_date = datetime.strptime(data.date_range[0], '%Y-%m-%d %H:%M:%S')
-        end_date = datetime.strptime(data.date_range[1], '%Y-%m-%d %H:%M:%S')
-        logger.debug(start_date)
-        logger.debug(end_date)
-
-        if data.code == "all":
-            items = db.query(Result).filter(
-                and_(Result.sno.like(f'%{data.q}%'), Result.create_at.between(start_date, end_date))
-            ).order_by(Result.id.desc()).all()
-        else:
-            items = db.query(Result).filter(
-                and_(Result.sno.like(f'%{data.q}%'), Result.create_at.between(start_date, end_date), Result.tf_flag==data.code)
-            ).order_by(Result.id.desc()).all()
-
-        end_time = time.time()
-
-        logger.debug(f'cost: {int(end_time) - int(start_time)}')
-        pdf_data = [
-            {
-                'create_at': item.create_at,
-                'money_flag': item.money_flag,
-                'tf_flag': item.tf_flag,
-                'ver': item.ver,
-                'valuta': item.valuta,
-                'machine_number': item.machine_number,
-                'sno': item.sno,
-                'image_data': item.image_data,
-            } for item in items
-        ]
-        excel_data = [
-            {
-                'Data&Time': datetime.fromisoformat(str(item.create_at)).strftime('%Y-%m-%d %H:%M:%S'),
-                'Currency.': item.money_flag,
-                'Denom.': item.valuta,
-                'Version': item.ver,
-                'Code': item.tf_flag,
-                'Machine No.': item.machine_number,
-                'S.N.': item.sno,
-                'S.N. Image': item.image_data,
-            } for item in items
-        ]
-        return {"data": pdf_data, "excel_data":excel_data, "total": len(pdf_data)}
+    items = {}
+    for session, partition in iter_search_sources(data, db):
+        # 已取满一页，且更早的分区中的id都更小
+        if partition is not None and data.limit and len(items) >= data.limit and \
+                partition.max_id < sorted(items, reverse=True)[data.limit - 1]:
+            break
+        for item in build_search_query(data, session, partition).all():
+            items[item.id] = item
+    items = sorted(items.values(), key=lambda item: item.id, reverse=True)[:data.limit or None]
+    logger.debug(f'cost: {time.time() - start_time:.3f}s')
 
+    images = load_images(items, db)
+    result = {"data": [to_pdf_row(item, images[item.id]) for item in items], "total": len(items)}
+    # excel_data只在需要时构造
+    if data.excel:
+        result["excel_data"] = [to_excel_row(item, images[item.id]) for item in items]
+    # 本页已满时返回下一页游标
+    result["next_cursor"] = items[-1].id if data.limit and len(items) == data.limit else None
+    return result
 
-def deleteAllMoney(db: Session):
-    db.query(Result).delete()
 
+# 以NDJSON格式逐行返回搜索结果，内存占用与结果数量无关
+def streamSearchMoney(data: SearchSchema):
+    def json_default(value):
+        if isinstance(value, (datetime, date, dt_time)):
+            return value.isoformat()
+        return str(value)
+
+    def to_lines(items: list, session: Session) -> str:
+        images = load_images(items, session)
+        return ''.join(
+            json.dumps(to_pdf_row(item, images[item.id]), default=json_default, ensure_ascii=False) + '\n'
+            for item in items
+        )
+
+    def generate():
+        # 请求的数据库会话在响应开始前就已关闭，这里使用独立的会话
+        with SessionLocal() as session:
+            for items in iter_search_chunks(data, session):
+                yield to_lines(items, session)
+
+    # 先在请求线程中校验查询参数
+    validate_search(data)
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+def deleteAllMoney(db: Session):
+    # 同时清除尚未迁移完成的旧版本数据
+    drop_legacy_rows(db.connection())
     db.commit()
+    # 只删除此前写入的记录，删除期间新写入的记录保留
+    max_id = db.query(func.max(Result.id)).scalar()
+    job = get_export_jobs().submit('delete', lambda job: delete_all(job, max_id), total=get_result_count(db))
+    logger.info(f"delete job {job.id} submitted: id <= {max_id}")
+    return {'detail': 'Delete started', 'job': job.to_dict()}
 
-    return {'detail': '删除成功'}
+
+# 在后台任务中按批删除点钞记录（每批一个短事务，触发器同步扣减计数和预汇总，中断后两者仍与剩余的记录一致），
+# 完成后删除所有归档分区，再按剩余的记录重新统计汇总和冠字号索引
+def delete_all(job: ExportJob, max_id: Optional[int]):
+    from app.cores.serial_ctrl import db_writer
+    if max_id is not None:
+        delete_in_batches(engine, 'id <= :max_id', {'max_id': max_id}, config.RETENTION.BATCH_SIZE,
+                          config.RETENTION.PAUSE, progress=job.update)
+    get_retention_manager().remove_all()
+    aggregator = get_summary_aggregator()
+    with SessionLocal() as session:
+        aggregator.clear(session)
+        session.commit()
+        aggregator.rebuild(session, Result, pause=db_writer.paused)
+        get_duplicate_detector().rebuild(session)
+    return None
+
+
+# 点钞汇总（内存中增量维护，不扫描点钞记录）
+def getMoneyStats(level: str = 'day', scope: Optional[str] = None):
+    if level not in LEVELS:
+        raise ResponseException.HTTP_400_BAD_REQUEST
+    if level == 'day' and scope is None:
+        scope = date.today().isoformat()
+    aggregator = get_summary_aggregator()
+    return {"level": level, "scope": scope, "seq": aggregator.seq, "data": aggregator.snapshot(level, scope)}
+
+
+def getMoneyReport(db: Session, start: str, end: str, interval: Optional[str] = None, group_by: Optional[str] = None,
+                   filters: Optional[dict] = None):
+    """
+    历史统计报表（查询预汇总表，自动选择能满足查询的最粗粒度）
+    :param start: 开始时间（含），格式YYYY-MM-DD HH:MM:SS
+    :param end: 结束时间（不含）
+    :param interval: 时间间隔（minute、hour、day），为空时整个时间段合计
+    :param group_by: 逗号分隔的分组维度（machine_number、money_flag、valuta、tf_flag）
+    :param filters: 维度 -> 值，为None的维度不过滤
+    """
+    start_date, end_date = parse_date_range([start, end])
+    dimensions = [name for name in (group_by or '').split(',') if name]
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    if (interval is not None and interval not in GRAINS) or any(name not in KEY_COLUMNS for name in dimensions) \
+            or start_date > end_date:
+        raise ResponseException.HTTP_400_BAD_REQUEST
+    data, plan = query_rollups(db.connection(), start_date, end_date, interval, dimensions, filters)
+    return {
+        "interval": interval,
+        "group_by": dimensions,
+        "rebuilding": get_rollup_rebuilder().rebuilding,  # 重建期间结果可能不完整
+        "plan": plan,
+        "data": data,
+    }
+
+
+# 归档分区信息
+def getPartitions(db: Session):
+    manager = get_retention_manager()
+    return {"hot": get_result_count(db), "partitions": manager.stats(db), "last_run": manager.last_run}
 
 
-def exportMoney(data: SearchSchema, db: Session):
-    result = searchMoney(data, db)
-    total = result['total']
-    excel_data = result['excel_data']
-    logger.info(f"total of searched money: {total}")
-    file_path = export_to_excel(excel_data, 'money_test')
-    logger.info(f"file path: {file_path}")
-    return {'detail': 'Export Successfully', 'file_path': file_path}
\ No newline at end of file
+# 立即执行一次归档和过期清理（后台线程中执行）
+def runRetention():
+    manager = get_retention_manager()
+    threading.Thread(target=manager.run_once, name="retention-run", daemon=True).start()
+    return {'detail': 'Retention started'}
@@ -1,35 +1,103 @@
 # 导入系统库
 from loguru import logger
+import asyncio
 import json
 import struct
+import threading
+import time
 from dataclasses import asdict
 import os
 import sys
-import re
-from datetime import datetime
+from datetime import datetime, time as dt_time
+from typing import Optional
 
 # 导入第三方库
-from multiprocessing import Queue
 from sqlalchemy.orm import Session
 
 # 导入自定义库
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from app.services.serial.serial_communication import SerialCommunication
+from app.services.serial.data_source import ReplayDataSource, create_data_source
 from app.services.serial.serial_model import SerialParameters
-from app.cores.banknote_model import BanknoteInfo, TImageSNo
-from app.services.image.image_saver import ImageSaverService, add_bmp_headers
+from app.services.serial.frame_parser import FrameParser
+from app.services.serial.serial_transport import AsyncSerialReader, serial_loop
+from app.cores.banknote_model import decode_banknote
 from app.services.file.file_opt import read_serial_data_from_file, save_to_file
+from app.services.database.db_writer import BatchWriter
 from app.models import Result
+from app.extensions import SessionLocal, get_image_store, get_broadcast_hub, get_metrics_registry, get_summary_aggregator, \
+    get_duplicate_detector
+from app.services.metrics.metrics import SIZE_BUCKETS
+from app.settings import load_app_settings
 from app.utils.common import convert_to_datetime
 
 # 定义全局变量
-message_queue = Queue()
-# 定义常量
-MSG_LENGTH = 1650
+settings = load_app_settings()
+broadcast_hub = get_broadcast_hub()  # 推送给前端的消息
+summary = get_summary_aggregator()  # 点钞汇总（按会话、日期、机具编号）
+duplicates = get_duplicate_detector()  # 冠字号重复检测
+REPLAY_PARAMS = ('replay_file', 'replay_speed', 'replay_loop')  # 启动参数中的回放参数，指定replay_file时回放该文件
+STAGES = ('recv', 'dedup', 'push', 'save')  # 每张纸币的处理环节：解析、冠字号查重、推送、提交入库
 
-recv_data_count = 0
-push_data_count = 0
-save_data_count = 0
+# 采集链路指标
+metrics = get_metrics_registry()
+recv_bytes_total = metrics.counter('money_recv_bytes_total', 'Bytes received from serial devices', ['device'])
+notes_total = metrics.counter('money_notes_total', 'Notes processed successfully per stage', ['device', 'stage'])
+duplicate_notes_total = metrics.counter('money_duplicate_notes_total', 'Notes with a serial number seen before', ['device'])
+note_errors_total = metrics.counter('money_note_errors_total', 'Notes failed per stage', ['device', 'stage'])
+stage_seconds = metrics.histogram('money_stage_seconds', 'Time spent per stage (parse: per chunk, recv/push/save: per note)', ['stage'])
+db_batch_size = metrics.histogram('money_db_batch_size', 'Rows per db writer batch', buckets=SIZE_BUCKETS)
+db_flush_seconds = metrics.histogram('money_db_flush_seconds', 'Time spent per db writer batch')
+parse_seconds = stage_seconds.labels('parse')
+
+
+# 入库队列积压/恢复时通知前端
+def push_backpressure(congested: bool, pending: int, capacity: int):
+    if congested:
+        message = {"type": "warning", "data": f"db writer backlog: {pending}/{capacity} notes pending"}
+    else:
+        message = {"type": "notification", "data": f"db writer recovered: {pending}/{capacity} notes pending"}
+    broadcast_hub.publish(message)
+
+
+# 入库失败时通知前端
+def push_save_error(msg: str):
+    broadcast_hub.publish({"type": "error", "data": msg})
+
+
+# 纸币最终未能入库时从冠字号重复检测中移除，再次扫描时不会按不存在的记录标记为重复
+def forget_dropped(row: dict):
+    if settings.DUPLICATE.ENABLED:
+        duplicates.remove(row.get('money_flag'), row.get('sno'))
+
+
+# 入库前去掉采集会话id（只用于汇总，点钞记录不保存），并将图像写入图像仓库
+def prepare_rows(session: Session, rows: list) -> list:
+    return get_image_store().prepare_rows(session, [{k: v for k, v in row.items() if k != 'session'} for row in rows])
+
+
+# 每批提交后记录条数和耗时，并计入点钞汇总（只统计已提交的纸币，汇总与点钞记录一致）
+def record_flush(rows: list, seconds: float):
+    db_batch_size.observe(len(rows))
+    db_flush_seconds.observe(seconds)
+    for row in rows:
+        summary.add(row['session'], row['create_at'].date().isoformat(), row['machine_number'],
+                    row['money_flag'], row['valuta'], row['tf_flag'])
+
+
+# 批量入库线程（所有串口控制器共用）
+db_writer = BatchWriter(
+    SessionLocal,
+    Result,
+    batch_size=settings.DB_WRITER.BATCH_SIZE,
+    flush_interval_ms=settings.DB_WRITER.FLUSH_INTERVAL_MS,
+    queue_size=settings.DB_WRITER.QUEUE_SIZE,
+    max_retries=settings.DB_WRITER.MAX_RETRIES,
+    prepare_rows=prepare_rows,
+    on_backpressure=push_backpressure,
+    on_error=push_save_error,
+    on_flush=record_flush,
+    on_drop=forget_dropped,
+)
 
 # 定义串口控制器类
 class SerialController:
@@ -40,17 +108,54 @@ class SerialController:
         3. 接受数据并推送给前端
             1. 数据解包
         4. 将数据存入数据库
+    每个控制器对应一台设备（一个串口），帧解析状态和计数相互独立，
+    推送的消息带有设备标识（device），入库统一交给共用的批量入库线程
     '''
-    def __init__(self, db: Session, data_source: str = 'real'):
+    def __init__(self, db: Session = None, data_source: str = 'real', device: str = ''):
         self.db = db
-        self.serial_communication = SerialCommunication()
-        self.image_opt = ImageSaverService()
-        self.database = None
         self.data_source = data_source # real代表数据是真实数据，test代表数据是从文件中读取的测试数据
+        # 数据源：串口或回放文件，接口相同，接收后的解析、推送、入库流程一致
+        self.serial_communication = create_data_source(
+            data_source,
+            read_timeout=settings.SERIAL.READ_TIMEOUT,
+            replay_file=settings.DATA_SOURCE.REPLAY_FILE,
+            replay_speed=settings.DATA_SOURCE.REPLAY_SPEED,
+            replay_loop=settings.DATA_SOURCE.REPLAY_LOOP,
+        )
+        self.frame_parser = FrameParser(on_error=self.on_frame_error)
+        self.database = None
+        self.device = device # 设备标识（串口号）
+        self.session_id = '' # 采集会话id（每次开始接收时生成），点钞汇总按会话统计
         # 初始化数据
-        self.msg_length = 0
         self.message = {}
         self.money_info = None
+        self.duplicate = False  # 当前纸币的冠字号是否重复
+        # 计数
+        self.recv_count = 0
+        self.push_count = 0
+        self.save_count = 0
+        self.error_count = 0
+        self.duplicate_count = 0
+        # 接收状态
+        self._stopping = threading.Event()
+        self._task: Optional[asyncio.Task] = None  # 异步接收任务（asyncio模式）
+        self._last_data_at = time.monotonic()
+        # 入库队列满时的最长等待时间（asyncio模式下不等待，按背压丢弃，不阻塞线程池）
+        self._put_timeout = settings.DB_WRITER.PUT_TIMEOUT
+        # 指标和采集进度日志（每隔METRICS.LOG_INTERVAL秒汇总一条，不再每张纸币一条）
+        self._last_log_at = time.monotonic()
+        self._logged_recv_count = 0
+        self.bind_metrics()
+
+    # 按设备标识取出各指标的子指标，热路径上直接使用
+    def bind_metrics(self):
+        self._recv_bytes = recv_bytes_total.labels(self.device)
+        self._duplicate_notes = duplicate_notes_total.labels(self.device)
+        self._stage_metrics = {
+            stage: (notes_total.labels(self.device, stage), note_errors_total.labels(self.device, stage),
+                    stage_seconds.labels(stage))
+            for stage in STAGES
+        }
 
     # 设置串口参数
     def set_serial_param(self, serial_param: dict):
@@ -58,160 +163,212 @@ class SerialController:
         serial_param: json类型
         '''
         # 解析json为字典
-        param_dict = serial_param
-        
+        param_dict = dict(serial_param)
+
+        # 回放参数：覆盖配置中的回放文件，该设备改为回放
+        replay = {key: param_dict.pop(key) for key in REPLAY_PARAMS if key in param_dict}
+        if replay.get('replay_file'):
+            self.data_source = 'test'
+            self.serial_communication = ReplayDataSource(
+                replay['replay_file'],
+                speed=replay.get('replay_speed', settings.DATA_SOURCE.REPLAY_SPEED),
+                loop=bool(replay.get('replay_loop', settings.DATA_SOURCE.REPLAY_LOOP)),
+                read_timeout=settings.SERIAL.READ_TIMEOUT,
+            )
+
         # 实例参数模型
         self.serial_communication.set_serial_parm(SerialParameters(**param_dict))
+        if not self.device:
+            self.device = param_dict.get('port', '')
+            self.bind_metrics()
 
     # 打开串口
     def open_connection(self) -> bool:
         logger.debug("open connection")
+        self._stopping.clear()
         if not self.serial_communication.is_connected():
             return self.serial_communication.open_connection()
+        return True
         
-    # 关闭串口
+    # 关闭串口（先停止接收，阻塞中的读取会被立即唤醒）
     def close_connection(self):
+        self._stopping.set()
+        if self._task is not None:
+            serial_loop.cancel(self._task)
+            self._task = None
         if self.serial_communication.is_connected():
             self.serial_communication.close_connection()
-        
-    # 数据接收及入库
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    @property
+    def running(self) -> bool:
+        """异步接收任务是否在运行（线程模式由调用方管理接收线程）"""
+        return self._task is not None and not self._task.done()
+
+    # 数据接收及入库（在接收线程中运行）
     def recv_and_save_data(self):
-        logger.info("start recv and save data")
-        global recv_data_count, push_data_count, save_data_count
+        logger.info(f"start recv and save data: {self.device}")
+        self.begin_session()
+        self._put_timeout = settings.DB_WRITER.PUT_TIMEOUT
         try:
-            while True:
+            while not self.stopping:
                 if not self.serial_communication:
                     logger.warning("serial communication object is None")
                     break
-                
-                # 接收数据
-                if not self.recv_data():
-                    logger.warning(f"recv data failed: data is not correct")
-                    continue
-                else:
-                    recv_data_count += 1
-                    logger.info(f"recv data count: {recv_data_count}")
 
-                # 推送数据
-                if not self.push_data():
-                    logger.warning(f"push data failed: data is not correct")
-                    continue
-                else:
-                    push_data_count += 1
-                    logger.info(f"push data count: {push_data_count}")
-
-                # 数据入库
-                if not self.save_data():
-                    logger.warning(f"save data failed: data is not correct")
-                    logger.warning(f"data is {self.message}")
-                    continue
-                else:
-                    save_data_count += 1
-                    logger.info(f"save data count: {save_data_count}")
+                # 接收数据（一次读出串口缓冲区中的所有数据，超时返回空数据）
+                chunk = self.serial_communication.read_available(self.frame_parser.capacity)
+                self.handle_chunk(chunk)
 
+        except EOFError as e:
+            self.on_replay_finished(e)
         except Exception as e:
-            msg = f"recv data failed: {str(e)}"
-            logger.error(msg)
-            self.push_error(msg, "error")
-            self.close_connection()
-            return
+            self.on_recv_error(e)
+        logger.info(f"stop recv and save data: {self.device}, {self.progress()}")
+
+    # 以asyncio模式启动接收（在串口事件循环中运行）
+    def start_async(self):
+        self._stopping.clear()
+        self._task = serial_loop.spawn(self.recv_and_save_data_async())
 
-    # 接收数据
-    def recv_data(self) -> bool:
-        # 接受包头
-        while not self.recv_header():
+    # 数据接收及入库（asyncio模式）
+    async def recv_and_save_data_async(self):
+        logger.info(f"start async recv and save data: {self.device}")
+        self.begin_session()
+        reader = AsyncSerialReader(self.serial_communication, self.frame_parser.capacity)
+        reader.open()
+        loop = asyncio.get_running_loop()
+        self._put_timeout = 0
+        try:
+            while not self.stopping:
+                chunk = await reader.read(settings.SERIAL.READ_TIMEOUT)
+                if chunk:
+                    # 帧处理（查重可能查询数据库）在线程池中执行，不阻塞共用事件循环中其他设备的读取
+                    await loop.run_in_executor(None, self.handle_chunk, chunk)
+                else:
+                    self.handle_chunk(chunk)
+        except asyncio.CancelledError:
             pass
+        except EOFError as e:
+            self.on_replay_finished(e)
+        except Exception as e:
+            self.on_recv_error(e)
+        finally:
+            reader.close()
+        logger.info(f"stop async recv and save data: {self.device}, {self.progress()}")
 
-        # 接受数据长度
-        if not self.recv_data_length():
-            logger.warning("recv data length failed: data length is not correct")
-            return False
+    # 开始一次采集会话：重置帧解析状态，生成会话id
+    def begin_session(self):
+        self.frame_parser.reset()
+        self.session_id = f"{self.device}@{datetime.now():%Y%m%d%H%M%S}"
 
-        # 接收核心数据（包含模式+纸币信息+包尾）
-        if not self.recv_money_data():
-            logger.warning("recv core data failed: core data is not correct")
-            return False
+    # 接收异常：主动停止时忽略，否则提示前端并关闭串口
+    def on_recv_error(self, e: Exception):
+        if self.stopping:
+            return
+        msg = f"recv data failed: {str(e)}"
+        logger.error(msg)
+        self.push_error(msg, "error")
+        self._stopping.set()
+        if self.serial_communication.is_connected():
+            self.serial_communication.close_connection()
 
-        return True
+    # 回放结束：提示前端并关闭回放文件
+    def on_replay_finished(self, e: EOFError):
+        if self.stopping:
+            return
+        msg = f"{str(e)}, recv: {self.recv_count}, save: {self.save_count}"
+        logger.info(f"{self.device} {msg}")
+        broadcast_hub.publish({"type": "notification", "device": self.device, "data": msg})
+        self._stopping.set()
+        if self.serial_communication.is_connected():
+            self.serial_communication.close_connection()
 
-            
-    # 接收包头
-    def recv_header(self) -> bool:
-        data = self.serial_communication.receive_data(4)
-        if data is None:
-            return False
-        
-        if data == b'\xAE\xAE\xAE\xAE':
-            return True
-        else:
-            msg = f"recv header failed: header is not correct {data}"
-            logger.warning(msg)
-            self.push_error(msg)
-            self.serial_communication.clean_data()
-            return False
+    # 处理接收到的数据：帧解析、推送、入库
+    def handle_chunk(self, chunk: bytes):
+        now = time.monotonic()
+        if not chunk:
+            # 未完成的帧超过时限仍未收齐，丢弃
+            if self.frame_parser.buffered and now - self._last_data_at > settings.SERIAL.FRAME_TIMEOUT:
+                self.on_frame_error(f"incomplete frame timeout: drop {self.frame_parser.buffered} bytes")
+                self.frame_parser.reset()
+            self.log_progress(now)
+            return
+        self._last_data_at = now
+        self._recv_bytes.inc(len(chunk))
 
-    # 接收数据长度
-    def recv_data_length(self) -> bool:
-        data = self.serial_communication.receive_data(2)
-        if data is None:
-            return False
+        # 帧解析的耗时（不含每帧的处理）按数据块统计
+        frames = self.frame_parser.feed(chunk)
+        elapsed = 0.0
+        while True:
+            started_at = time.perf_counter()
+            frame = next(frames, None)
+            elapsed += time.perf_counter() - started_at
+            if frame is None:
+                break
+            self.handle_frame(frame)
+        parse_seconds.observe(elapsed)
+        self.log_progress(now)
 
-        # 解析消息长度（2字节）
-        self.msg_length = struct.unpack('<H', data)[0]
-        if self.msg_length == MSG_LENGTH:
-            return True
-        else:
-            msg = f"recv data length failed: data length is not correct {self.msg_length}"
-            logger.warning(msg)
-            self.push_error(msg)
-            return False
+    # 处理一帧：解析、推送、入库
+    def handle_frame(self, frame: memoryview):
+        # 解析数据
+        if not self.run_stage('recv', self.recv_money_data, frame):
+            logger.warning(f"recv data failed: data is not correct")
+            return
+        self.recv_count += 1
 
-    # 接收纸币数据
-    def recv_money_data(self) -> bool:
-        try:
-            data = self.serial_communication.receive_data(self.msg_length)
-            if data is None:
-                return False
-
-            # 解析模式标志（2字节0X0001）
-            mode_flag = struct.unpack('<H', data[:2])[0]
-            if mode_flag != 0x0001:
-                msg = f"recv mode flag failed: mode flag is not correct {mode_flag}"
-                logger.warning(msg)
-                self.push_error(msg)
-                return False
+        # 冠字号查重（失败时不标记重复，不影响推送和入库）
+        self.run_stage('dedup', self.check_duplicate)
 
-            # 解析纸币信息（1644字节）
-            money_data = data[2:-4]
-            fmt = '<HHHIH4HHHH12H24HH4H1536s'  # 总长度=2+2+2+4+2+8+2+2+2+24+48+2+8+1536=1644
-            fields = struct.unpack(fmt, money_data)
-            self.money_info = BanknoteInfo(
-                date=fields[0],
-                time=fields[1],
-                tf_flag=fields[2],
-                valuta=fields[3],
-                fsn_count=fields[4],
-                money_flag=list(fields[5:9]),
-                ver=fields[9],
-                undefine=fields[10],
-                char_num=fields[11],
-                sno=list(fields[12:24]),
-                machine_number=list(fields[24:48]),
-                reserve1=fields[48],  # 调整索引
-                image_sno=TImageSNo(
-                    undefine=list(fields[49:53]),
-                    sno=fields[53]
-                )
-            )
+        # 推送数据
+        if not self.run_stage('push', self.push_data):
+            logger.warning(f"push data failed: data is not correct")
+            return
+        self.push_count += 1
+
+        # 数据入库
+        if not self.run_stage('save', self.save_data):
+            logger.warning(f"save data failed: data is not correct")
+            logger.warning(f"data is {self.message}")
+            return
+        self.save_count += 1
+
+    # 执行一个处理环节，记录耗时和成功、失败次数
+    def run_stage(self, stage: str, func, *args) -> bool:
+        succeeded, failed, seconds = self._stage_metrics[stage]
+        started_at = time.perf_counter()
+        ok = func(*args)
+        seconds.observe(time.perf_counter() - started_at)
+        (succeeded if ok else failed).inc()
+        return ok
+
+    # 汇总输出采集进度
+    def log_progress(self, now: float):
+        if now - self._last_log_at < settings.METRICS.LOG_INTERVAL:
+            return
+        self._last_log_at = now
+        if self.recv_count != self._logged_recv_count:
+            logger.info(f"{self.device} {self.progress()} (+{self.recv_count - self._logged_recv_count})")
+            self._logged_recv_count = self.recv_count
+
+    def progress(self) -> str:
+        return f"recv: {self.recv_count}, push: {self.push_count}, save: {self.save_count}, error: {self.error_count}"
 
-            # 解析结束标志（4字节0XBE）
-            end_flag = data[-4:]
-            if end_flag != b'\xBE\xBE\xBE\xBE':
-                msg = f"recv end flag failed: end flag is not correct {end_flag}"
-                logger.warning(msg)
-                self.push_error(msg)
-                return False
-        except struct.error as e:
+    # 帧同步错误回调
+    def on_frame_error(self, msg: str):
+        logger.warning(msg)
+        self.push_error(msg)
+
+    # 解析纸币数据（帧解析器已校验起始标志、消息长度、模式标志和结束标志）
+    def recv_money_data(self, frame: memoryview) -> bool:
+        try:
+            # 解析纸币信息（1644字节）
+            self.money_info = decode_banknote(frame)
+        except (struct.error, ValueError) as e:
             msg = f"parse money data failed: {str(e)}"
             logger.error(msg)
             self.push_error(msg)
@@ -219,40 +376,59 @@ class SerialController:
 
         return True
 
+    # 冠字号查重
+    def check_duplicate(self) -> bool:
+        self.duplicate = False
+        if not settings.DUPLICATE.ENABLED:
+            return True
+        info = self.money_info
+        try:
+            self.duplicate = duplicates.check(info.currency_code, info.serial_number)
+        except Exception as e:
+            logger.error(f"check duplicate failed: {str(e)}")
+            return False
+        if self.duplicate:
+            self.duplicate_count += 1
+            self._duplicate_notes.inc()
+        return True
 
     # 推送数据
     def push_data(self) -> bool:
-        # 只保留字母和数字，其余字符用空格代替
-        sno_temp = ''.join(chr(c) for c in self.money_info.sno)
-        sno_temp = re.sub(r'[^a-zA-Z0-9]', ' ', sno_temp)
-        # 构造消息
-        self.message = {
-            "type": "serial_data",
-            "data": {
-                'date': f"{self.money_info.parsed_date}",
-                'time': f"{self.money_info.parsed_time}",
-                "tf_flag": f"{self.money_info.tf_flag}",
-                'valuta': f"{self.money_info.valuta}",
-                "fsn_count": f"{self.money_info.fsn_count}",
-                'money_flag': self.money_info.currency_code,
-                "ver": f"{self.money_info.ver}",
-                "undefine": f"{self.money_info.undefine}",
-                "char_num": f"{self.money_info.char_num}",
-                "sno": sno_temp,
-                "machine_number": ''.join(chr(c) for c in self.money_info.machine_number),
-                "reserve1": f"{self.money_info.reserve1}",
-                'image_data': self.image_opt.bmp_to_jpeg(add_bmp_headers(self.money_info.image_sno.sno)),
-                'currency_name': self.money_info.parsed_currency,
-                'create_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # 构造消息（保持字段类型，由推送任务按各连接的格式编码，不占用接收线程）
+        info = self.money_info
+        try:
+            self.message = {
+                "type": "serial_data",
+                "device": self.device,
+                "data": {
+                    'date': info.parsed_date,
+                    'time': info.parsed_time,
+                    "tf_flag": info.tf_flag,
+                    'valuta': info.valuta,
+                    "fsn_count": info.fsn_count,
+                    'money_flag': info.currency_code,
+                    "ver": info.ver,
+                    "undefine": info.undefine,
+                    "char_num": info.char_num,
+                    "sno": info.serial_number,
+                    "machine_number": info.machine_number_text,
+                    "reserve1": info.reserve1,
+                    'image': bytes(info.image),
+                    'currency_name': info.parsed_currency,
+                    'create_at': datetime.now(),
+                    'duplicate': self.duplicate,
+                }
             }
-        }
-
-        # 将数据保存为图片
-        # self.image_opt.save_base64_image(self.message['image_data'])
+        except ValueError as e:
+            # 日期或时间字段无效
+            msg = f"parse money data failed: {str(e)}"
+            logger.error(msg)
+            self.push_error(msg)
+            return False
 
-        # 存入队列
+        # 发布给前端
         try:
-            message_queue.put(self.message)
+            broadcast_hub.publish(self.message)
         except Exception as e:
             msg = f"push data failed: {str(e)}"
             logger.error(msg)
@@ -261,45 +437,69 @@ class SerialController:
         return True
 
 
-    # 数据入库
+    # 数据入库（提交给批量入库线程）
     def save_data(self) -> bool:
+        info = self.money_info
         try:
-            # 数据入库（需要数据库实现）
-            item_data = Result(
-                date = self.message['data']['date'],
-                time = self.message['data']['time'],
-                tf_flag = self.message['data']["tf_flag"],
-                valuta = self.message['data']['valuta'],
-                fsn_count = self.message['data']["fsn_count"],
-                money_flag = self.message['data']['money_flag'],
-                ver = self.message['data']["ver"],
-                undefine = self.message['data']["undefine"],
-                char_num = self.message['data']["char_num"],
-                sno = self.message['data']["sno"],
-                machine_number = self.message['data']["machine_number"],
-                reserve1 = self.message['data']["reserve1"],
-                image_data = self.message['data']['image_data'],
-                currency_name = self.message['data']['currency_name'],
-            )
-            self.db.add(item_data)
-            self.db.commit()
-            self.db.close()
-        except Exception as e:
-            error_msg = f"save data failed: {str(e)}"
+            note_time = dt_time(*info.parsed_time)
+        except ValueError:
+            note_time = None
+        item_data = {
+            'date': info.parsed_date,
+            'time': note_time,
+            'tf_flag': info.tf_flag,
+            'valuta': info.valuta,
+            'fsn_count': info.fsn_count,
+            'money_flag': info.currency_code,
+            'ver': info.ver,
+            'undefine': info.undefine,
+            'char_num': info.char_num,
+            'sno': info.serial_number,
+            'machine_number': info.machine_number_text,
+            'reserve1': info.reserve1,
+            'image': info.image,
+            'currency_name': info.parsed_currency,
+            'create_at': datetime.now(),
+            'session': self.session_id,
+        }
+        if not db_writer.put(item_data, timeout=self._put_timeout):
+            error_msg = f"save data failed: db writer queue is full ({db_writer.pending}/{db_writer.capacity})"
             logger.error(error_msg)
             self.push_error(error_msg)
+            # 未能入库的纸币不作为已出现的冠字号
+            if settings.DUPLICATE.ENABLED:
+                duplicates.remove(item_data['money_flag'], item_data['sno'])
             return False
         return True
 
     # 推送错误提示信息
     def push_error(self, msg: str, type: str = "warning"):
+        self.error_count += 1
         message = {
             "type": type,
+            "device": self.device,
             "data": msg
         }
         try:
-            message_queue.put(message)
+            broadcast_hub.publish(message)
         except Exception as e:
             logger.error(f"push error failed: {str(e)}")
             return False
-        return True
\ No newline at end of file
+        return True
+
+    # 设备状态
+    def stats(self) -> dict:
+        return {
+            "device": self.device,
+            "session": self.session_id,
+            "data_source": self.data_source,
+            "connected": bool(self.serial_communication.is_connected()),
+            "recv": self.recv_count,
+            "push": self.push_count,
+            "save": self.save_count,
+            "error": self.error_count,
+            "duplicate": self.duplicate_count,
+            "frame": self.frame_parser.frame_count,
+            "resync": self.frame_parser.resync_count,
+            "dropped_bytes": self.frame_parser.dropped_bytes,
+        }
@@ -1,24 +1,186 @@
 # 导入系统库
+from datetime import timedelta
 
 # 导入第三方库
 from loguru import logger
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 # 导入自定义库
 from app.services.websocket.websocket_manager import WebSocketManager
+from app.services.websocket.broadcast_hub import BroadcastHub
+from app.services.image.image_store import ImageStore, ImageStoreConfig
+from app.services.image.image_encoder import ImageEncoder
+from app.services.metrics.metrics import MetricsRegistry
+from app.services.export.export_jobs import ExportJobManager
 from app.settings import load_app_settings
 
+
+# 每个SQLite连接建立时设置存储参数
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA journal_mode={config.DB.JOURNAL_MODE}')
+    cursor.execute(f'PRAGMA synchronous={config.DB.SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA mmap_size={config.DB.MMAP_SIZE}')
+    cursor.execute(f'PRAGMA cache_size={config.DB.CACHE_SIZE}')
+    cursor.execute(f'PRAGMA temp_store={config.DB.TEMP_STORE}')
+    cursor.close()
+
+
+# 按配置的连接池参数创建数据库引擎，SQLite连接建立时设置存储参数
+def create_db_engine(url: str) -> Engine:
+    engine = create_engine(
+        url,
+        pool_size=config.DB.POOL_SIZE,
+        max_overflow=config.DB.MAX_OVERFLOW,
+        pool_timeout=config.DB.POOL_TIMEOUT,
+        connect_args={'check_same_thread': False, 'timeout': config.DB.BUSY_TIMEOUT},
+    )
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', set_sqlite_pragmas)
+    return engine
+
+
 # 定义全局变量
 config = load_app_settings()
-engine = create_engine(config.DB.DATABASE_URL)
+engine = create_db_engine(config.DB.DATABASE_URL)
 SessionLocal = sessionmaker(autoflush=config.DB.AUTO_FLASH, bind=engine)
 Base = declarative_base()
+broadcast_hub = BroadcastHub()
+ws_manager = WebSocketManager(
+    broadcast_hub,
+    buffer_size=config.WEBSOCKET.QUEUE_SIZE,
+    policy=config.WEBSOCKET.POLICY,
+    coalesce_types=config.WEBSOCKET.COALESCE_TYPES,
+)
+metrics_registry = MetricsRegistry()
+export_jobs = ExportJobManager(
+    max_workers=config.EXPORT.MAX_WORKERS,
+    max_jobs=config.EXPORT.MAX_JOBS,
+    progress_interval=config.EXPORT.PROGRESS_INTERVAL,
+    on_progress=lambda job: broadcast_hub.publish({"type": "export_progress", "data": job.to_dict()}),
+)
+image_store = None
+image_encoder = None
+summary_aggregator = None
+rollup_rebuilder = None
+duplicate_detector = None
+retention_manager = None
+
 
 # 获取websocket manager实例
-def get_ws_manager():
-    return WebSocketManager()
-        
+def get_ws_manager() -> WebSocketManager:
+    return ws_manager
+
+
+# 获取消息广播中心实例
+def get_broadcast_hub() -> BroadcastHub:
+    return broadcast_hub
+
+
+# 获取指标注册表实例
+def get_metrics_registry() -> MetricsRegistry:
+    return metrics_registry
+
+
+# 获取导出任务管理器实例
+def get_export_jobs() -> ExportJobManager:
+    return export_jobs
+
+
+# 获取图像仓库实例
+def get_image_store() -> ImageStore:
+    global image_store
+    if image_store is None:
+        from app.models import ImageBlob
+        image_store = ImageStore(ImageBlob, ImageStoreConfig(
+            base_dir=config.IMAGE_STORE.BASE_DIR,
+            max_pack_size=config.IMAGE_STORE.MAX_PACK_SIZE,
+        ))
+    return image_store
+
+
+# 获取图像编码服务实例
+def get_image_encoder() -> ImageEncoder:
+    global image_encoder
+    if image_encoder is None:
+        image_encoder = ImageEncoder(
+            max_workers=config.IMAGE_STORE.ENCODE_WORKERS,
+            cache_size=config.IMAGE_STORE.ENCODE_CACHE_SIZE,
+        )
+    return image_encoder
+
+
+# 获取点钞汇总统计实例
+def get_summary_aggregator():
+    global summary_aggregator
+    if summary_aggregator is None:
+        from app.models import Summary
+        from app.services.stats.aggregator import SummaryAggregator
+        summary_aggregator = SummaryAggregator(
+            Summary,
+            SessionLocal,
+            flush_interval=config.STATS.FLUSH_INTERVAL,
+            on_delta=lambda seq, items, reset: broadcast_hub.publish(
+                {"type": "money_stats", "seq": seq, "reset": reset, "data": items}),
+        )
+    return summary_aggregator
+
+
+# 获取预汇总表重建实例
+def get_rollup_rebuilder():
+    global rollup_rebuilder
+    if rollup_rebuilder is None:
+        from app.services.database.rollups import RollupRebuilder
+        rollup_rebuilder = RollupRebuilder(
+            engine,
+            chunk=timedelta(days=config.STATS.ROLLUP_CHUNK_DAYS),
+            pause=config.STATS.ROLLUP_PAUSE,
+            floor=lambda: get_retention_manager().floor(),
+        )
+    return rollup_rebuilder
+
+
+# 获取冠字号重复检测实例
+def get_duplicate_detector():
+    global duplicate_detector
+    if duplicate_detector is None:
+        from app.models import Result
+        from app.services.stats.duplicates import DuplicateDetector
+        duplicate_detector = DuplicateDetector(
+            Result,
+            SessionLocal,
+            capacity=config.DUPLICATE.CAPACITY,
+            error_rate=config.DUPLICATE.ERROR_RATE,
+            recent_size=config.DUPLICATE.RECENT_SIZE,
+            state_file=config.DUPLICATE.STATE_FILE,
+            save_interval=config.DUPLICATE.SAVE_INTERVAL,
+            archives=lambda newest_first: get_retention_manager().archive_sessions(newest_first),
+        )
+    return duplicate_detector
+
+
+# 获取归档和过期清理实例
+def get_retention_manager():
+    global retention_manager
+    if retention_manager is None:
+        from app.models import ArchivePartition, Result
+        from app.services.database.retention import ArchiveStore, RetentionManager
+        retention_manager = RetentionManager(
+            engine,
+            Result,
+            ArchivePartition,
+            ArchiveStore(Result, config.RETENTION.ARCHIVE_DIR, cache_size=config.RETENTION.CACHE_SIZE),
+            hot_months=config.RETENTION.HOT_MONTHS,
+            compress_after_months=config.RETENTION.COMPRESS_AFTER_MONTHS,
+            retention_months=config.RETENTION.RETENTION_MONTHS,
+            batch_size=config.RETENTION.BATCH_SIZE,
+            pause=config.RETENTION.PAUSE,
+            interval=config.RETENTION.INTERVAL,
+            start_delay=config.RETENTION.START_DELAY,
+        )
+    return retention_manager
 
 
 def get_rdbms():
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, String, Integer, DateTime, Text
+from sqlalchemy import Column, String, Integer, DateTime, Date, Time, Text, Index, PrimaryKeyConstraint
 
 from app.extensions import Base
 
@@ -18,21 +18,113 @@ class Config(Base):
 
 class Result(Base):
     __tablename__ = 'result'
+    __table_args__ = (
+        Index('ix_result_create_at_tf_flag', 'create_at', 'tf_flag'),
+        Index('ix_result_sno', 'sno'),
+    )
 
     id = Column('id', Integer, autoincrement=True, primary_key=True)
-    date = Column('date', String(20))
-    time = Column('time', String(20))
-    tf_flag = Column('tf_flag', String(20))
-    valuta = Column('valuta', String(20))
-    fsn_count = Column('fsn_count', String(20))
+    date = Column('date', Date)
+    time = Column('time', Time)
+    tf_flag = Column('tf_flag', Integer)
+    valuta = Column('valuta', Integer)
+    fsn_count = Column('fsn_count', Integer)
     money_flag = Column('money_flag', String(20))
-    ver = Column('ver', String(20))
-    undefine = Column('undefine', String(20))
-    char_num = Column('char_num', String(20))
+    ver = Column('ver', Integer)
+    undefine = Column('undefine', Integer)
+    char_num = Column('char_num', Integer)
     sno = Column('sno', String(200))
     machine_number = Column('machine_number', String(200))
-    reserve1 = Column('reserve1', String(200))
-    image_data = Column('image_data', Text)
+    reserve1 = Column('reserve1', Integer)
+    image_data = Column('image_data', Text)             # 旧数据：base64编码的PNG图像
+    image_ref = Column('image_ref', String(32))         # 图像仓库中的图像哈希
     currency_name = Column('currency_name', String(50))
     calc_time = Column('calc_time', DateTime)
-    create_at = Column('create_at', DateTime, default=datetime.now)
\ No newline at end of file
+    create_at = Column('create_at', DateTime, default=datetime.now)
+
+
+class Counter(Base):
+    __tablename__ = 'counter'
+
+    name = Column('name', String(50), primary_key=True)
+    value = Column('value', Integer, default=0)
+
+
+class ImageBlob(Base):
+    __tablename__ = 'image_blob'
+
+    hash = Column('hash', String(32), primary_key=True)
+    pack = Column('pack', Integer)
+    offset = Column('offset', Integer)
+    size = Column('size', Integer)
+
+
+class Summary(Base):
+    __tablename__ = 'summary'
+    __table_args__ = (
+        PrimaryKeyConstraint('level', 'scope', 'money_flag', 'valuta', 'tf_flag'),
+    )
+
+    level = Column('level', String(10))             # 汇总级别：session、day、machine
+    scope = Column('scope', String(200))            # 会话id、日期（YYYY-MM-DD）或机具编号
+    money_flag = Column('money_flag', String(20))
+    valuta = Column('valuta', Integer)
+    tf_flag = Column('tf_flag', Integer)
+    count = Column('count', Integer, default=0)
+    update_at = Column('update_at', DateTime, default=datetime.now)
+
+
+# 按时间分桶的预汇总表（由result表上的触发器增量维护，可以从result表重新统计）
+class RollupMinute(Base):
+    __tablename__ = 'rollup_minute'
+    __table_args__ = (
+        PrimaryKeyConstraint('bucket', 'machine_number', 'money_flag', 'valuta', 'tf_flag'),
+    )
+
+    bucket = Column('bucket', String(19))               # 时间桶的开始时间（YYYY-MM-DD HH:MM:00）
+    machine_number = Column('machine_number', String(200))
+    money_flag = Column('money_flag', String(20))
+    valuta = Column('valuta', Integer)
+    tf_flag = Column('tf_flag', Integer)
+    count = Column('count', Integer, default=0)
+
+
+class RollupHour(Base):
+    __tablename__ = 'rollup_hour'
+    __table_args__ = (
+        PrimaryKeyConstraint('bucket', 'machine_number', 'money_flag', 'valuta', 'tf_flag'),
+    )
+
+    bucket = Column('bucket', String(19))               # 时间桶的开始时间（YYYY-MM-DD HH:00:00）
+    machine_number = Column('machine_number', String(200))
+    money_flag = Column('money_flag', String(20))
+    valuta = Column('valuta', Integer)
+    tf_flag = Column('tf_flag', Integer)
+    count = Column('count', Integer, default=0)
+
+
+class RollupDay(Base):
+    __tablename__ = 'rollup_day'
+    __table_args__ = (
+        PrimaryKeyConstraint('bucket', 'machine_number', 'money_flag', 'valuta', 'tf_flag'),
+    )
+
+    bucket = Column('bucket', String(19))               # 时间桶的开始时间（YYYY-MM-DD 00:00:00）
+    machine_number = Column('machine_number', String(200))
+    money_flag = Column('money_flag', String(20))
+    valuta = Column('valuta', Integer)
+    tf_flag = Column('tf_flag', Integer)
+    count = Column('count', Integer, default=0)
+
+
+# 按月归档的点钞记录分区（每月一个SQLite文件，表结构与result表相同）
+class ArchivePartition(Base):
+    __tablename__ = 'archive_partition'
+
+    month = Column('month', String(7), primary_key=True)    # 月份（YYYY-MM）
+    state = Column('state', String(20), default='open')     # open：正在归档，sealed：已整理，compressed：已压缩
+    row_count = Column('row_count', Integer, default=0)
+    min_id = Column('min_id', Integer)
+    max_id = Column('max_id', Integer)
+    size = Column('size', Integer, default=0)                # 文件字节数（压缩后为压缩文件的字节数）
+    update_at = Column('update_at', DateTime, default=datetime.now, onupdate=datetime.now)
@@ -1,8 +1,14 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+MAX_SEARCH_LIMIT = 10000  # 每页条数上限
 
 
 class SearchSchema(BaseModel):
     date_range: List[str] = None
     q: str
-    code: str = "all"
\ No newline at end of file
+    code: str = "all"
+    cursor: Optional[int] = None    # 上一页最后一条记录的id，结果按id倒序
+    limit: Optional[int] = Field(None, gt=0, le=MAX_SEARCH_LIMIT)  # 每页条数，为空时返回全部结果
+    stream: bool = False            # 是否以NDJSON格式流式返回
+    excel: bool = False             # 是否同时返回excel_data
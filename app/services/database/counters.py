@@ -0,0 +1,47 @@
+# 导入系统库
+
+# 导入第三方库
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# 导入自定义库
+from app.models import Counter, Result
+
+# 定义常量
+RESULT_COUNTER = 'result'  # 点钞记录总数
+
+_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS result_count_ai AFTER INSERT ON result BEGIN
+        UPDATE counter SET value = value + 1 WHERE name = '{RESULT_COUNTER}';
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS result_count_ad AFTER DELETE ON result BEGIN
+        UPDATE counter SET value = value - 1 WHERE name = '{RESULT_COUNTER}';
+    END''',
+)
+
+
+def ensure_result_counter(engine: Engine):
+    """
+    创建点钞记录计数器及维护计数的触发器
+    所有写入和删除路径（入库线程、删除接口、数据迁移）都会经过触发器，计数始终准确；
+    计数器首次创建时统计一次已有记录数
+    """
+    with engine.begin() as conn:
+        for trigger in _TRIGGERS:
+            conn.exec_driver_sql(trigger)
+        created = conn.execute(
+            text('INSERT OR IGNORE INTO counter (name, value) SELECT :name, count(*) FROM result'),
+            {'name': RESULT_COUNTER}
+        ).rowcount
+    if created:
+        logger.info("result counter created")
+
+
+def get_result_count(db: Session) -> int:
+    """获取点钞记录总数（读取计数器，不扫描数据表）"""
+    value = db.query(Counter.value).filter_by(name=RESULT_COUNTER).scalar()
+    if value is None:
+        return db.query(Result).count()
+    return value
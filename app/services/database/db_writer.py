@@ -0,0 +1,226 @@
+# 导入系统库
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# 导入第三方库
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+# 导入自定义库
+
+# 定义全局变量
+_STOP = object()
+
+
+# 定义批量入库线程
+class BatchWriter:
+    '''
+    功能：
+        1. 从有界队列中收集待入库的数据
+        2. 每满batch_size条或每隔flush_interval_ms毫秒批量写入一次（insert + executemany，一个事务）
+        3. 写入前可通过prepare_rows在同一个事务中预处理数据（如将图像写入图像仓库）
+        4. 写入失败时重试，重试仍失败时逐条写入，只丢弃无法写入的数据，通过on_error上报、on_drop交回该条数据
+        5. 队列积压超过高水位时通过回调上报背压状态，回落到一半以下时上报恢复
+        6. 每批写入成功后通过on_flush回调上报已提交的数据和耗时（在提交之后、下一批提交之前调用，
+           依赖提交结果的统计在这里更新，与数据表一致）
+    '''
+    def __init__(self,
+                 session_factory: Callable,
+                 model,
+                 batch_size: int = 200,
+                 flush_interval_ms: int = 500,
+                 queue_size: int = 10000,
+                 max_retries: int = 3,
+                 retry_interval_ms: int = 200,
+                 high_watermark: float = 0.8,
+                 prepare_rows: Optional[Callable[[Session, List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+                 on_backpressure: Optional[Callable[[bool, int, int], None]] = None,
+                 on_error: Optional[Callable[[str], None]] = None,
+                 on_flush: Optional[Callable[[List[Dict[str, Any]], float], None]] = None,
+                 on_drop: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.session_factory = session_factory
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval_ms / 1000
+        self.high_watermark = max(1, int(queue_size * high_watermark))
+        self.low_watermark = self.high_watermark // 2
+        self.prepare_rows = prepare_rows
+        self.on_backpressure = on_backpressure
+        self.on_error = on_error
+        self.on_flush = on_flush
+        self.on_drop = on_drop  # 数据最终未能写入、被丢弃时调用（参数为该条数据）
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()  # 提交和on_flush回调期间持有，paused期间不提交
+        self._backpressure_lock = threading.Lock()  # 采集线程（put）和入库线程都会更新背压状态
+        self._congested = False
+        # 统计信息
+        self.written_count = 0
+        self.failed_count = 0
+        self.batch_count = 0
+
+    @property
+    def pending(self) -> int:
+        """队列中等待入库的数据条数"""
+        return self._queue.qsize()
+
+    @property
+    def capacity(self) -> int:
+        return self._queue.maxsize
+
+    def start(self):
+        """启动入库线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+            logger.info("db writer started")
+
+    def stop(self, timeout: float = 10.0):
+        """写入队列中剩余的数据后停止入库线程"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if not thread or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        logger.info(f"db writer stopped: written {self.written_count}, failed {self.failed_count}")
+
+    @contextmanager
+    def paused(self):
+        """暂停提交（等待正在提交的批完成），期间提交的数据留在队列中，用于按数据表重新统计"""
+        with self._commit_lock:
+            yield
+
+    def put(self, row: Dict[str, Any], timeout: float = 1.0) -> bool:
+        """
+        提交一条待入库数据
+        :param row: 列名到值的字典
+        :param timeout: 队列已满时最多等待的秒数
+        :return: 是否提交成功（队列持续已满时返回False）
+        """
+        self.start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._update_backpressure()
+            try:
+                self._queue.put(row, timeout=timeout)
+            except queue.Full:
+                return False
+        if not self._congested and self._queue.qsize() >= self.high_watermark:
+            self._update_backpressure()
+        return True
+
+    def _update_backpressure(self):
+        # 状态变化和回调在同一次加锁中完成，通知按状态变化的顺序发出
+        with self._backpressure_lock:
+            pending = self._queue.qsize()
+            if not self._congested and pending >= self.high_watermark:
+                self._congested = True
+            elif self._congested and pending <= self.low_watermark:
+                self._congested = False
+            else:
+                return
+            logger.warning(f"db writer backpressure: {self._congested}, pending {pending}/{self.capacity}")
+            if self.on_backpressure:
+                self.on_backpressure(self._congested, pending, self.capacity)
+
+    def _run(self):
+        batch: List[Dict[str, Any]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            stopping = item is _STOP
+            if item is not None and not stopping:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                # 一次取出队列中已有的数据，减少唤醒次数
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                if self._congested:
+                    self._update_backpressure()
+            if stopping:
+                return
+
+    def _flush(self, rows: List[Dict[str, Any]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._commit_lock:
+                    started_at = time.perf_counter()
+                    self._insert(rows)
+                    self.written_count += len(rows)
+                    self.batch_count += 1
+                    self._flushed(rows, time.perf_counter() - started_at)
+                return
+            except Exception as e:
+                # 除数据库错误外，prepare_rows写入图像仓库时的OSError等也重试，不能让入库线程退出
+                logger.warning(f"db writer flush failed ({attempt + 1}/{self.max_retries + 1}): {str(e)}")
+                time.sleep(self.retry_interval * (attempt + 1))
+
+        # 批量写入持续失败：逐条写入，隔离无法写入的数据
+        for row in rows:
+            try:
+                with self._commit_lock:
+                    started_at = time.perf_counter()
+                    self._insert([row])
+                    self.written_count += 1
+                    self._flushed([row], time.perf_counter() - started_at)
+            except Exception as e:
+                self.failed_count += 1
+                msg = f"save data failed: {str(e)}"
+                logger.error(msg)
+                self._dropped(row)
+                if self.on_error:
+                    self.on_error(msg)
+
+    def _dropped(self, row: Dict[str, Any]):
+        if not self.on_drop:
+            return
+        try:
+            self.on_drop(row)
+        except Exception as e:
+            logger.error(f"db writer on_drop failed: {str(e)}")
+
+    def _flushed(self, rows: List[Dict[str, Any]], seconds: float):
+        if not self.on_flush:
+            return
+        try:
+            self.on_flush(rows, seconds)
+        except Exception as e:
+            # 数据已提交，回调失败不重试
+            logger.error(f"db writer on_flush failed: {str(e)}")
+
+    def _insert(self, rows: List[Dict[str, Any]]):
+        with self.session_factory() as session:
+            if self.prepare_rows:
+                rows = self.prepare_rows(session, rows)
+            session.execute(insert(self.model), rows)
+            session.commit()
@@ -0,0 +1,165 @@
+# 导入系统库
+import re
+import threading
+import time
+from datetime import date, datetime, time as dt_time
+from typing import Any, Callable, Dict, Optional
+
+# 导入第三方库
+from loguru import logger
+from sqlalchemy import insert, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+# 导入自定义库
+
+# 定义常量
+SCHEMA_VERSION = 3              # 当前数据库结构版本（保存在PRAGMA user_version中）
+LEGACY_TABLE = 'result_v1'      # 版本1（全部为字符串列）的数据表重命名后的表名
+INTEGER_COLUMNS = ('tf_flag', 'valuta', 'fsn_count', 'ver', 'undefine', 'char_num', 'reserve1')
+TEXT_COLUMNS = ('money_flag', 'sno', 'machine_number', 'image_data', 'currency_name')
+
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.exec_driver_sql('PRAGMA user_version').scalar() or 0
+
+
+def set_schema_version(conn: Connection, version: int):
+    conn.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+
+
+def drop_legacy_rows(conn: Connection):
+    """删除尚未迁移的旧数据（清空点钞记录时调用）"""
+    conn.exec_driver_sql(f'DROP TABLE IF EXISTS {LEGACY_TABLE}')
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_date(value: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _to_time(value: Any) -> Optional[dt_time]:
+    # 版本1保存的是时间元组字符串，如'(22, 50, 30)'
+    numbers = re.findall(r'\d+', str(value or ''))
+    try:
+        return dt_time(*map(int, numbers[:3])) if len(numbers) >= 3 else None
+    except ValueError:
+        return None
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def convert_legacy_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """将版本1的一行数据转换为版本2的列类型"""
+    item = {'id': row['id'], 'date': _to_date(row['date']), 'time': _to_time(row['time'])}
+    for name in INTEGER_COLUMNS:
+        item[name] = _to_int(row[name])
+    for name in TEXT_COLUMNS:
+        item[name] = row[name]
+    item['calc_time'] = _to_datetime(row['calc_time'])
+    item['create_at'] = _to_datetime(row['create_at'])
+    return item
+
+
+# 定义点钞记录表结构迁移
+class ResultMigration:
+    '''
+    功能：将旧版本的result表在线升级到当前版本
+        版本1 -> 版本2：整数/日期列 + 索引
+        版本2 -> 版本3：增加image_ref列（图像移至图像仓库）
+        1. prepare: 建表前将版本1的旧表重命名为result_v1（只修改元数据，瞬间完成），
+           版本2的表直接增加新列
+        2. start: 建表后设置结构版本，同步迁移最新的一批数据（保证新数据的id接在旧数据之后），
+           其余数据在后台线程中按id从新到旧分批迁移
+    每一批的复制和删除在同一个短事务中完成，迁移中断后下次启动会从剩余数据继续；
+    迁移期间应用正常使用，只是较早的历史记录会稍后才出现在查询结果中。
+    '''
+    def __init__(self, engine: Engine, model, batch_size: int = 2000, pause: float = 0.05,
+                 on_finished: Optional[Callable[[], None]] = None):
+        self.engine = engine
+        self.model = model
+        self.batch_size = batch_size
+        self.pause = pause
+        self.on_finished = on_finished  # 后台迁移完成后调用（如重新统计汇总）
+        self.migrated_count = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def prepare(self):
+        table = self.model.__tablename__
+        with self.engine.begin() as conn:
+            version = get_schema_version(conn)
+            if version >= SCHEMA_VERSION:
+                return
+            tables = inspect(conn).get_table_names()
+            if table not in tables:
+                return
+            if version == 2:
+                conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN image_ref VARCHAR(32)')
+                logger.info(f"upgrade schema: add column {table}.image_ref")
+                return
+            if LEGACY_TABLE in tables:
+                logger.error(f"upgrade schema failed: both {table} and {LEGACY_TABLE} exist")
+                return
+            conn.exec_driver_sql(f'ALTER TABLE {table} RENAME TO {LEGACY_TABLE}')
+            logger.info(f"upgrade schema: rename {table} to {LEGACY_TABLE}")
+
+    def start(self):
+        with self.engine.begin() as conn:
+            if get_schema_version(conn) < SCHEMA_VERSION:
+                set_schema_version(conn, SCHEMA_VERSION)
+            if LEGACY_TABLE not in inspect(conn).get_table_names():
+                return
+
+        # 先同步迁移最新的一批数据
+        if not self.copy_batch():
+            return
+        self._thread = threading.Thread(target=self._run, name="result-migration", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        logger.info("start migrating legacy result rows")
+        started = time.monotonic()
+        try:
+            while self.copy_batch():
+                time.sleep(self.pause)
+        except Exception as e:
+            logger.error(f"migrate legacy result rows failed: {str(e)}")
+            return
+        logger.info(f"migrate legacy result rows finished: {self.migrated_count} rows, cost {time.monotonic() - started:.1f}s")
+        if self.on_finished:
+            self.on_finished()
+
+    def copy_batch(self) -> bool:
+        """迁移一批数据，返回是否还有剩余数据"""
+        try:
+            with self.engine.begin() as conn:
+                rows = conn.execute(
+                    text(f'SELECT * FROM {LEGACY_TABLE} ORDER BY id DESC LIMIT :limit'),
+                    {'limit': self.batch_size}
+                ).mappings().all()
+                if not rows:
+                    drop_legacy_rows(conn)
+                    return False
+                conn.execute(insert(self.model), [convert_legacy_row(row) for row in rows])
+                conn.execute(text(f'DELETE FROM {LEGACY_TABLE} WHERE id >= :min_id'), {'min_id': rows[-1]['id']})
+        except OperationalError as e:
+            # 迁移期间旧表被清空（删除所有记录）
+            if 'no such table' in str(e):
+                return False
+            raise
+        self.migrated_count += len(rows)
+        return True
@@ -0,0 +1,456 @@
+'''
+点钞记录的分区存储、归档和过期清理
+1. result表只保存当月及之前hot_months个月的记录（热分区），更早的记录按月移入归档文件
+   （result_YYYYMM.db，表结构和索引与result表相同），主库的大小和整理代价不再随数据总量增长
+2. 归档按批进行：先写入归档文件，再在一个短事务中从result表删除并更新分区的id范围（事务中预汇总不扣减，
+   归档的记录仍计入统计），查询归档文件时只读取id范围内的记录（committed_filter），
+   中断后重新执行时已写入的记录被忽略，不会重复
+3. 归档完成的月份整理（VACUUM）后不再写入；超过compress_after_months个月的分区压缩为.db.gz，
+   查询时解压到缓存目录（保留最近使用的cache_size个）
+4. 超过retention_months个月的记录过期：result表中的记录按批删除，归档文件整个删除，同时删除该月的预汇总
+分区信息保存在archive_partition表中，查询按时间范围只打开相关的分区
+'''
+
+# 导入系统库
+import gzip
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+# 导入第三方库
+from loguru import logger
+from sqlalchemy import create_engine, delete, func, insert, select, text, true, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+# 导入自定义库
+from app.services.database.rollups import ARCHIVING_COUNTER, GRAINS, TIME_FORMAT, remove_from_rollups
+
+# 定义常量
+OPEN = 'open'              # 正在归档
+SEALED = 'sealed'          # 归档完成并已整理
+COMPRESSED = 'compressed'  # 已压缩
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    month = value.year * 12 + value.month - 1 + months
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def month_key(value: datetime) -> str:
+    return value.strftime('%Y-%m')
+
+
+def month_range(month: str) -> tuple:
+    start = datetime.strptime(month, '%Y-%m')
+    return start, add_months(start, 1)
+
+
+def delete_in_batches(engine: Engine, where: str, params: dict, batch_size: int = 2000, pause: float = 0.05,
+                      stopping: Optional[threading.Event] = None, progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    按批删除点钞记录，每批一个短事务，删除期间入库线程不会长时间等待
+    :param where: 删除条件（SQL）
+    :param progress: 每批删除后以已删除的条数调用
+    :return: 删除的条数
+    """
+    total = 0
+    sql = text(f'DELETE FROM result WHERE id IN (SELECT id FROM result WHERE {where} LIMIT :limit)')
+    while stopping is None or not stopping.is_set():
+        with engine.begin() as conn:
+            deleted = conn.execute(sql, dict(params, limit=batch_size)).rowcount
+        total += deleted
+        if progress is not None:
+            progress(total)
+        if deleted < batch_size:
+            break
+        time.sleep(pause)
+    return total
+
+
+def committed_filter(model, partition):
+    """
+    归档分区中已完成归档的记录：每批记录先写入归档文件，再在一个事务中从result表删除并更新分区的max_id，
+    正在归档的分区中id大于max_id的记录还在result表中，从归档文件读取时排除，同一条记录不会读到两次
+    :return: 查询条件
+    """
+    if partition.state != OPEN or partition.max_id is None:
+        return true()
+    return model.id <= partition.max_id
+
+
+# 定义归档文件存储
+class ArchiveStore:
+    def __init__(self, result_model, base_dir: str, cache_size: int = 4):
+        self.table = result_model.__table__
+        self.base_dir = base_dir
+        self.cache_dir = os.path.join(base_dir, 'cache')
+        self.cache_size = cache_size
+        self._engines: Dict[str, Engine] = {}
+        self._lock = threading.RLock()
+
+    def path(self, month: str, compressed: bool = False) -> str:
+        return os.path.join(self.base_dir, f"result_{month.replace('-', '')}.db" + ('.gz' if compressed else ''))
+
+    def engine(self, path: str) -> Engine:
+        # 不保留连接，文件可以随时压缩、替换和删除
+        with self._lock:
+            engine = self._engines.get(path)
+            if engine is None:
+                engine = self._engines[path] = create_engine(
+                    f'sqlite:///{path}', poolclass=NullPool, connect_args={'check_same_thread': False})
+            return engine
+
+    def create(self, month: str) -> Engine:
+        """打开用于写入的归档文件（不存在时创建，已压缩时先解压）"""
+        with self._lock:
+            if not os.path.exists(self.path(month)) and os.path.exists(self.path(month, True)):
+                self.decompress(month)
+            os.makedirs(self.base_dir, exist_ok=True)
+            engine = self.engine(self.path(month))
+            self.table.create(bind=engine, checkfirst=True)
+            return engine
+
+    def session(self, month: str, compressed: bool = False) -> Session:
+        """打开用于查询的会话（已压缩的分区先解压到缓存目录）"""
+        path = self._cached(month) if compressed else self.path(month)
+        return Session(bind=self.engine(path))
+
+    def seal(self, month: str) -> int:
+        """整理归档完成的文件（VACUUM），返回文件字节数"""
+        path = self.path(month)
+        with self._lock, self.engine(path).connect() as conn:
+            conn.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+        return os.path.getsize(path)
+
+    def compress(self, month: str, compresslevel: int = 6) -> int:
+        """压缩归档文件（先写入.part临时文件，完成后再改名），返回压缩文件字节数"""
+        source, target = self.path(month), self.path(month, True)
+        with self._lock:
+            with open(source, 'rb') as src, gzip.open(target + '.part', 'wb', compresslevel=compresslevel) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(target + '.part', target)
+            self._dispose(source)
+            self._remove_file(source)
+        return os.path.getsize(target)
+
+    def decompress(self, month: str, target: Optional[str] = None) -> str:
+        """解压归档文件；不指定目标时恢复为可写入的归档文件并删除压缩文件"""
+        source = self.path(month, True)
+        restore = target is None
+        target = target or self.path(month)
+        with self._lock:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with gzip.open(source, 'rb') as src, open(target + '.part', 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(target + '.part', target)
+            if restore:
+                os.remove(source)
+                self._evict(month)
+        return target
+
+    def _cached(self, month: str) -> str:
+        path = os.path.join(self.cache_dir, os.path.basename(self.path(month)))
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+                return path
+            self.decompress(month, path)
+            # 只保留最近使用的cache_size个解压文件
+            files = sorted((os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                            if name.endswith('.db')), key=os.path.getmtime, reverse=True)
+            for stale in files[self.cache_size:]:
+                self._dispose(stale)
+                self._remove_file(stale)
+        return path
+
+    def _evict(self, month: str):
+        path = os.path.join(self.cache_dir, os.path.basename(self.path(month)))
+        self._dispose(path)
+        self._remove_file(path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        # 正在查询的文件在Windows下不能删除，留到下次清理
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"remove archive file failed: {str(e)}")
+
+    def _dispose(self, path: str):
+        engine = self._engines.pop(path, None)
+        if engine is not None:
+            engine.dispose()
+
+    def remove(self, month: str):
+        with self._lock:
+            self._evict(month)
+            for path in (self.path(month), self.path(month, True)):
+                self._dispose(path)
+                self._remove_file(path)
+
+    def close(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+
+# 定义归档和过期清理
+class RetentionManager:
+    '''
+    功能：在后台线程中定期执行 过期清理 -> 归档 -> 整理 -> 压缩，每一步都按批或按月进行，
+        stop时在当前批完成后退出，下次启动继续
+    '''
+    def __init__(self, engine: Engine, result_model, partition_model, store: ArchiveStore, hot_months: int = 6,
+                 compress_after_months: int = 12, retention_months: int = 0, batch_size: int = 2000,
+                 pause: float = 0.05, interval: float = 3600.0, start_delay: float = 60.0):
+        self.engine = engine
+        self.table = result_model.__table__
+        self.model = partition_model
+        self.store = store
+        self.hot_months = hot_months
+        self.compress_after_months = compress_after_months
+        self.retention_months = retention_months
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.start_delay = start_delay
+        self.last_run: Optional[dict] = None
+        self._lock = threading.Lock()      # 归档文件和分区信息的修改（每批一次）
+        self._run_lock = threading.Lock()  # 同时只执行一次run_once
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def partitions(self, db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+        """时间范围[start, end]内的分区（按id从新到旧）"""
+        query = select(self.model).where(self.model.row_count > 0)
+        if start is not None:
+            query = query.where(self.model.month >= month_key(start))
+        if end is not None:
+            query = query.where(self.model.month <= month_key(end))
+        return list(db.execute(query.order_by(self.model.max_id.desc())).scalars())
+
+    def find(self, db: Session, record_id: int):
+        """包含指定id的分区"""
+        return db.execute(select(self.model).where(self.model.min_id <= record_id, self.model.max_id >= record_id)
+                          .order_by(self.model.month.desc()).limit(1)).scalars().first()
+
+    def session(self, partition) -> Session:
+        return self.store.session(partition.month, partition.state == COMPRESSED)
+
+    def archive_sessions(self, newest_first: bool = True) -> Iterator[Session]:
+        """依次打开各分区的会话（冠字号查重等需要查询全部分区时使用），提前结束迭代时关闭当前会话"""
+        with Session(self.engine) as db:
+            partitions = self.partitions(db)
+        if not newest_first:
+            partitions.reverse()
+        for partition in partitions:
+            with self.session(partition) as session:
+                yield session
+
+    def floor(self) -> Optional[datetime]:
+        """已归档分区的结束时间（此前的预汇总来自归档的记录）"""
+        with Session(self.engine) as db:
+            month = db.execute(select(func.max(self.model.month))).scalar()
+        return month_range(month)[1] if month else None
+
+    def run_once(self, now: Optional[datetime] = None) -> dict:
+        now = now or datetime.now()
+        with self._run_lock:
+            started_at = time.perf_counter()
+            stats = {'purged': self.purge(now), 'archived': self.archive(now), 'sealed': self.seal(now),
+                     'compressed': self.compress(now)}
+            stats['seconds'] = round(time.perf_counter() - started_at, 3)
+            self.last_run = dict(stats, finished_at=datetime.now().strftime(TIME_FORMAT))
+        if any(stats[name] for name in ('purged', 'archived', 'sealed', 'compressed')):
+            logger.info(f"retention finished: {stats}")
+        return stats
+
+    # 过期清理
+    def purge(self, now: datetime) -> int:
+        if not self.retention_months:
+            return 0
+        cutoff = add_months(month_start(now), -self.retention_months)
+        purged = delete_in_batches(self.engine, 'create_at < :cutoff', {'cutoff': cutoff.strftime(TIME_FORMAT)},
+                                   self.batch_size, self.pause, self._stopping)
+        with Session(self.engine) as db:
+            expired = list(db.execute(select(self.model).where(self.model.month < month_key(cutoff))).scalars())
+        for partition in expired:
+            # result表中该月的记录已删除，剩余的预汇总都来自归档文件
+            self._drop(partition.month)
+            purged += partition.row_count or 0
+            logger.info(f"partition {partition.month} purged: {partition.row_count} records")
+        return purged
+
+    # 将热分区以外的记录按月移入归档文件
+    def archive(self, now: datetime) -> int:
+        if not self.hot_months:
+            return 0
+        cutoff = add_months(month_start(now), -self.hot_months)
+        archived = 0
+        while not self._stopping.is_set():
+            with self.engine.connect() as conn:
+                first = conn.execute(text('SELECT min(create_at) FROM result WHERE create_at < :cutoff'),
+                                     {'cutoff': cutoff.strftime(TIME_FORMAT)}).scalar()
+            if first is None:
+                break
+            archived += self.archive_month(month_key(datetime.fromisoformat(str(first)[:19])))
+        return archived
+
+    def archive_month(self, month: str) -> int:
+        start, end = month_range(month)
+        table = self.table
+        archived = 0
+        with self._lock:
+            with self.engine.begin() as conn:
+                conn.execute(text(f'INSERT OR IGNORE INTO {self.model.__tablename__} (month, state, row_count, size) '
+                                  f'VALUES (:month, :state, 0, 0)'), {'month': month, 'state': OPEN})
+                conn.execute(update(self.model).where(self.model.month == month).values(state=OPEN))
+            archive_engine = self.store.create(month)
+        while not self._stopping.is_set():
+            with self.engine.connect() as conn:
+                rows = conn.execute(select(table).where(table.c.create_at >= start, table.c.create_at < end)
+                                    .order_by(table.c.id).limit(self.batch_size)).mappings().all()
+            if not rows:
+                break
+            with self._lock:
+                # 先写入归档文件，再从result表删除；中断后重新执行时已写入的记录被忽略
+                with archive_engine.begin() as conn:
+                    conn.execute(insert(table).prefix_with('OR IGNORE'), [dict(row) for row in rows])
+                    count, min_id, max_id = conn.execute(
+                        select(func.count(), func.min(table.c.id), func.max(table.c.id)).select_from(table)).first()
+                with self.engine.begin() as conn:
+                    conn.execute(text('UPDATE counter SET value = 1 WHERE name = :name'), {'name': ARCHIVING_COUNTER})
+                    conn.execute(delete(table).where(table.c.id.in_([row['id'] for row in rows])))
+                    conn.execute(text('UPDATE counter SET value = 0 WHERE name = :name'), {'name': ARCHIVING_COUNTER})
+                    conn.execute(update(self.model).where(self.model.month == month).values(
+                        row_count=count, min_id=min_id, max_id=max_id, update_at=datetime.now()))
+            archived += len(rows)
+            time.sleep(self.pause)
+        if archived:
+            logger.info(f"partition {month} archived: {archived} records")
+        return archived
+
+    # 整理归档完成的分区
+    def seal(self, now: datetime) -> int:
+        if not self.hot_months:
+            return 0
+        cutoff = month_key(add_months(month_start(now), -self.hot_months))
+        with Session(self.engine) as db:
+            months = list(db.execute(select(self.model.month).where(self.model.state == OPEN,
+                                                                    self.model.month < cutoff)).scalars())
+        sealed = 0
+        for month in months:
+            if self._stopping.is_set():
+                break
+            with self._lock:
+                size = self.store.seal(month)
+                with self.engine.begin() as conn:
+                    conn.execute(update(self.model).where(self.model.month == month).values(
+                        state=SEALED, size=size, update_at=datetime.now()))
+            sealed += 1
+        return sealed
+
+    # 压缩较早的分区
+    def compress(self, now: datetime) -> int:
+        if not self.compress_after_months:
+            return 0
+        cutoff = month_key(add_months(month_start(now), -self.compress_after_months))
+        with Session(self.engine) as db:
+            months = list(db.execute(select(self.model.month).where(self.model.state == SEALED,
+                                                                    self.model.month < cutoff)).scalars())
+        compressed = 0
+        for month in months:
+            if self._stopping.is_set():
+                break
+            with self._lock:
+                size = self.store.compress(month)
+                with self.engine.begin() as conn:
+                    conn.execute(update(self.model).where(self.model.month == month).values(
+                        state=COMPRESSED, size=size, update_at=datetime.now()))
+            compressed += 1
+        return compressed
+
+    def delete_record(self, record_id: int) -> Optional[dict]:
+        """
+        删除已归档的点钞记录（已压缩的分区先恢复为归档文件，下次检查时重新压缩）
+        :return: 删除的记录，不存在时返回None
+        """
+        table = self.table
+        with self._lock:
+            with Session(self.engine) as db:
+                partition = self.find(db, record_id)
+                if partition is None:
+                    return None
+                month, state = partition.month, partition.state
+            archive_engine = self.store.create(month)
+            with archive_engine.begin() as conn:
+                row = conn.execute(select(table).where(table.c.id == record_id)).mappings().first()
+                if row is None:
+                    return None
+                conn.execute(delete(table).where(table.c.id == record_id))
+            with self.engine.begin() as conn:
+                remove_from_rollups(conn, row)
+                conn.execute(update(self.model).where(self.model.month == month).values(
+                    row_count=self.model.row_count - 1, state=OPEN if state == OPEN else SEALED,
+                    update_at=datetime.now()))
+        return dict(row)
+
+    def remove_all(self):
+        """删除所有分区及其预汇总（删除所有点钞记录时，在result表的记录删除之后调用）"""
+        with Session(self.engine) as db:
+            months = list(db.execute(select(self.model.month)).scalars())
+        for month in months:
+            self._drop(month)
+
+    # 删除一个分区：该月的预汇总、分区信息和归档文件
+    def _drop(self, month: str):
+        start, end = month_range(month)
+        params = {'start': start.strftime(TIME_FORMAT), 'end': end.strftime(TIME_FORMAT)}
+        with self._lock:
+            with self.engine.begin() as conn:
+                for table, _, _ in GRAINS.values():
+                    conn.execute(text(f'DELETE FROM {table} WHERE bucket >= :start AND bucket < :end'), params)
+                conn.execute(delete(self.model).where(self.model.month == month))
+            self.store.remove(month)
+
+    def start(self):
+        """启动后台线程（重复调用无副作用）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """在当前批完成后停止后台线程"""
+        thread, self._thread = self._thread, None
+        self._stopping.set()
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=10)
+        self.store.close()
+
+    def _run(self):
+        delay = self.start_delay
+        while not self._stopping.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"retention failed: {str(e)}")
+            delay = self.interval
+
+    def stats(self, db: Session) -> List[dict]:
+        return [{'month': partition.month, 'state': partition.state, 'row_count': partition.row_count,
+                 'min_id': partition.min_id, 'max_id': partition.max_id, 'size': partition.size,
+                 'update_at': partition.update_at}
+                for partition in db.execute(select(self.model).order_by(self.model.month)).scalars()]
@@ -0,0 +1,259 @@
+# 导入系统库
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 导入第三方库
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+# 导入自定义库
+
+# 定义常量
+# 时间粒度（从粗到细）：名称 -> (汇总表, strftime格式, 时长)
+GRAINS = {
+    'day': ('rollup_day', '%Y-%m-%d 00:00:00', timedelta(days=1)),
+    'hour': ('rollup_hour', '%Y-%m-%d %H:00:00', timedelta(hours=1)),
+    'minute': ('rollup_minute', '%Y-%m-%d %H:%M:00', timedelta(minutes=1)),
+}
+# 汇总的维度及空值时的默认值（主键列不能为NULL，否则upsert无法匹配）
+KEY_COLUMNS = {'machine_number': "''", 'money_flag': "''", 'valuta': '0', 'tf_flag': '0'}
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+RESULT_SOURCE = 'result'  # 无法对齐到分钟的时间段直接统计点钞记录
+ARCHIVING_COUNTER = 'archiving'  # 归档事务中置为1，期间删除点钞记录不扣减汇总（归档的记录仍计入统计）
+
+
+def _keys(row: str) -> str:
+    return ', '.join(f'coalesce({row}.{name}, {default})' for name, default in KEY_COLUMNS.items())
+
+
+_COLUMNS = 'bucket, ' + ', '.join(KEY_COLUMNS) + ', count'
+_MATCH = ' AND '.join(f'{name} = coalesce(old.{name}, {default})' for name, default in KEY_COLUMNS.items())
+_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS result_rollup_ai AFTER INSERT ON result WHEN new.create_at IS NOT NULL BEGIN\n' + ''.join(
+        f"""INSERT INTO {table} ({_COLUMNS}) VALUES (strftime('{fmt}', new.create_at), {_keys('new')}, 1)
+            ON CONFLICT({_COLUMNS[:-len(', count')]}) DO UPDATE SET count = count + 1;\n"""
+        for table, fmt, _ in GRAINS.values()
+    ) + 'END',
+    'CREATE TRIGGER IF NOT EXISTS result_rollup_ad AFTER DELETE ON result WHEN old.create_at IS NOT NULL AND NOT EXISTS '
+    f"(SELECT 1 FROM counter WHERE name = '{ARCHIVING_COUNTER}' AND value = 1) BEGIN\n" + ''.join(
+        f"""UPDATE {table} SET count = count - 1 WHERE bucket = strftime('{fmt}', old.create_at) AND {_MATCH};\n"""
+        for table, fmt, _ in GRAINS.values()
+    ) + 'END',
+)
+
+
+def ensure_rollups(engine: Engine) -> bool:
+    """
+    创建维护预汇总表的触发器（点钞记录写入、删除时更新分钟、小时、天三个粒度的计数）
+    :return: 是否需要从点钞记录重新统计（汇总表为空而已有点钞记录，如升级后首次启动）
+    """
+    with engine.begin() as conn:
+        # 触发器的定义可能随版本变化，每次启动重新创建
+        conn.exec_driver_sql('DROP TRIGGER IF EXISTS result_rollup_ai')
+        conn.exec_driver_sql('DROP TRIGGER IF EXISTS result_rollup_ad')
+        for trigger in _TRIGGERS:
+            conn.exec_driver_sql(trigger)
+        conn.execute(text('INSERT OR IGNORE INTO counter (name, value) VALUES (:name, 0)'), {'name': ARCHIVING_COUNTER})
+        empty = conn.exec_driver_sql('SELECT 1 FROM rollup_day LIMIT 1').first() is None
+        has_results = conn.exec_driver_sql('SELECT 1 FROM result LIMIT 1').first() is not None
+    return empty and has_results
+
+
+def remove_from_rollups(conn: Connection, row: dict):
+    """扣减一条不在result表中的记录（已归档的记录被删除时）"""
+    if row.get('create_at') is None:
+        return
+    params = {name: row.get(name) for name in KEY_COLUMNS}
+    params['create_at'] = row['create_at'].strftime(TIME_FORMAT)
+    match = ' AND '.join(f'{name} = coalesce(:{name}, {default})' for name, default in KEY_COLUMNS.items())
+    for table, fmt, _ in GRAINS.values():
+        conn.execute(text(f"UPDATE {table} SET count = count - 1 WHERE bucket = strftime('{fmt}', :create_at) AND {match}"),
+                     params)
+
+
+def clear_rollups(conn: Connection):
+    """清空预汇总表（删除所有点钞记录前调用，删除触发器不再逐行更新汇总）"""
+    for table, _, _ in GRAINS.values():
+        conn.exec_driver_sql(f'DELETE FROM {table}')
+
+
+def floor_time(value: datetime, grain: str) -> datetime:
+    if grain == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if grain == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(second=0, microsecond=0)
+
+
+def ceil_time(value: datetime, grain: str) -> datetime:
+    floor = floor_time(value, grain)
+    return floor if floor == value else floor + GRAINS[grain][2]
+
+
+def plan_query(start: datetime, end: datetime, interval: Optional[str] = None) -> List[Tuple[str, datetime, datetime]]:
+    """
+    将时间段[start, end)拆分为各粒度的汇总表查询：中间部分使用能对齐的最粗粒度，
+    两端不能对齐的部分逐级使用更细的粒度，不足一分钟的部分直接统计点钞记录
+    :param interval: 结果的时间间隔，只能使用不比它粗的粒度；为None时不分时间段
+    :return: [(粒度或result, 开始时间, 结束时间), ...]
+    """
+    names = list(GRAINS)
+    if interval is not None:
+        names = names[names.index(interval):]
+
+    def split(start: datetime, end: datetime, index: int) -> list:
+        if start >= end:
+            return []
+        if index == len(names):
+            return [(RESULT_SOURCE, start, end)]
+        grain = names[index]
+        aligned_start, aligned_end = ceil_time(start, grain), floor_time(end, grain)
+        if aligned_start >= aligned_end:
+            return split(start, end, index + 1)
+        return split(start, aligned_start, index + 1) + [(grain, aligned_start, aligned_end)] + \
+            split(aligned_end, end, index + 1)
+
+    return split(start, end, 0)
+
+
+def query_rollups(conn: Connection, start: datetime, end: datetime, interval: Optional[str] = None,
+                  group_by: Sequence[str] = (), filters: Optional[Dict[str, object]] = None) -> Tuple[List[dict], list]:
+    """
+    按时间段统计点钞数量和金额
+    :param interval: 时间间隔（minute、hour、day），为None时整个时间段合计
+    :param group_by: 分组维度（machine_number、money_flag、valuta、tf_flag）
+    :param filters: 维度 -> 值，只统计匹配的记录
+    :return: (结果列表, 查询计划)
+    """
+    if interval is not None and interval not in GRAINS:
+        raise ValueError(f"unknown interval: {interval}")
+    filters = filters or {}
+    for name in list(group_by) + list(filters):
+        if name not in KEY_COLUMNS:
+            raise ValueError(f"unknown dimension: {name}")
+
+    plan = plan_query(start, end, interval)
+    totals: Dict[tuple, list] = {}
+    for source, piece_start, piece_end in plan:
+        if source == RESULT_SOURCE:
+            table, time_column, count, amount = 'result', 'create_at', 'count(*)', 'sum(coalesce(valuta, 0))'
+            columns = [f'coalesce({name}, {KEY_COLUMNS[name]})' for name in group_by]
+            conditions = [f'coalesce({name}, {KEY_COLUMNS[name]}) = :f_{name}' for name in filters]
+        else:
+            table, time_column, count, amount = GRAINS[source][0], 'bucket', 'sum(count)', 'sum(count * valuta)'
+            columns = list(group_by)
+            conditions = [f'{name} = :f_{name}' for name in filters]
+        bucket = f"strftime('{GRAINS[interval][1]}', {time_column})" if interval else "''"
+        sql = (f"SELECT {', '.join([bucket] + columns)}, {count}, {amount} FROM {table} "
+               f"WHERE {' AND '.join([f'{time_column} >= :start AND {time_column} < :end'] + conditions)} "
+               f"GROUP BY {', '.join(str(i + 1) for i in range(len(columns) + 1))}")
+        params = {'start': piece_start.strftime(TIME_FORMAT), 'end': piece_end.strftime(TIME_FORMAT)}
+        params.update({f'f_{name}': value for name, value in filters.items()})
+        for row in conn.execute(text(sql), params):
+            total = totals.setdefault(tuple(row[:-2]), [0, 0])
+            total[0] += row[-2] or 0
+            total[1] += row[-1] or 0
+
+    rows = []
+    for key, (count, amount) in sorted(totals.items()):
+        if not count:
+            continue
+        row = {'bucket': key[0] or None}
+        row.update(zip(group_by, key[1:]))
+        row.update({'count': count, 'amount': amount})
+        rows.append(row)
+    return rows, [{'source': source, 'start': s.strftime(TIME_FORMAT), 'end': e.strftime(TIME_FORMAT)}
+                  for source, s, e in plan]
+
+
+# 定义预汇总表重建线程
+class RollupRebuilder:
+    '''
+    功能：在后台从点钞记录重新统计预汇总表（数据迁移完成、删除所有记录后）
+        按天分段重建，每段的删除和统计在一个短事务中完成，期间触发器维护的新数据不受影响，
+        入库线程最多等待一段的时间；重建期间再次请求时，本次完成后重新执行一次
+        floor返回已归档分区的结束时间，此前的汇总来自已归档的记录，重建时保留
+    '''
+    def __init__(self, engine: Engine, chunk: timedelta = timedelta(days=1), pause: float = 0.01,
+                 floor: Optional[Callable[[], Optional[datetime]]] = None):
+        self.engine = engine
+        self.floor = floor
+        self.chunk = chunk
+        self.pause = pause
+        self.rebuild_count = 0
+        self._again = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def rebuilding(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def request(self):
+        with self._lock:
+            if self.rebuilding:
+                self._again = True
+                return
+            self._thread = threading.Thread(target=self._run, name="rollup-rebuild", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            self._again = False
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"rebuild rollups failed: {str(e)}")
+            with self._lock:
+                if not self._again:
+                    return
+
+    def rebuild(self):
+        started_at = time.perf_counter()
+        floor = self.floor() if self.floor else None
+        params = {'floor': floor.strftime(TIME_FORMAT) if floor else ''}
+        with self.engine.connect() as conn:
+            first, last = conn.execute(text('SELECT min(create_at), max(create_at) FROM result '
+                                            'WHERE create_at >= :floor'), params).first()
+        if first is None:
+            with self.engine.begin() as conn:
+                for table, _, _ in GRAINS.values():
+                    conn.execute(text(f'DELETE FROM {table} WHERE bucket >= :floor'), params)
+            self.rebuild_count += 1
+            return
+        start = floor_time(datetime.fromisoformat(str(first)[:19]), 'day')
+        end = floor_time(datetime.fromisoformat(str(last)[:19]), 'day') + GRAINS['day'][2]
+
+        # 删除时间范围以外的汇总（已归档的部分除外）
+        params.update({'start': start.strftime(TIME_FORMAT), 'end': end.strftime(TIME_FORMAT)})
+        with self.engine.begin() as conn:
+            for table, _, _ in GRAINS.values():
+                conn.execute(text(f'DELETE FROM {table} '
+                                  f'WHERE bucket >= :floor AND (bucket < :start OR bucket >= :end)'), params)
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + self.chunk, end)
+            self._rebuild_range(chunk_start, chunk_end)
+            chunk_start = chunk_end
+            time.sleep(self.pause)
+        self.rebuild_count += 1
+        logger.info(f"rollups rebuilt: {start:%Y-%m-%d} - {end:%Y-%m-%d}, {time.perf_counter() - started_at:.2f}s")
+
+    def _rebuild_range(self, start: datetime, end: datetime):
+        params = {'start': start.strftime(TIME_FORMAT), 'end': end.strftime(TIME_FORMAT)}
+        with self.engine.begin() as conn:
+            for table, fmt, _ in GRAINS.values():
+                conn.execute(text(f'DELETE FROM {table} WHERE bucket >= :start AND bucket < :end'), params)
+                conn.execute(text(
+                    f"INSERT INTO {table} ({_COLUMNS}) "
+                    f"SELECT strftime('{fmt}', create_at), {_keys('result')}, count(*) FROM result "
+                    f"WHERE create_at >= :start AND create_at < :end GROUP BY 1, 2, 3, 4, 5"
+                ), params)
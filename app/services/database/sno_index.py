@@ -0,0 +1,75 @@
+# 导入系统库
+
+# 导入第三方库
+from loguru import logger
+from sqlalchemy import inspect, literal_column, select, true, table, column
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+# 导入自定义库
+
+# 定义常量
+SNO_INDEX_TABLE = 'result_sno_fts'  # 冠字号码trigram全文索引（FTS5外部内容表，内容来自result表）
+MIN_QUERY_LENGTH = 3                # trigram索引只能加速不少于3个字符的查询
+
+# 定义全局变量
+_index_table = table(SNO_INDEX_TABLE, column('rowid'))
+_index_enabled = False
+
+_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS result_sno_ai AFTER INSERT ON result BEGIN
+        INSERT INTO {SNO_INDEX_TABLE}(rowid, sno) VALUES (new.id, new.sno);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS result_sno_ad AFTER DELETE ON result BEGIN
+        INSERT INTO {SNO_INDEX_TABLE}({SNO_INDEX_TABLE}, rowid, sno) VALUES ('delete', old.id, old.sno);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS result_sno_au AFTER UPDATE OF sno ON result BEGIN
+        INSERT INTO {SNO_INDEX_TABLE}({SNO_INDEX_TABLE}, rowid, sno) VALUES ('delete', old.id, old.sno);
+        INSERT INTO {SNO_INDEX_TABLE}(rowid, sno) VALUES (new.id, new.sno);
+    END''',
+)
+
+
+def ensure_sno_index(engine: Engine) -> bool:
+    """
+    创建冠字号码索引及同步触发器（需要SQLite 3.34+的FTS5 trigram分词器）
+    索引表首次创建时根据result表重建索引
+    :return: 索引是否可用，不可用时查询退回LIKE全表扫描
+    """
+    global _index_enabled
+    try:
+        with engine.begin() as conn:
+            created = SNO_INDEX_TABLE not in inspect(conn).get_table_names()
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SNO_INDEX_TABLE} "
+                f"USING fts5(sno, content='result', content_rowid='id', tokenize='trigram')"
+            )
+            for trigger in _TRIGGERS:
+                conn.exec_driver_sql(trigger)
+            if created:
+                conn.exec_driver_sql(f"INSERT INTO {SNO_INDEX_TABLE}({SNO_INDEX_TABLE}) VALUES ('rebuild')")
+                logger.info("sno index created")
+    except OperationalError as e:
+        logger.warning(f"sno index is not available, fall back to LIKE: {str(e)}")
+        _index_enabled = False
+        return False
+    _index_enabled = True
+    return True
+
+
+def sno_filter(model, q: str, use_index: bool = True):
+    """
+    冠字号码子串查询条件
+    :param model: 点钞记录模型（Result）
+    :param q: 冠字号码的一部分
+    :param use_index: 是否使用全文索引（归档分区没有全文索引，按月分区的LIKE扫描范围有限）
+    """
+    if not q:
+        return true()
+    if use_index and _index_enabled and len(q) >= MIN_QUERY_LENGTH:
+        # 双引号包裹为短语，trigram分词下即子串匹配（不区分大小写，与LIKE一致）
+        phrase = '"' + q.replace('"', '""') + '"'
+        return model.id.in_(
+            select(_index_table.c.rowid).where(literal_column(SNO_INDEX_TABLE).op('MATCH')(phrase))
+        )
+    return model.sno.like(f'%{q}%')
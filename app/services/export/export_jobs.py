@@ -0,0 +1,141 @@
+# 导入系统库
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+# 导入第三方库
+from loguru import logger
+
+# 导入自定义库
+
+# 定义常量
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+# 定义导出任务
+class ExportJob:
+    def __init__(self, kind: str, total: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = PENDING
+        self.done = 0
+        self.total = total
+        self.file_path: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._finished = threading.Event()  # 结束消息发布之后才设置
+        self._manager: Optional['ExportJobManager'] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def update(self, done: int, total: Optional[int] = None):
+        """由导出函数上报进度（在导出线程中调用）"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        if self._manager is not None:
+            self._manager.report(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "file_name": os.path.basename(self.file_path) if self.file_path else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# 定义导出任务管理器
+class ExportJobManager:
+    '''
+    功能：在后台线程中执行导出任务，接口请求立即返回任务id
+        1. 导出函数func(job)返回生成的文件路径，执行过程中调用job.update上报进度
+        2. 进度通过on_progress回调发布（至少间隔progress_interval秒，开始和结束时一定发布）
+        3. 只保留最近max_jobs个任务，超出时删除最早完成的任务记录（不删除文件）
+        4. 删除所有点钞记录等耗时的后台任务也在这里执行（func返回None，没有文件）
+    '''
+    def __init__(self, max_workers: int = 1, max_jobs: int = 50, progress_interval: float = 0.5,
+                 on_progress: Optional[Callable[[ExportJob], None]] = None):
+        self.max_jobs = max_jobs
+        self.progress_interval = progress_interval
+        self.on_progress = on_progress
+        self._jobs: OrderedDict = OrderedDict()
+        self._reported_at = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+
+    def submit(self, kind: str, func: Callable[[ExportJob], str], total: Optional[int] = None) -> ExportJob:
+        job = ExportJob(kind, total)
+        job._manager = self
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job: ExportJob, func: Callable[[ExportJob], str]):
+        job.status = RUNNING
+        self.report(job, force=True)
+        started_at = time.perf_counter()
+        try:
+            job.file_path = func(job)
+            job.status = DONE
+            logger.info(f"export {job.kind} {job.id} done: {job.done} rows, "
+                        f"{time.perf_counter() - started_at:.2f}s, {job.file_path}")
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            logger.exception(f"export {job.kind} {job.id} failed: {str(e)}")
+        job.finished_at = time.time()
+        self.report(job, force=True)
+        self._reported_at.pop(job.id, None)
+        job._finished.set()
+
+    def report(self, job: ExportJob, force: bool = False):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._reported_at.get(job.id, 0.0) < self.progress_interval:
+            return
+        self._reported_at[job.id] = now
+        try:
+            self.on_progress(job)
+        except Exception as e:
+            logger.warning(f"report export progress failed: {str(e)}")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        while len(self._jobs) > self.max_jobs and finished:
+            self._jobs.pop(finished.pop(0), None)
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ExportJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[ExportJob]:
+        """等待任务结束（测试和命令行使用）"""
+        job = self.get(job_id)
+        if job is not None:
+            job._finished.wait(timeout)
+        return job
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,196 @@
+'''
+批量导出文件的写入器，数据按批写入，内存占用与导出条数无关
+1. CSV：UTF-8（带BOM，Excel可直接打开），第一行为列名
+2. NDJSON.gz：每行一条JSON记录，gzip压缩
+3. Parquet：列式存储，需要安装pyarrow（可选依赖，未安装时不能选择该格式）
+4. FSN：二进制文件，全部为小端字节序
+    文件头（16字节）：
+        magic       4s  b'GFSN'
+        version     H   文件版本，当前为1
+        record_size H   每条记录的字节数（纸币信息结构BanknoteInfo，1644字节）
+        count       I   记录条数（写入完成后回填）
+        reserved    I   保留，为0
+    之后为count条纸币信息记录，布局与串口协议中的纸币信息（位置8-1651）一致
+所有写入器都先写入.part临时文件，完成后再改名，下载时不会读到不完整的文件
+'''
+
+# 导入系统库
+import csv
+import gzip
+import json
+import os
+import struct
+from datetime import datetime, date, time as dt_time
+from typing import Iterator, Sequence, Tuple
+
+# 导入第三方库
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# 导入自定义库
+
+# 定义常量
+FSN_MAGIC = b'GFSN'
+FSN_VERSION = 1
+FSN_HEADER = struct.Struct('<4sHHII')
+
+
+def parquet_available() -> bool:
+    return pyarrow is not None
+
+
+def json_default(value):
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+# 定义导出文件写入器基类
+class ExportFileWriter:
+    '''
+    功能：按批写入导出文件
+        write(rows)写入一批记录，close()完成写入并改名为最终文件名，abort()删除未完成的文件
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self.temp_path = path + '.part'
+        self.row_count = 0
+
+    def write(self, rows: Sequence):
+        self._write(rows)
+        self.row_count += len(rows)
+
+    def _write(self, rows: Sequence):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def close(self) -> str:
+        self._close()
+        os.replace(self.temp_path, self.path)
+        return self.path
+
+    def abort(self):
+        try:
+            self._close()
+        except Exception:
+            pass
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+
+
+# 定义CSV写入器：rows为与columns顺序一致的元组
+class CsvFileWriter(ExportFileWriter):
+    def __init__(self, path: str, columns: Sequence[str]):
+        super().__init__(path)
+        self.file = open(self.temp_path, 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def _write(self, rows: Sequence):
+        self.writer.writerows(rows)
+
+    def _close(self):
+        self.file.close()
+
+
+# 定义NDJSON.gz写入器：rows为与columns顺序一致的元组
+class NdjsonGzFileWriter(ExportFileWriter):
+    def __init__(self, path: str, columns: Sequence[str], compresslevel: int = 6):
+        super().__init__(path)
+        self.columns = list(columns)
+        self.file = gzip.open(self.temp_path, 'wt', encoding='utf-8', compresslevel=compresslevel)
+
+    def _write(self, rows: Sequence):
+        columns = self.columns
+        self.file.write(''.join(
+            json.dumps(dict(zip(columns, row)), default=json_default, ensure_ascii=False) + '\n' for row in rows
+        ))
+
+    def _close(self):
+        self.file.close()
+
+
+# 定义Parquet写入器：rows为与columns顺序一致的元组，每批写入一个row group
+class ParquetFileWriter(ExportFileWriter):
+    def __init__(self, path: str, columns: Sequence[Tuple[str, str]], compression: str = 'zstd'):
+        """
+        :param columns: [(列名, 类型), ...]，类型为int、float、str、date、time、datetime
+        """
+        if pyarrow is None:
+            raise RuntimeError("parquet export requires pyarrow")
+        super().__init__(path)
+        types = {
+            'int': pyarrow.int64(),
+            'float': pyarrow.float64(),
+            'str': pyarrow.string(),
+            'date': pyarrow.date32(),
+            'time': pyarrow.time64('us'),
+            'datetime': pyarrow.timestamp('us'),
+        }
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(self.temp_path, self.schema, compression=compression)
+
+    def _write(self, rows: Sequence):
+        if not rows:
+            return
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def _close(self):
+        self.writer.close()
+
+
+# 定义FSN写入器：rows为已编码的定长记录
+class FsnFileWriter(ExportFileWriter):
+    def __init__(self, path: str, record_size: int):
+        super().__init__(path)
+        self.record_size = record_size
+        self.file = open(self.temp_path, 'wb')
+        self.file.write(FSN_HEADER.pack(FSN_MAGIC, FSN_VERSION, record_size, 0, 0))
+
+    def _write(self, rows: Sequence[bytes]):
+        for record in rows:
+            if len(record) != self.record_size:
+                raise ValueError(f"fsn record size {len(record)} != {self.record_size}")
+        self.file.write(b''.join(rows))
+
+    def _close(self):
+        if self.file.closed:
+            return
+        # 回填记录条数
+        self.file.seek(0)
+        self.file.write(FSN_HEADER.pack(FSN_MAGIC, FSN_VERSION, self.record_size, self.row_count, 0))
+        self.file.close()
+
+
+def read_fsn(path: str) -> Iterator[bytes]:
+    """
+    逐条读取FSN文件中的记录
+    :raises ValueError: 文件头无效或文件不完整
+    """
+    with open(path, 'rb') as f:
+        header = f.read(FSN_HEADER.size)
+        if len(header) != FSN_HEADER.size:
+            raise ValueError("invalid fsn file: header is truncated")
+        magic, version, record_size, count, _ = FSN_HEADER.unpack(header)
+        if magic != FSN_MAGIC or version != FSN_VERSION:
+            raise ValueError(f"invalid fsn file: magic {magic!r}, version {version}")
+        for _ in range(count):
+            record = f.read(record_size)
+            if len(record) != record_size:
+                raise ValueError("invalid fsn file: record is truncated")
+            yield record
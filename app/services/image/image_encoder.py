@@ -0,0 +1,88 @@
+# 系统标准库
+import asyncio
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+# 第三方库
+# 这里没有第三方库导入
+
+# 自定义库
+from app.services.image.image_store import raw_to_png
+
+
+class ImageEncoder:
+    """
+    图像编码服务
+    原始像素在需要时才编码为PNG（推送给前端、查询、获取图像），
+    编码在线程池中执行，结果按图像哈希缓存（LRU），相同图像只编码一次
+    """
+
+    def __init__(self, max_workers: int = 2, cache_size: int = 4096, digest_size: int = 16):
+        """
+        :param max_workers: 编码线程数
+        :param cache_size: 缓存的已编码图像条数
+        :param digest_size: 哈希字节数（与图像仓库一致，缓存可以直接用image_ref查找）
+        """
+        self.cache_size = cache_size
+        self.digest_size = digest_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-encoder")
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def digest(self, image: bytes) -> str:
+        return hashlib.blake2b(image, digest_size=self.digest_size).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """按哈希读取缓存的PNG，不存在时返回None"""
+        with self._lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+                self.hit_count += 1
+            return png
+
+    def _put(self, key: str, png: bytes):
+        with self._lock:
+            self._cache[key] = png
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def encode_png(self, image: bytes, key: Optional[str] = None) -> bytes:
+        """
+        将原始像素编码为PNG（在调用线程中执行）
+        :param image: 96*16的8位灰度原始像素
+        :param key: 图像哈希，如果为None则根据像素计算
+        """
+        key = key or self.digest(image)
+        png = self.get(key)
+        if png is None:
+            with self._lock:
+                self.miss_count += 1
+            png = raw_to_png(image)
+            self._put(key, png)
+        return png
+
+    def encode_base64(self, image: bytes, key: Optional[str] = None) -> str:
+        return base64.b64encode(self.encode_png(image, key)).decode('utf-8')
+
+    def submit(self, image: bytes, key: Optional[str] = None) -> Future:
+        """提交到线程池编码，返回base64编码结果的Future"""
+        return self._executor.submit(self.encode_base64, image, key)
+
+    async def encode_base64_async(self, image: bytes, key: Optional[str] = None) -> str:
+        """在事件循环中等待线程池编码完成，缓存命中时直接返回"""
+        key = key or self.digest(image)
+        png = self.get(key)
+        if png is not None:
+            return base64.b64encode(png).decode('utf-8')
+        return await asyncio.wrap_future(self.submit(image, key))
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
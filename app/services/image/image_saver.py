@@ -163,31 +163,27 @@ class ImageSaverService:
     
 
 
-def add_bmp_headers(pixel_data: bytes) -> bytes:
+def build_bmp_header(width: int = 96, height: int = 16) -> bytes:
     """
-    为灰度图像数据添加BMP文件头和信息头
+    构造8位灰度图像的BMP文件头、信息头和调色板
     参数：
-        pixel_data: 原始像素数据 (96x16 8-bit灰度)
+        width: 图像宽度
+        height: 图像高度
     返回：
-        完整的BMP文件字节数据
+        像素数据之前的全部字节（1078字节）
     """
-    # 基本参数
-    width = 96
-    height = 16
     bpp = 8  # 8位灰度
-    image_size = len(pixel_data)  # 96*16=1536
-    
+    image_size = width * height  # 96*16=1536
+
     # 1. 创建调色板（256色灰度）
-    palette = bytearray()
-    for i in range(256):
-        palette.extend((i, i, i, 0))  # BGR + reserved
-    
+    palette = bytes(value for i in range(256) for value in (i, i, i, 0))  # BGR + reserved
+
     # 2. 计算各段大小
     file_header_size = 14
     info_header_size = 40
     palette_size = len(palette)  # 256*4=1024
     pixel_offset = file_header_size + info_header_size + palette_size  # 14+40+1024=1078
-    
+
     # 3. 构建文件头 (BITMAPFILEHEADER)
     file_header = struct.pack(
         '<2sIHHI',
@@ -215,5 +211,19 @@ def add_bmp_headers(pixel_data: bytes) -> bytes:
     )
 
     # 5. 组合所有部分
-    return file_header + info_header + palette + pixel_data
+    return file_header + info_header + palette
+
 
+# 96*16灰度图像的BMP头只需构造一次
+BMP_HEADER = build_bmp_header()
+
+
+def add_bmp_headers(pixel_data: bytes) -> bytes:
+    """
+    为灰度图像数据添加BMP文件头和信息头
+    参数：
+        pixel_data: 原始像素数据 (96x16 8-bit灰度)
+    返回：
+        完整的BMP文件字节数据
+    """
+    return BMP_HEADER + bytes(pixel_data)
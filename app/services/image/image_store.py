@@ -0,0 +1,198 @@
+# 系统标准库
+import os
+import io
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# 第三方库
+from loguru import logger
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+# 自定义库
+# 这里没有自定义库导入
+
+# 定义常量
+IMAGE_WIDTH = 96
+IMAGE_HEIGHT = 16
+IMAGE_SIZE = IMAGE_WIDTH * IMAGE_HEIGHT  # 8位灰度原始像素，1536字节
+
+
+@dataclass
+class ImageStoreConfig:
+    """图像仓库配置"""
+    base_dir: str = "images"                    # 包文件目录
+    pack_prefix: str = "pack"                   # 包文件名前缀
+    max_pack_size: int = 256 * 1024 * 1024      # 单个包文件最大字节数
+    digest_size: int = 16                       # 哈希字节数（十六进制后32个字符）
+    written_size: int = 10000                   # 记住最近写入包文件的图像位置的条数（入库重试时复用，不重复写入）
+
+
+class ImageStore:
+    """
+    内容寻址的图像仓库
+    原始像素按哈希去重后追加写入包文件（只追加，不修改），
+    哈希到(包文件, 偏移, 长度)的索引保存在数据库的image_blob表中，与点钞记录在同一个事务中提交；
+    事务失败时包文件中的图像已写入，最近写入的位置保存在内存中，重试时复用
+    """
+
+    def __init__(self, blob_model, config: Optional[ImageStoreConfig] = None):
+        """
+        :param blob_model: 图像索引模型（ImageBlob）
+        :param config: 仓库配置，如果为None则使用默认配置
+        """
+        self.blob_model = blob_model
+        self.config = config or ImageStoreConfig()
+        self._lock = threading.Lock()
+        self._pattern = re.compile(rf'^{re.escape(self.config.pack_prefix)}-(\d+)\.pack$')
+
+        # 确保目录存在，并定位当前写入的包文件
+        os.makedirs(self.config.base_dir, exist_ok=True)
+        packs = [int(m.group(1)) for m in map(self._pattern.match, os.listdir(self.config.base_dir)) if m]
+        self._pack_id = max(packs, default=1)
+        self._pack_file = None
+        self._written: 'OrderedDict[str, Tuple[int, int]]' = OrderedDict()  # 哈希 -> (包文件编号, 偏移)
+
+    def digest(self, image: bytes) -> str:
+        """计算图像哈希"""
+        return hashlib.blake2b(image, digest_size=self.config.digest_size).hexdigest()
+
+    def _pack_path(self, pack_id: int) -> str:
+        return os.path.join(self.config.base_dir, f"{self.config.pack_prefix}-{pack_id:05d}.pack")
+
+    def _append(self, image: bytes) -> tuple:
+        """追加写入当前包文件，返回(包文件编号, 偏移)"""
+        if self._pack_file is None:
+            self._pack_file = open(self._pack_path(self._pack_id), 'ab')
+        offset = self._pack_file.tell()
+        if offset and offset + len(image) > self.config.max_pack_size:
+            self._pack_file.close()
+            self._pack_id += 1
+            self._pack_file = open(self._pack_path(self._pack_id), 'ab')
+            offset = 0
+        self._pack_file.write(image)
+        return self._pack_id, offset
+
+    def prepare_rows(self, session: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量入库前的处理：将行数据中的原始图像（image字段）写入仓库，替换为image_ref
+        在入库事务中执行，重试时可以重复调用（已写入包文件但索引未提交的图像复用原位置，包文件不会增长）
+        :param session: 入库事务的数据库会话
+        :param rows: 待入库数据
+        :return: 可直接插入点钞记录表的数据
+        """
+        images = {}
+        prepared = []
+        for row in rows:
+            row = dict(row)
+            image = row.pop('image', None)
+            if image:
+                ref = self.digest(image)
+                images.setdefault(ref, image)
+                row['image_ref'] = ref
+            prepared.append(row)
+        if not images:
+            return prepared
+
+        # 已存在的图像只引用，不重复写入
+        existing = set(session.scalars(
+            select(self.blob_model.hash).where(self.blob_model.hash.in_(list(images)))
+        ))
+        blobs = []
+        with self._lock:
+            written = []
+            for ref, image in images.items():
+                if ref in existing:
+                    self._written.pop(ref, None)
+                    continue
+                location = self._written.get(ref)
+                if location is None:
+                    location = self._append(image)
+                    written.append((ref, location))
+                pack_id, offset = location
+                blobs.append({'hash': ref, 'pack': pack_id, 'offset': offset, 'size': len(image)})
+            if written:
+                # 包文件先落盘，索引随事务提交
+                self._pack_file.flush()
+                os.fsync(self._pack_file.fileno())
+                self._written.update(written)
+                while len(self._written) > self.config.written_size:
+                    self._written.popitem(last=False)
+        if blobs:
+            session.execute(sqlite_insert(self.blob_model).on_conflict_do_nothing(), blobs)
+        return prepared
+
+    def read(self, session: Session, ref: str) -> Optional[bytes]:
+        """读取图像原始像素，不存在时返回None"""
+        blob = session.get(self.blob_model, ref)
+        if blob is None:
+            return None
+        try:
+            with open(self._pack_path(blob.pack), 'rb') as f:
+                f.seek(blob.offset)
+                data = f.read(blob.size)
+        except OSError as e:
+            logger.error(f"read image failed: {ref}: {str(e)}")
+            return None
+        return data if len(data) == blob.size else None
+
+    def read_many(self, session: Session, refs: List[str]) -> Dict[str, bytes]:
+        """批量读取图像原始像素，返回哈希到像素的字典（不存在的图像不包含在内）"""
+        blobs = []
+        unique = list(set(refs))
+        for i in range(0, len(unique), 500):
+            blobs.extend(session.scalars(
+                select(self.blob_model).where(self.blob_model.hash.in_(unique[i:i + 500]))
+            ))
+
+        # 按包文件和偏移顺序读取
+        images = {}
+        blobs.sort(key=lambda blob: (blob.pack, blob.offset))
+        pack_id, f = None, None
+        try:
+            for blob in blobs:
+                if blob.pack != pack_id:
+                    if f:
+                        f.close()
+                    pack_id, f = blob.pack, open(self._pack_path(blob.pack), 'rb')
+                f.seek(blob.offset)
+                data = f.read(blob.size)
+                if len(data) == blob.size:
+                    images[blob.hash] = data
+        except OSError as e:
+            logger.error(f"read images failed: {str(e)}")
+        finally:
+            if f:
+                f.close()
+        return images
+
+    def close(self):
+        with self._lock:
+            if self._pack_file is not None:
+                self._pack_file.close()
+                self._pack_file = None
+
+
+def raw_to_png(image: bytes) -> bytes:
+    """将96*16的8位灰度原始像素编码为PNG"""
+    pil_image = Image.frombuffer('L', (IMAGE_WIDTH, IMAGE_HEIGHT), image, 'raw', 'L', 0, 1)
+    png_io = io.BytesIO()
+    pil_image.save(png_io, format='PNG')
+    return png_io.getvalue()
+
+
+def png_to_raw(png: bytes) -> Optional[bytes]:
+    """将PNG图像（旧数据）还原为96*16的8位灰度原始像素，尺寸不符或无法解码时返回None"""
+    try:
+        with Image.open(io.BytesIO(png)) as pil_image:
+            if pil_image.size != (IMAGE_WIDTH, IMAGE_HEIGHT):
+                return None
+            return pil_image.convert('L').tobytes()
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,255 @@
+# 导入系统库
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from datetime import timezone
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+# 导入第三方库
+from loguru import logger
+
+# 导入自定义库
+
+# 定义常量
+# 子系统名称对应的模块前缀，MODULE_LEVELS中可以使用子系统名称或完整的模块名
+LOG_SUBSYSTEMS: Dict[str, Tuple[str, ...]] = {
+    'serial': ('app.cores.serial_ctrl', 'app.cores.device_manager', 'app.services.serial'),
+    'api': ('app.apis',),
+    'websocket': ('app.services.websocket', 'app.apis.ws_ctrl_api'),
+    'db': ('app.services.database', 'app.models'),
+    'image': ('app.services.image',),
+}
+RATE_LIMITED_LEVELS = frozenset(('WARNING', 'ERROR'))  # 限流的日志级别
+
+# 定义全局变量
+log_sink = None  # 当前的日志文件sink
+
+
+# 定义日志过滤器
+class LogFilter:
+    '''
+    功能：
+        1. 按模块设置日志级别（最长前缀匹配，未匹配的模块使用全局级别），结果按模块名缓存
+        2. 同一位置（模块+行号）重复的警告和错误限流：每个周期内最多输出burst条，
+           周期结束后的第一条日志附带被抑制的条数
+    '''
+    def __init__(self, level: str = 'INFO', module_levels: Optional[Dict[str, str]] = None,
+                 rate_limit_interval: float = 10.0, rate_limit_burst: int = 5):
+        self.level_no = logger.level(level).no
+        self.prefixes = []
+        for key, module_level in (module_levels or {}).items():
+            for prefix in LOG_SUBSYSTEMS.get(key, (key,)):
+                self.prefixes.append((prefix, logger.level(module_level).no))
+        # 长前缀优先
+        self.prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+        self.rate_limit_interval = rate_limit_interval
+        self.rate_limit_burst = rate_limit_burst
+        self.suppressed_count = 0
+        self._module_levels: Dict[str, int] = {}
+        self._windows: Dict[Tuple[str, int], list] = {}  # 位置 -> [周期开始时间, 已输出条数, 被抑制条数]
+        self._lock = threading.Lock()
+
+    @property
+    def min_level_no(self) -> int:
+        """所有模块中最低的日志级别（作为sink的级别，级别更低的日志不会生成记录）"""
+        return min([self.level_no] + [level_no for _, level_no in self.prefixes])
+
+    def module_level(self, name: str) -> int:
+        level_no = self._module_levels.get(name)
+        if level_no is None:
+            level_no = self.level_no
+            for prefix, prefix_level in self.prefixes:
+                if name == prefix or name.startswith(prefix + '.'):
+                    level_no = prefix_level
+                    break
+            self._module_levels[name] = level_no
+        return level_no
+
+    def __call__(self, record) -> bool:
+        if record["level"].no < self.module_level(record["name"] or ''):
+            return False
+        if self.rate_limit_burst <= 0 or record["level"].name not in RATE_LIMITED_LEVELS:
+            return True
+        return self._allow(record)
+
+    def _allow(self, record) -> bool:
+        key = (record["name"], record["line"])
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.rate_limit_interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record["message"] += f" (suppressed {suppressed} similar messages)"
+                    record["extra"]["suppressed"] = suppressed
+                return True
+            if window[1] < self.rate_limit_burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed_count += 1
+            return False
+
+
+# 日志记录转换为一行JSON
+def record_to_json(record) -> str:
+    data = {
+        "time": record["time"].astimezone(timezone.utc).isoformat(timespec='milliseconds'),
+        "level": record["level"].name,
+        "name": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "thread": record["thread"].name,
+        "message": record["message"],
+    }
+    if record["extra"]:
+        data["extra"] = record["extra"]
+    if record["exception"]:
+        exc_type, exc_value, _ = record["exception"]
+        data["exception"] = {"type": exc_type.__name__ if exc_type else None, "value": str(exc_value)}
+    return json.dumps(data, ensure_ascii=False, default=str) + '\n'
+
+
+# 定义日志文件sink
+class LogFileSink:
+    '''
+    功能：loguru的日志文件sink
+        1. enqueue为True时，日志放入有界队列（deque，不加锁），由后台线程格式化并批量写入文件，
+           调用线程不做格式化和文件I/O；队列已满时丢弃新日志并计数，之后写入一条丢弃提示，不会阻塞串口接收线程
+        2. 写入线程队列为空时等待唤醒事件，只有队列由空变为非空时才唤醒，不定时轮询
+        3. 文件按大小轮转，保留backup_count个旧文件
+        4. json_format为True时每条日志输出为一行JSON
+    注意：loguru只按'{message}'格式化（异常信息仍由loguru按backtrace、diagnose格式化），
+        日志格式fmt在写入时应用，支持loguru格式中的record字段（如{time:YYYY-MM-DD HH:mm:ss}、{level}、{line}）
+    '''
+    def __init__(self, path: str, fmt: Optional[str] = None, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5,
+                 enqueue: bool = True, queue_size: int = 10000, json_format: bool = False, batch_size: int = 500):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.handler.terminator = ''
+        self.fmt = fmt or '{time:YYYY-MM-DD HH:mm:ss.SSS} | {level} | {name}:{function}:{line} - {message}'
+        self.json_format = json_format
+        self.enqueue = enqueue
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.filter: Optional[LogFilter] = None
+        self.written_count = 0
+        self.dropped_count = 0
+        self._reported_dropped = 0
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._busy = False
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()  # 队列由空变为非空或停止时设置
+        self._thread: Optional[threading.Thread] = None
+        if enqueue:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    # loguru调用（在记录日志的线程中）
+    def write(self, message):
+        if self._thread is None:
+            self._emit(self.format(message))
+            self.written_count += 1
+            return
+        if len(self._pending) >= self.queue_size:
+            self.dropped_count += 1
+            return
+        # 只有队列由空变为非空时唤醒写入线程，队列非空时写入线程会继续取出
+        wakeup = not self._pending
+        self._pending.append(message)
+        if wakeup:
+            self._wakeup.set()
+
+    def format(self, message) -> str:
+        record = message.record
+        if self.json_format:
+            return record_to_json(record)
+        # loguru格式化后的消息为"消息\n异常信息"，消息之后的部分原样保留
+        return self.fmt.format_map(record) + str(message)[len(record["message"]):]
+
+    def _run(self):
+        pending = self._pending
+        while True:
+            if not pending:
+                if self._stopping.is_set():
+                    return
+                # 先清除事件再检查队列，避免清除前放入的日志没有唤醒
+                self._wakeup.clear()
+                if not pending and not self._stopping.is_set():
+                    self._wakeup.wait()
+                continue
+            # 一次取出队列中已有的日志，合并写入
+            self._busy = True
+            try:
+                texts = []
+                while pending and len(texts) < self.batch_size:
+                    message = pending.popleft()
+                    try:
+                        texts.append(self.format(message))
+                    except Exception as e:
+                        texts.append(f"format log failed: {str(e)}: {str(message)}")
+                self.written_count += len(texts)
+                if self.dropped_count != self._reported_dropped and not pending:
+                    dropped, self._reported_dropped = self.dropped_count - self._reported_dropped, self.dropped_count
+                    texts.append(f"log queue is full, {dropped} log messages dropped\n")
+                self._emit(''.join(texts))
+            finally:
+                self._busy = False
+
+    def _emit(self, text: str):
+        with self._lock:
+            self.handler.emit(logging.makeLogRecord({'msg': text, 'levelno': logging.INFO}))
+
+    # 等待队列中的日志写入文件（不能命名为flush，loguru每写入一条日志都会调用sink的flush）
+    def drain(self, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while self._thread is not None and (self._pending or self._busy) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    # 写入队列中剩余的日志后停止（loguru移除sink时调用，程序退出时loguru会移除所有sink）
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.handler.close()
+
+
+def setup_logging(level: str = 'INFO', fmt: Optional[str] = None, path: str = 'log.log',
+                  module_levels: Optional[Dict[str, str]] = None, enqueue: bool = True,
+                  queue_size: int = 10000, json_format: bool = False, max_bytes: int = 50 * 1024 * 1024,
+                  backup_count: int = 5, backtrace: bool = True, diagnose: bool = True,
+                  rate_limit_interval: float = 10.0, rate_limit_burst: int = 5) -> LogFileSink:
+    """
+    移除已有的sink，按配置添加日志文件sink
+    :return: 日志文件sink（可读取写入、丢弃的条数）
+    """
+    global log_sink
+    logger.remove()
+    log_filter = LogFilter(level, module_levels, rate_limit_interval, rate_limit_burst)
+    sink = LogFileSink(path, fmt, max_bytes, backup_count, enqueue, queue_size, json_format)
+    logger.add(sink, level=log_filter.min_level_no, format='{message}', filter=log_filter,
+               backtrace=backtrace, diagnose=diagnose)
+    sink.filter = log_filter
+    log_sink = sink
+    return sink
+
+
+# 获取当前的日志文件sink（未设置时返回None）
+def get_log_sink() -> Optional[LogFileSink]:
+    return log_sink
+
+
+# 等待已记录的日志写入文件（应用退出时调用）
+def flush_logs():
+    if log_sink is not None:
+        log_sink.drain()
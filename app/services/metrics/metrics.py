@@ -0,0 +1,297 @@
+# 导入系统库
+import abc
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 导入第三方库
+
+# 导入自定义库
+
+# 定义常量
+# 默认延迟分桶（秒）：10微秒到5秒
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# 默认批量大小分桶（条）
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    text = ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return '{' + text + '}'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# 定义指标基类
+class Metric(abc.ABC):
+    '''
+    功能：带标签的指标，labels(...)返回对应标签值的子指标（首次访问时创建并缓存）
+        子指标的更新只在各自的锁内进行，热路径上可以先取出子指标再反复使用
+    '''
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        ...
+
+    def items(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+    @abc.abstractmethod
+    def snapshot(self) -> dict:
+        ...
+
+    def _key(self, values: LabelValues) -> str:
+        return ','.join(f'{name}={value}' for name, value in zip(self.labelnames, values)) or 'value'
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+# 定义计数器
+class Counter(Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def render(self) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}'
+                for values, child in self.items()]
+
+    def snapshot(self) -> dict:
+        return {self._key(values): child.value for values, child in self.items()}
+
+
+# 定义瞬时值
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value: float):
+        self._default.set(value)
+
+
+# 定义回调指标：采集时才调用函数取值，热路径上没有开销（如队列长度）
+class CallbackMetric(Metric):
+    def __init__(self, name: str, help: str, func: Callable[[], Iterable[Tuple[LabelValues, float]]],
+                 labelnames: Iterable[str] = (), type: str = 'gauge'):
+        """
+        :param func: 返回[(标签值元组, 数值), ...]，没有标签时返回[((), 数值)]
+        """
+        self.type = type
+        self.func = func
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return None
+
+    def items(self):
+        return [(tuple(str(v) for v in values), value) for values, value in self.func()]
+
+    def render(self) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}'
+                for values, value in self.items()]
+
+    def snapshot(self) -> dict:
+        return {self._key(values): value for values, value in self.items()}
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为+Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def read(self) -> Tuple[List[int], float, int]:
+        """在锁内取出分桶计数、总和及次数（输出时三者一致）"""
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q: float, counts: Optional[List[int]] = None) -> float:
+        """按分桶线性插值估算分位数（与Prometheus的histogram_quantile一致），counts为read取出的分桶计数"""
+        if counts is None:
+            counts = self.read()[0]
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+# 定义直方图
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in self.items():
+            counts, total_sum, total = child.read()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total_sum)}')
+            lines.append(f'{self.name}_count{labels} {total}')
+        return lines
+
+    def snapshot(self) -> dict:
+        result = {}
+        for values, child in self.items():
+            counts, total_sum, total = child.read()
+            result[self._key(values)] = {
+                "count": total,
+                "sum": round(total_sum, 6),
+                "p50": round(child.quantile(0.5, counts), 6),
+                "p99": round(child.quantile(0.99, counts), 6),
+            }
+        return result
+
+
+# 定义指标注册表
+class MetricsRegistry:
+    '''
+    功能：
+        1. 注册各模块的指标（同名指标只注册一次，重复注册返回已有的指标）
+        2. 输出Prometheus文本格式（/metrics）和字典格式（websocket的stats消息）
+    '''
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, func: Callable[[], Iterable[Tuple[LabelValues, float]]],
+                 labelnames: Iterable[str] = (), type: str = 'gauge') -> CallbackMetric:
+        """注册回调指标（同名时替换为新的回调）"""
+        metric = CallbackMetric(name, help, func, labelnames, type)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def metrics(self) -> List[Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    # Prometheus文本格式（0.0.4）
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    # 字典格式
+    def snapshot(self) -> dict:
+        return {metric.name: metric.snapshot() for metric in self.metrics()}
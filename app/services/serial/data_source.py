@@ -0,0 +1,160 @@
+# 导入系统库
+import mmap
+import os
+import threading
+import time
+from typing import Optional, Union
+
+# 导入第三方库
+from loguru import logger
+
+# 导入自定义库
+from app.services.serial.serial_communication import SerialCommunication
+from app.services.serial.serial_model import SerialParameters
+from app.services.file.file_opt import read_serial_data_from_file
+
+# 定义常量
+HEX_EXTENSIONS = ('.txt', '.hex')   # 按十六进制文本解析的文件扩展名，其余按原始字节解析
+BITS_PER_BYTE = 10                  # 串口每字节的位数（1起始位 + 8数据位 + 1停止位）
+DEFAULT_BAUDRATE = 384000
+
+
+def parse_speed(speed: Union[str, float, None]) -> float:
+    """
+    解析回放速度
+    :param speed: 'original'或1为原始速度，数字为倍速，'max'或0为不限速
+    :return: 倍速，0表示不限速
+    """
+    if speed in (None, '', 'original'):
+        return 1.0
+    if speed == 'max':
+        return 0.0
+    speed = float(speed)
+    if speed < 0:
+        raise ValueError(f"invalid replay speed: {speed}")
+    return speed
+
+
+# 定义回放数据源
+class ReplayDataSource:
+    '''
+    功能：从采集文件中回放串口数据，与SerialCommunication接口一致，可直接替换串口
+        1. 支持十六进制文本文件（如tests/test_data/Log1.TXT）和原始字节文件，原始字节文件通过mmap读取
+        2. 回放速度：原始速度（按波特率计算的串口线速）、N倍速、不限速
+        3. 回放结束后read_available抛出EOFError（loop为True时从头循环回放）
+    '''
+    def __init__(self, path: str, speed: Union[str, float, None] = 'original', loop: bool = False,
+                 file_format: str = 'auto', chunk_size: int = 4096, read_timeout: Optional[float] = 0.5):
+        """
+        :param path: 采集文件路径
+        :param speed: 回放速度，见parse_speed
+        :param loop: 是否循环回放
+        :param file_format: 文件格式：auto（按扩展名判断）、hex、raw
+        :param chunk_size: 单次读取的最大字节数
+        :param read_timeout: 单次读取的最长等待时间（秒），与串口读超时一致
+        """
+        self.path = path
+        self.speed = parse_speed(speed)
+        self.loop = loop
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.read_timeout = read_timeout
+        self.serial_parameters: Optional[SerialParameters] = None
+        self.serial_conn = None     # 没有真实串口（异步读取时使用线程池）
+        self.replayed_bytes = 0
+        self._data = None
+        self._file = None
+        self._position = 0
+        self._started_at = 0.0
+        self._closed = threading.Event()
+
+    def set_serial_parm(self, serial_param: SerialParameters):
+        if serial_param:
+            self.serial_parameters = serial_param
+
+    @property
+    def bytes_per_second(self) -> float:
+        """原始速度下每秒回放的字节数"""
+        baudrate = int(self.serial_parameters.baudrate) if self.serial_parameters else DEFAULT_BAUDRATE
+        return baudrate / BITS_PER_BYTE
+
+    def open_connection(self) -> bool:
+        """打开采集文件"""
+        fmt = self.file_format
+        if fmt == 'auto':
+            fmt = 'hex' if os.path.splitext(self.path)[1].lower() in HEX_EXTENSIONS else 'raw'
+        try:
+            if fmt == 'hex':
+                self._data = read_serial_data_from_file(self.path)
+            else:
+                self._file = open(self.path, 'rb')
+                size = os.fstat(self._file.fileno()).st_size
+                self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        except (OSError, ValueError) as e:
+            logger.error(f"failed to open replay file: {self.path}: {str(e)}")
+            self.close_connection()
+            return False
+        if not self._data:
+            logger.error(f"replay file is empty: {self.path}")
+            self.close_connection()
+            return False
+
+        self._position = 0
+        self._started_at = time.monotonic()
+        self._closed.clear()
+        logger.info(f"open replay file successfully: {self.path}, {len(self._data)} bytes, speed: {self.speed or 'max'}")
+        return True
+
+    def close_connection(self):
+        """关闭采集文件"""
+        self._closed.set()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._file:
+            self._file.close()
+        self._data = None
+        self._file = None
+
+    def cancel_read(self):
+        """唤醒正在等待的读取"""
+        self._closed.set()
+
+    def is_connected(self) -> bool:
+        return self._data is not None
+
+    def read_available(self, max_size: int = 4096) -> bytes:
+        """按回放速度读取下一段数据，未到时间时最多等待read_timeout秒，回放结束时抛出EOFError"""
+        if self._data is None or self._closed.is_set():
+            raise EOFError("replay source is closed")
+        if self._position >= len(self._data):
+            if not self.loop:
+                raise EOFError(f"replay finished: {self.replayed_bytes} bytes")
+            self._position = 0
+            self._started_at = time.monotonic()
+
+        end = min(self._position + min(max_size, self.chunk_size), len(self._data))
+        if self.speed:
+            # 本段数据按回放速度应当到达的时间
+            due = self._started_at + end / (self.bytes_per_second * self.speed)
+            delay = due - time.monotonic()
+            if delay > 0:
+                timeout = self.read_timeout
+                if timeout is not None and delay > timeout:
+                    self._closed.wait(timeout)
+                    return b''
+                if self._closed.wait(delay):
+                    return b''
+        chunk = bytes(self._data[self._position:end])
+        self._position = end
+        self.replayed_bytes += len(chunk)
+        return chunk
+
+
+# 创建数据源：real为串口，test为回放文件
+def create_data_source(kind: str, read_timeout: Optional[float] = None, replay_file: str = '',
+                       replay_speed: Union[str, float, None] = 'original', replay_loop: bool = False):
+    if kind == 'real':
+        return SerialCommunication(read_timeout=read_timeout)
+    if kind == 'test':
+        return ReplayDataSource(replay_file, speed=replay_speed, loop=replay_loop, read_timeout=read_timeout)
+    raise ValueError(f"unknown data source: {kind}")
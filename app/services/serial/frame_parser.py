@@ -0,0 +1,145 @@
+# 导入系统库
+import struct
+from typing import Callable, Iterator, Optional
+
+# 导入第三方库
+
+# 导入自定义库
+
+# 定义常量（见docs/protocal.md）
+HEADER = b'\xAE\xAE\xAE\xAE'        # 传输起始标志
+TAIL = b'\xBE\xBE\xBE\xBE'          # 传输结束标志
+MODE_FLAG = 0x0001                  # 模式标志
+HEADER_LENGTH = len(HEADER)
+LENGTH_FIELD_SIZE = 2
+MSG_LENGTH = 1650                   # 模式标志+纸币信息+传输结束标志 = 2+1644+4
+FRAME_LENGTH = HEADER_LENGTH + LENGTH_FIELD_SIZE + MSG_LENGTH  # 1656
+DEFAULT_CAPACITY = 64 * 1024
+
+_LENGTH_STRUCT = struct.Struct('<H')
+
+
+# 定义串口协议帧解析器
+class FrameParser:
+    '''
+    功能：
+        1. 接收任意长度的串口数据块，写入复用的固定缓冲区（读写指针 + 前移压缩）
+        2. 扫描起始标志0xAEAEAEAE定位帧，遇到错误数据时跳过并重新同步，而不是清空缓冲区
+        3. 以memoryview形式输出完整帧的消息体（模式标志+纸币信息+结束标志），不复制数据
+    注意：
+        feed()产出的memoryview只在生成器下一次迭代前有效，使用方需在此之前完成解析
+    '''
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, on_error: Optional[Callable[[str], None]] = None):
+        if capacity < FRAME_LENGTH * 2:
+            raise ValueError(f"capacity must be at least {FRAME_LENGTH * 2} bytes")
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0     # 未解析数据起点
+        self._end = 0       # 已写入数据终点
+        self.on_error = on_error
+        # 统计信息
+        self.frame_count = 0
+        self.resync_count = 0
+        self.dropped_bytes = 0
+
+    @property
+    def buffered(self) -> int:
+        """缓冲区中尚未解析的字节数"""
+        return self._end - self._start
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    def reset(self):
+        """丢弃缓冲区中的所有数据（例如重新打开串口时）"""
+        self._start = 0
+        self._end = 0
+
+    def feed(self, data: bytes) -> Iterator[memoryview]:
+        """
+        写入一块串口数据，并依次产出其中已完整的帧
+        :param data: 任意长度的数据块
+        :return: 帧消息体（长度MSG_LENGTH）的memoryview迭代器
+        """
+        data = memoryview(data)
+        while data:
+            written = self._write(data)
+            data = data[written:]
+            while (frame := self._next_frame()) is not None:
+                yield frame
+
+    def _write(self, data: memoryview) -> int:
+        size = len(data)
+        if self._end + size > len(self._buffer):
+            self._compact()
+        written = min(size, len(self._buffer) - self._end)
+        self._buffer[self._end:self._end + written] = data[:written]
+        self._end += written
+        return written
+
+    def _compact(self):
+        """将未解析的数据移动到缓冲区头部（等长切片赋值，不会重新分配内存）"""
+        remain = self._end - self._start
+        if self._start and remain:
+            self._buffer[0:remain] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = remain
+
+    def _next_frame(self) -> Optional[memoryview]:
+        buffer = self._buffer
+        while True:
+            start, end = self._start, self._end
+            if end - start < HEADER_LENGTH:
+                return None
+
+            # 定位起始标志
+            pos = buffer.find(HEADER, start, end)
+            if pos < 0:
+                # 保留末尾可能属于下一个起始标志的字节
+                keep = HEADER_LENGTH - 1
+                self._drop(end - keep - start, "header not found")
+                self._start = end - keep
+                return None
+            if pos > start:
+                self._drop(pos - start, "header is not correct")
+                self._start = start = pos
+
+            if end - start < HEADER_LENGTH + LENGTH_FIELD_SIZE:
+                return None
+
+            # 校验消息长度
+            msg_length = _LENGTH_STRUCT.unpack_from(buffer, start + HEADER_LENGTH)[0]
+            if msg_length != MSG_LENGTH:
+                self._skip_header(f"data length is not correct {msg_length}")
+                continue
+
+            if end - start < FRAME_LENGTH:
+                return None
+
+            # 校验模式标志与结束标志
+            body_start = start + HEADER_LENGTH + LENGTH_FIELD_SIZE
+            mode_flag = _LENGTH_STRUCT.unpack_from(buffer, body_start)[0]
+            if mode_flag != MODE_FLAG:
+                self._skip_header(f"mode flag is not correct {mode_flag}")
+                continue
+            if not buffer.startswith(TAIL, start + FRAME_LENGTH - len(TAIL)):
+                self._skip_header("end flag is not correct")
+                continue
+
+            self._start = start + FRAME_LENGTH
+            self.frame_count += 1
+            return self._view[body_start:body_start + MSG_LENGTH]
+
+    def _skip_header(self, reason: str):
+        """当前起始标志后的数据无效，跳过一个字节后重新同步"""
+        self._start += 1
+        self._drop(1, reason)
+
+    def _drop(self, count: int, reason: str):
+        if count <= 0:
+            return
+        self.resync_count += 1
+        self.dropped_bytes += count
+        if self.on_error:
+            self.on_error(f"recv frame failed: {reason}, drop {count} bytes and resync")
@@ -13,10 +13,14 @@ from app.services.serial.serial_model import SerialParameters
 
 # 定义串口通信类
 class SerialCommunication:
-    def __init__(self):
-        """初始化串口通信参数"""
+    def __init__(self, read_timeout: float = None):
+        """初始化串口通信参数
+        Args:
+            read_timeout (float): 单次读取的最长等待时间（秒），None表示一直阻塞到有数据
+        """
         self.serial_parameters = None  # 串口通信参数
         self.serial_conn = serial.Serial()  # 串口连接对象
+        self.read_timeout = read_timeout
 
     def set_serial_parm(self, serial_param: SerialParameters):
         if serial_param:
@@ -33,7 +37,7 @@ class SerialCommunication:
             self.serial_conn.parity = self.serial_parameters.parity
             self.serial_conn.stopbits = self.serial_parameters.stopbits
             # self.serial_conn.timeout = self.serial_parameters.timeout
-            self.serial_conn.timeout = None
+            self.serial_conn.timeout = self.read_timeout
             self.serial_conn.xonxoff = self.serial_parameters.xonxoff
             self.serial_conn.rtscts = self.serial_parameters.rtscts
             self.serial_conn.dsrdtr = self.serial_parameters.dsrdtr
@@ -50,11 +54,18 @@ class SerialCommunication:
             return False
 
     def close_connection(self):
-        """关闭串口连接"""
+        """关闭串口连接（保留连接对象，可以再次打开）"""
         if self.serial_conn and self.serial_conn.is_open:
+            self.cancel_read()
             self.serial_conn.close()
-            logger.info(f"close connection successfully: {self.serial_parameters.port}")
-            self.serial_conn = None
+            logger.info(f"close connection successfully: {self.serial_parameters.port if self.serial_parameters else self.serial_conn.port}")
+
+    def cancel_read(self):
+        """唤醒正在阻塞的读取"""
+        try:
+            self.serial_conn.cancel_read()
+        except (AttributeError, NotImplementedError, serial.SerialException) as e:
+            logger.debug(f"cancel read is not supported: {str(e)}")
 
     def send_data(self, data: str) -> bool:
         """发送数据到串口"""
@@ -108,7 +119,28 @@ class SerialCommunication:
         except Exception as e:
             logger.error(f"unexpected error: {str(e)}")
             raise
-            
+
+    def read_available(self, max_size: int = 4096) -> bytes:
+        """读取串口缓冲区中已到达的数据
+        Args:
+            max_size (int): 单次最多读取的字节数
+        Returns:
+            bytes: 接收到的数据
+        Raises:
+            SerialException: 串口连接异常
+        Notes:
+            缓冲区中有数据时一次性读出（不超过max_size），否则阻塞等待至少1字节，
+            设置了读超时时超时后返回空数据。
+        """
+        if not self.serial_conn or not self.serial_conn.is_open:
+            logger.warning("read available data failed: serial don't connect")
+            raise serial.SerialException("serial port not connected")
+        try:
+            size = min(max(self.serial_conn.in_waiting, 1), max_size)
+            return self.serial_conn.read(size)
+        except serial.SerialException as e:
+            logger.error(f"read error: {str(e)}")
+            raise
 
     def clean_data(self) -> bytes:
         """读取所有可用数据"""
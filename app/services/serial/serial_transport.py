@@ -0,0 +1,113 @@
+# 导入系统库
+import asyncio
+import threading
+from typing import Coroutine, Optional
+
+# 导入第三方库
+from loguru import logger
+
+# 导入自定义库
+from app.services.serial.serial_communication import SerialCommunication
+
+
+# 定义串口事件循环
+class SerialEventLoop:
+    '''
+    功能：在一个专用线程中运行asyncio事件循环，所有设备的异步读取任务都在这个循环中执行
+        不占用websocket所在的事件循环，设备再多也只有一个循环线程
+    '''
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # 启动事件循环线程（首次使用时启动）
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None or self.loop.is_closed():
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name="serial-loop", daemon=True)
+                self._thread.start()
+            return self.loop
+
+    # 在事件循环中执行协程并等待结果（在其他线程中调用）
+    def run(self, coro: Coroutine, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coro, self.start()).result(timeout)
+
+    # 在事件循环中创建任务，返回asyncio.Task
+    def spawn(self, coro: Coroutine) -> asyncio.Task:
+        async def create():
+            return asyncio.get_running_loop().create_task(coro)
+        return self.run(create())
+
+    # 取消任务并等待其退出
+    def cancel(self, task: asyncio.Task, timeout: float = 2.0):
+        async def cancel_task():
+            task.cancel()
+            await asyncio.wait({task}, timeout=timeout)
+        if not task.done():
+            self.run(cancel_task(), timeout + 1)
+
+    def stop(self):
+        with self._lock:
+            if self.loop is not None and not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self._thread.join(timeout=2)
+                self.loop.close()
+            self.loop = None
+
+
+# 定义异步串口读取器
+class AsyncSerialReader:
+    '''
+    功能：在串口事件循环中读取串口数据
+        1. 支持文件描述符的平台（Linux等）通过loop.add_reader等待数据到达，无需占用线程
+        2. 其他平台（Windows的COM口）在线程池中读取，每次读取最多等待串口读超时时间，
+           停止时通过cancel_read立即唤醒，读取线程不会残留
+        3. read可以指定最长等待时间（deadline），超时返回空数据
+    '''
+    def __init__(self, communication: SerialCommunication, max_size: int = 4096):
+        self.communication = communication
+        self.max_size = max_size
+        self._fd: Optional[int] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # 注册读事件（在事件循环中调用）
+    def open(self):
+        self._loop = asyncio.get_running_loop()
+        try:
+            fd = self.communication.serial_conn.fileno()
+            self._ready = asyncio.Event()
+            self._loop.add_reader(fd, self._ready.set)
+            self._fd = fd
+        except (AttributeError, OSError, NotImplementedError, ValueError) as e:
+            # 没有文件描述符或事件循环不支持add_reader
+            logger.debug(f"serial reader falls back to thread pool: {str(e)}")
+            self._fd = None
+
+    # 读取已到达的数据，deadline秒内没有数据时返回空数据
+    async def read(self, deadline: Optional[float] = None) -> bytes:
+        if self._fd is None:
+            return await asyncio.wait_for(
+                self._loop.run_in_executor(None, self.communication.read_available, self.max_size),
+                deadline + 1 if deadline else None,
+            )
+        try:
+            await asyncio.wait_for(self._ready.wait(), deadline)
+        except asyncio.TimeoutError:
+            return b''
+        self._ready.clear()
+        conn = self.communication.serial_conn
+        waiting = conn.in_waiting
+        return conn.read(min(waiting, self.max_size)) if waiting else b''
+
+    # 注销读事件（在事件循环中调用，需在关闭串口之前）
+    def close(self):
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+
+
+# 串口事件循环（所有设备共用）
+serial_loop = SerialEventLoop()
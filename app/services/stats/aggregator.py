@@ -0,0 +1,243 @@
+# 导入系统库
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+
+# 导入第三方库
+from loguru import logger
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+# 导入自定义库
+
+# 定义常量
+LEVELS = ('session', 'day', 'machine')  # 汇总级别：采集会话、日期、机具编号
+REBUILD_LEVELS = ('day', 'machine')     # 可以从点钞记录重新统计的级别（点钞记录不保存会话）
+
+SummaryKey = Tuple[str, str, str, int, int]  # (级别, 范围, 币种, 币值, 真伪标志)
+
+
+# 定义点钞汇总统计
+class SummaryAggregator:
+    '''
+    功能：在内存中增量维护点钞汇总（按币种、币值、真伪标志计数），看板数据不再扫描点钞记录
+        1. 每张纸币入库提交后调用一次add，同时更新会话、日期、机具编号三个级别的计数（O(1)）
+        2. 后台线程每隔flush_interval秒将变化的计数写入汇总表（绝对值，upsert），
+           并通过on_delta回调发布变化的条目（带递增序号，客户端发现序号不连续或收到reset时重新获取全部汇总）
+        3. 启动时从汇总表加载计数；汇总表为空而已有点钞记录时，从点钞记录重新统计日期和机具编号级别
+    '''
+    def __init__(self, summary_model, session_factory: Callable, flush_interval: float = 1.0,
+                 on_delta: Optional[Callable[[int, List[dict], bool], None]] = None):
+        self.model = summary_model
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.on_delta = on_delta
+        self.seq = 0
+        self._counts: Dict[SummaryKey, int] = {}
+        self._dirty = set()
+        self._deltas: Optional[Dict[SummaryKey, int]] = None  # 重新统计期间日期和机具编号级别的变化
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # 写入汇总表期间持有，先取出的计数先写入
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    # 一张纸币入库后计数（在入库线程的on_flush回调中调用）
+    def add(self, session: str, day: str, machine: str, money_flag: str, valuta: int, tf_flag: int, count: int = 1):
+        keys = (('session', session, money_flag, valuta, tf_flag),
+                ('day', day, money_flag, valuta, tf_flag),
+                ('machine', machine, money_flag, valuta, tf_flag))
+        with self._lock:
+            counts = self._counts
+            for key in keys:
+                counts[key] = counts.get(key, 0) + count
+            self._dirty.update(keys)
+            if self._deltas is not None:
+                self._track(keys[1:], count)
+        if self._thread is None:
+            self.start()
+
+    # 删除点钞记录后扣减日期和机具编号级别的计数（点钞记录不保存会话，会话级别不扣减）
+    def remove(self, day: str, machine: str, money_flag: str, valuta: int, tf_flag: int, count: int = 1):
+        keys = (('day', day, money_flag, valuta, tf_flag), ('machine', machine, money_flag, valuta, tf_flag))
+        with self._lock:
+            for key in keys:
+                if key in self._counts:
+                    self._counts[key] = max(0, self._counts[key] - count)
+                    self._dirty.add(key)
+            if self._deltas is not None:
+                self._track(keys, -count)
+
+    def _track(self, keys, count: int):
+        deltas = self._deltas
+        for key in keys:
+            deltas[key] = deltas.get(key, 0) + count
+
+    def count(self, key: SummaryKey) -> int:
+        return self._counts.get(key, 0)
+
+    def scopes(self, level: str) -> List[str]:
+        with self._lock:
+            return sorted({key[1] for key in self._counts if key[0] == level})
+
+    def snapshot(self, level: str, scope: Optional[str] = None) -> Dict[str, dict]:
+        """
+        获取汇总
+        :param level: 汇总级别
+        :param scope: 范围（会话id、日期YYYY-MM-DD或机具编号），为None时返回该级别的所有范围
+        :return: 范围 -> {count, amount, by_currency, by_tf_flag, items}
+        """
+        with self._lock:
+            entries = [(key, count) for key, count in self._counts.items()
+                       if key[0] == level and (scope is None or key[1] == scope) and count]
+        result = {}
+        for (_, key_scope, money_flag, valuta, tf_flag), count in sorted(entries):
+            summary = result.setdefault(key_scope, {"count": 0, "amount": 0, "by_currency": {}, "by_tf_flag": {},
+                                                    "items": []})
+            amount = count * (valuta or 0)
+            summary["count"] += count
+            summary["amount"] += amount
+            currency = summary["by_currency"].setdefault(money_flag, {"count": 0, "amount": 0})
+            currency["count"] += count
+            currency["amount"] += amount
+            summary["by_tf_flag"][str(tf_flag)] = summary["by_tf_flag"].get(str(tf_flag), 0) + count
+            summary["items"].append({"money_flag": money_flag, "valuta": valuta, "tf_flag": tf_flag,
+                                     "count": count, "amount": amount})
+        return result
+
+    # 从汇总表加载计数（应用启动时调用）
+    def load(self, db: Session):
+        rows = db.execute(select(self.model.level, self.model.scope, self.model.money_flag, self.model.valuta,
+                                 self.model.tf_flag, self.model.count)).all()
+        with self._lock:
+            self._counts = {tuple(row[:5]): row[5] for row in rows}
+            self._dirty.clear()
+        logger.info(f"summary loaded: {len(rows)} entries")
+
+    def rebuild(self, db: Session, result_model, pause: Optional[Callable[[], ContextManager]] = None,
+                floor: Optional[datetime] = None, rollup_model=None):
+        """
+        从点钞记录重新统计日期和机具编号级别的汇总（会话级别不变）
+        统计期间的add/remove记为变化，统计完成后合并，不会丢失；
+        pause为入库线程的暂停提交（BatchWriter.paused），统计期间提交的纸币不会既在统计结果中又记为变化
+        :param floor: 已归档分区的结束时间，此前的记录已移出点钞记录表，改为从按天预汇总表（rollup_model）统计
+        """
+        started_at = time.perf_counter()
+        fields = (result_model.money_flag, result_model.valuta, result_model.tf_flag)
+        groups = {
+            'day': func.date(result_model.create_at),
+            'machine': result_model.machine_number,
+        }
+        queries = [select(groups[level], *fields, func.count()).group_by(groups[level], *fields)
+                   for level in REBUILD_LEVELS]
+        if floor is not None and rollup_model is not None:
+            queries = [query.where(result_model.create_at >= floor) for query in queries]
+            rollup_fields = (rollup_model.money_flag, rollup_model.valuta, rollup_model.tf_flag)
+            rollup_groups = {
+                'day': func.substr(rollup_model.bucket, 1, 10),
+                'machine': rollup_model.machine_number,
+            }
+            queries += [select(rollup_groups[level], *rollup_fields, func.sum(rollup_model.count))
+                        .where(rollup_model.bucket < floor.strftime('%Y-%m-%d %H:%M:%S'))
+                        .group_by(rollup_groups[level], *rollup_fields)
+                        for level in REBUILD_LEVELS]
+        levels = REBUILD_LEVELS * (len(queries) // len(REBUILD_LEVELS))
+        with pause() if pause else nullcontext():
+            with self._lock:
+                self._deltas = {}
+            try:
+                counts = {}
+                for level, query in zip(levels, queries):
+                    for row in db.execute(query):
+                        key = self._key(level, *row[:4])
+                        counts[key] = counts.get(key, 0) + (row[4] or 0)
+            except Exception:
+                with self._lock:
+                    self._deltas = None
+                raise
+            # 合并变化和替换计数在同一次加锁中完成，之后的add/remove直接作用于新的计数
+            with self._lock:
+                deltas, self._deltas = self._deltas, None
+                for key, count in deltas.items():
+                    counts[key] = max(0, counts.get(key, 0) + count)
+                # 不再出现的条目置为0（与扣减到0的条目相同）
+                for key in self._counts:
+                    if key[0] in REBUILD_LEVELS and key not in counts:
+                        counts[key] = 0
+                self._counts.update(counts)
+                self._dirty.update(counts)
+        self.flush()
+        logger.info(f"summary rebuilt: {len(counts)} entries, {time.perf_counter() - started_at:.2f}s")
+
+    def clear(self, db: Session):
+        """清除所有汇总（在删除所有点钞记录的事务中调用，由调用方提交）"""
+        db.execute(delete(self.model))
+        with self._lock:
+            self._counts.clear()
+            self._dirty.clear()
+        self._publish([], reset=True)
+
+    @staticmethod
+    def _key(level: str, scope, money_flag, valuta, tf_flag) -> SummaryKey:
+        return level, str(scope or ''), money_flag or '', valuta or 0, tf_flag or 0
+
+    def _row(self, level: str, scope, money_flag, valuta, tf_flag, count) -> dict:
+        return {'level': level, 'scope': str(scope or ''), 'money_flag': money_flag or '', 'valuta': valuta or 0,
+                'tf_flag': tf_flag or 0, 'count': count, 'update_at': datetime.now()}
+
+    def start(self):
+        """启动写入线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="summary-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """写入剩余的变化后停止写入线程"""
+        thread, self._thread = self._thread, None
+        self._stopping.set()
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        # 写入线程和rebuild/stop都会调用，按取出计数的顺序写入，旧的计数不会覆盖新的
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                dirty, self._dirty = self._dirty, set()
+                rows = [self._row(*key, self._counts.get(key, 0)) for key in dirty]
+            try:
+                with self.session_factory() as db:
+                    stmt = sqlite_insert(self.model)
+                    db.execute(stmt.on_conflict_do_update(
+                        index_elements=['level', 'scope', 'money_flag', 'valuta', 'tf_flag'],
+                        set_={'count': stmt.excluded.count, 'update_at': stmt.excluded.update_at},
+                    ), rows)
+                    db.commit()
+            except SQLAlchemyError as e:
+                # 下次重试
+                logger.warning(f"save summary failed: {str(e)}")
+                with self._lock:
+                    self._dirty.update(dirty)
+            self._publish([{key: row[key] for key in ('level', 'scope', 'money_flag', 'valuta', 'tf_flag', 'count')}
+                           for row in rows])
+
+    def _publish(self, items: List[dict], reset: bool = False):
+        self.seq += 1
+        if self.on_delta is None:
+            return
+        try:
+            self.on_delta(self.seq, items, reset)
+        except Exception as e:
+            logger.warning(f"publish summary delta failed: {str(e)}")
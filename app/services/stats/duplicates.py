@@ -0,0 +1,364 @@
+'''
+冠字号重复检测：同一币种的冠字号在同一批或不同日期再次出现时标记为重复
+1. 每个币种一个布隆过滤器（固定内存，按容量和误判率确定位数），绝大多数未出现过的冠字号在这里直接判定
+2. 布隆过滤器命中时，先查最近出现的冠字号（精确哈希表，按出现顺序保留固定条数），
+   不在其中时按冠字号索引查询点钞记录（result表，然后从新到旧查询各归档分区）确认，误判不会标记为重复
+3. 状态文件保存布隆过滤器和最近的冠字号，以及已包含的最大点钞记录id（水位），
+   重启后只需加入水位之后的点钞记录，不再扫描全部记录
+    状态文件全部为小端字节序：
+        文件头：magic 4s b'GSNO'，version H 当前为1，watermark Q，币种数 I
+        每个币种：代码长度 H + 代码（UTF-8），位数 Q，哈希函数个数 I，已加入条数 Q，位数组，
+                最近条目数 I，哈希数组（Q），计数数组（I）
+'''
+
+# 导入系统库
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 导入第三方库
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+# 导入自定义库
+
+# 定义常量
+STATE_MAGIC = b'GSNO'
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct('<4sHQI')
+FILTER_HEADER = struct.Struct('<QIQ')
+IGNORED_CHARS = ' \x00*?'  # 未识别的冠字号（空白或识别失败的字符）不参与检测
+
+
+def sno_hash(sno: str) -> int:
+    """冠字号的128位哈希（低64位用作最近冠字号的键，高64位用于布隆过滤器的第二个哈希）"""
+    return int.from_bytes(hashlib.blake2b(sno.encode('utf-8'), digest_size=16).digest(), 'little')
+
+
+# 定义布隆过滤器
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: int):
+        # 由两个64位哈希组合出hash_count个位置（Kirsch-Mitzenmacher），先取模避免大整数运算
+        size = self.size
+        h1, h2 = (value & 0xFFFFFFFFFFFFFFFF) % size, ((value >> 64) | 1) % size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def add(self, value: int) -> bool:
+        """
+        加入一个值
+        :return: 加入前是否可能已存在（所有位都已置位）
+        """
+        bits = self.bits
+        existed = True
+        for position in self._positions(value):
+            mask = 1 << (position & 7)
+            byte = bits[position >> 3]
+            if not byte & mask:
+                existed = False
+                bits[position >> 3] = byte | mask
+        self.count += 1
+        return existed
+
+    def __contains__(self, value: int) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+# 定义单个币种的冠字号索引
+class _CurrencyIndex:
+    def __init__(self, capacity: int, error_rate: float, recent_size: int):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.recent: 'OrderedDict[int, int]' = OrderedDict()  # 哈希 -> 出现次数
+        self.recent_size = recent_size
+
+    def add(self, value: int) -> Tuple[bool, bool]:
+        """
+        加入一个冠字号
+        :return: (布隆过滤器是否命中, 是否在最近冠字号中)
+        """
+        maybe = self.bloom.add(value)
+        key = value & 0xFFFFFFFFFFFFFFFF
+        recent = self.recent
+        if key in recent:
+            recent[key] += 1
+            recent.move_to_end(key)
+            return maybe, True
+        recent[key] = 1
+        if len(recent) > self.recent_size:
+            recent.popitem(last=False)
+        return maybe, False
+
+    def remove(self, value: int):
+        key = value & 0xFFFFFFFFFFFFFFFF
+        count = self.recent.get(key)
+        if count is None:
+            return
+        if count > 1:
+            self.recent[key] = count - 1
+        else:
+            del self.recent[key]
+
+
+# 定义冠字号重复检测
+class DuplicateDetector:
+    '''
+    功能：在接收线程中判断每张纸币的冠字号是否已出现过（同一币种），结果随纸币数据推送
+        内存占用由布隆过滤器容量和最近冠字号条数决定，与点钞记录条数无关；
+        超过容量后误判率上升，只会增加查询点钞记录的次数，不会误标记
+    '''
+    def __init__(self, result_model, session_factory: Callable, capacity: int = 2000000, error_rate: float = 0.001,
+                 recent_size: int = 50000, state_file: Optional[str] = None, save_interval: float = 300.0,
+                 archives: Optional[Callable[[bool], Iterable[Session]]] = None):
+        self.model = result_model
+        self.session_factory = session_factory
+        self.archives = archives  # 依次打开各归档分区的会话，参数为是否从新到旧（RetentionManager.archive_sessions）
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.recent_size = recent_size
+        self.state_file = state_file
+        self.save_interval = save_interval
+        self.watermark = 0  # 已加入的最大点钞记录id
+        self.duplicate_count = 0
+        self.lookup_count = 0  # 布隆过滤器命中但不在最近冠字号中，查询点钞记录的次数
+        self._indexes: Dict[str, _CurrencyIndex] = {}
+        self._pending: Optional[List[Tuple[str, int]]] = None  # 重建期间check加入的冠字号，替换索引时重新加入
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _index(self, money_flag: str, indexes: Optional[Dict[str, _CurrencyIndex]] = None) -> _CurrencyIndex:
+        indexes = self._indexes if indexes is None else indexes
+        index = indexes.get(money_flag)
+        if index is None:
+            index = indexes[money_flag] = _CurrencyIndex(self.capacity, self.error_rate, self.recent_size)
+        return index
+
+    def check(self, money_flag: str, sno: str) -> bool:
+        """
+        判断冠字号是否重复并加入索引（在接收线程中调用，每张纸币一次）
+        :return: 同一币种的冠字号此前已出现过时返回True
+        """
+        if not sno or not sno.strip(IGNORED_CHARS):
+            return False
+        money_flag = money_flag or ''
+        value = sno_hash(sno)
+        with self._lock:
+            maybe, duplicate = self._index(money_flag).add(value)
+            if self._pending is not None:
+                self._pending.append((money_flag, value))
+        if maybe and not duplicate:
+            duplicate = self._exists(money_flag, sno)
+        if duplicate:
+            self.duplicate_count += 1
+        return duplicate
+
+    # 按冠字号索引查询点钞记录，result表中没有时从新到旧查询各归档分区（归档文件有相同的冠字号索引）
+    def _exists(self, money_flag: str, sno: str) -> bool:
+        self.lookup_count += 1
+        model = self.model
+        query = select(model.id).where(model.sno == sno, func.coalesce(model.money_flag, '') == money_flag).limit(1)
+        with self.session_factory() as db:
+            if db.execute(query).first() is not None:
+                return True
+        for db in self.archives(True) if self.archives else ():
+            if db.execute(query).first() is not None:
+                return True
+        return False
+
+    def remove(self, money_flag: str, sno: str):
+        """删除点钞记录或纸币未能入库时调用（布隆过滤器不能删除，由查询点钞记录确认）"""
+        if not sno or not sno.strip(IGNORED_CHARS):
+            return
+        money_flag, value = money_flag or '', sno_hash(sno)
+        with self._lock:
+            index = self._indexes.get(money_flag)
+            if index is not None:
+                index.remove(value)
+            if self._pending is not None and (money_flag, value) in self._pending:
+                self._pending.remove((money_flag, value))
+
+    def clear(self):
+        """删除所有点钞记录后调用"""
+        with self._lock:
+            self._indexes = {}
+            self.watermark = 0
+
+    def warm(self, db: Session, batch_size: int = 10000) -> int:
+        """
+        加入水位之后的点钞记录（不计为重复），启动时在加载状态文件之后调用
+        :return: 加入的条数
+        """
+        started_at = time.perf_counter()
+        added, last_id = self._add_rows(db, self.model.id > self.watermark, batch_size)
+        self.watermark = max(self.watermark, last_id)
+        logger.info(f"sno filter warmed: {added} notes, watermark {self.watermark}, "
+                    f"{time.perf_counter() - started_at:.2f}s")
+        return added
+
+    def rebuild(self, db: Session, batch_size: int = 10000) -> int:
+        """
+        从全部点钞记录重新建立索引（状态文件不存在、旧数据迁移完成后或删除所有点钞记录后），
+        先加入各归档分区（从旧到新）的记录，再加入result表的记录
+        新索引在锁外建立，期间check仍使用原索引；建立完成后加锁替换，
+        并重新加入期间check过的冠字号（可能尚未入库），最后加入新水位之后的点钞记录
+        """
+        started_at = time.perf_counter()
+        with self._lock:
+            self._pending = []
+        try:
+            indexes: Dict[str, _CurrencyIndex] = {}
+            added = 0
+            for archive in self.archives(False) if self.archives else ():
+                added += self._add_rows(archive, None, batch_size, indexes)[0]
+            count, watermark = self._add_rows(db, None, batch_size, indexes)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            pending, self._pending = self._pending, None
+            for money_flag, value in pending:
+                index = self._index(money_flag, indexes)
+                # 已从点钞记录加入的不再重复计数
+                if value & 0xFFFFFFFFFFFFFFFF not in index.recent:
+                    index.add(value)
+            self._indexes = indexes
+            self.watermark = watermark
+        logger.info(f"sno filter rebuilt: {added + count} notes, {len(pending)} pending, "
+                    f"{time.perf_counter() - started_at:.2f}s")
+        return added + count + self.warm(db, batch_size)
+
+    def _add_rows(self, db: Session, where, batch_size: int,
+                  indexes: Optional[Dict[str, _CurrencyIndex]] = None) -> Tuple[int, int]:
+        """
+        加入点钞记录的冠字号
+        :param indexes: 加入的索引，为None时加锁加入当前索引
+        :return: (加入的条数, 最大点钞记录id)
+        """
+        model = self.model
+        added = last_id = 0
+        query = select(model.id, model.money_flag, model.sno).order_by(model.id)
+        if where is not None:
+            query = query.where(where)
+        for row_id, money_flag, sno in db.execute(query.execution_options(yield_per=batch_size)):
+            last_id = row_id
+            if not sno or not sno.strip(IGNORED_CHARS):
+                continue
+            value = sno_hash(sno)
+            if indexes is None:
+                with self._lock:
+                    self._index(money_flag or '').add(value)
+            else:
+                self._index(money_flag or '', indexes).add(value)
+            added += 1
+        return added, last_id
+
+    def load(self) -> bool:
+        """
+        加载状态文件
+        :return: 是否加载成功（文件不存在或格式不正确时返回False，需要调用rebuild）
+        """
+        if not self.state_file or not os.path.exists(self.state_file):
+            return False
+        try:
+            with open(self.state_file, 'rb') as f:
+                magic, version, watermark, currency_count = STATE_HEADER.unpack(f.read(STATE_HEADER.size))
+                if magic != STATE_MAGIC or version != STATE_VERSION:
+                    raise ValueError(f"unknown state file: {magic} {version}")
+                indexes = {}
+                for _ in range(currency_count):
+                    size, = struct.unpack('<H', f.read(2))
+                    money_flag = f.read(size).decode('utf-8')
+                    bits, hash_count, count = FILTER_HEADER.unpack(f.read(FILTER_HEADER.size))
+                    index = _CurrencyIndex(self.capacity, self.error_rate, self.recent_size)
+                    if index.bloom.size != bits or index.bloom.hash_count != hash_count:
+                        # 容量或误判率设置已改变
+                        raise ValueError("filter settings changed")
+                    index.bloom.bits = bytearray(f.read(len(index.bloom.bits)))
+                    index.bloom.count = count
+                    recent_count, = struct.unpack('<I', f.read(4))
+                    keys, counts = array('Q'), array('I')
+                    keys.fromfile(f, recent_count)
+                    counts.fromfile(f, recent_count)
+                    index.recent.update(list(zip(keys, counts))[-self.recent_size:])
+                    indexes[money_flag] = index
+        except (OSError, ValueError, EOFError, struct.error, UnicodeDecodeError) as e:
+            logger.warning(f"load sno filter failed: {str(e)}")
+            return False
+        with self._lock:
+            self._indexes = indexes
+            self.watermark = watermark
+        logger.info(f"sno filter loaded: {len(indexes)} currencies, watermark {watermark}")
+        return True
+
+    def save(self):
+        """保存状态文件（先写入.part临时文件，完成后再改名）"""
+        if not self.state_file:
+            return
+        with self.session_factory() as db:
+            # 已加入索引的纸币在入库后id一定大于当前最大id，重启后重新加入即可
+            watermark = db.execute(select(func.max(self.model.id))).scalar() or 0
+        part = self.state_file + '.part'
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok=True)
+            with self._lock:
+                self.watermark = max(self.watermark, watermark)
+                with open(part, 'wb') as f:
+                    f.write(STATE_HEADER.pack(STATE_MAGIC, STATE_VERSION, self.watermark, len(self._indexes)))
+                    for money_flag, index in self._indexes.items():
+                        code = money_flag.encode('utf-8')
+                        f.write(struct.pack('<H', len(code)) + code)
+                        f.write(FILTER_HEADER.pack(index.bloom.size, index.bloom.hash_count, index.bloom.count))
+                        f.write(index.bloom.bits)
+                        f.write(struct.pack('<I', len(index.recent)))
+                        array('Q', index.recent.keys()).tofile(f)
+                        array('I', index.recent.values()).tofile(f)
+            os.replace(part, self.state_file)
+        except OSError as e:
+            logger.warning(f"save sno filter failed: {str(e)}")
+
+    def start(self):
+        """启动定期保存状态文件的线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="sno-filter-saver", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止保存线程并保存状态文件"""
+        thread, self._thread = self._thread, None
+        self._stopping.set()
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=5)
+        self.save()
+
+    def _run(self):
+        while not self._stopping.wait(self.save_interval):
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "currencies": len(self._indexes),
+                "notes": sum(index.bloom.count for index in self._indexes.values()),
+                "recent": sum(len(index.recent) for index in self._indexes.values()),
+                "memory": sum(len(index.bloom.bits) for index in self._indexes.values()),
+                "duplicates": self.duplicate_count,
+                "lookups": self.lookup_count,
+                "watermark": self.watermark,
+            }
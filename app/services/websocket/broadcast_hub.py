@@ -0,0 +1,71 @@
+# 导入系统库
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Optional, Set
+
+# 导入第三方库
+from loguru import logger
+
+# 导入自定义库
+
+# 定义常量
+PENDING_SIZE = 1000  # 事件循环启动前暂存的消息条数
+
+
+# 定义消息广播中心
+class BroadcastHub:
+    '''
+    功能：将串口接收线程产生的消息推送给事件循环中的websocket连接
+        1. 任意线程调用publish发布消息，通过loop.call_soon_threadsafe交给事件循环，不阻塞、不轮询
+        2. 在事件循环中将消息交给每个订阅者（websocket客户端）的push方法，
+           订阅者自行缓冲并唤醒发送任务，慢连接不会拖慢接收线程和其他连接
+    '''
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published_count = 0
+        self._subscribers: Set[Any] = set()
+        self._pending = deque(maxlen=PENDING_SIZE)
+        self._lock = threading.Lock()
+
+    # 绑定事件循环（应用启动时调用），并投递绑定前发布的消息
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            self.loop = loop
+            pending, self._pending = list(self._pending), deque(maxlen=PENDING_SIZE)
+        for message in pending:
+            loop.call_soon_threadsafe(self._dispatch, message)
+
+    # 发布消息（线程安全）
+    def publish(self, message: dict):
+        with self._lock:
+            loop = self.loop
+            if loop is None or loop.is_closed():
+                self._pending.append(message)
+                return
+        try:
+            loop.call_soon_threadsafe(self._dispatch, message)
+        except RuntimeError:
+            # 事件循环已关闭（应用退出中）
+            logger.warning("broadcast hub: event loop is closed, message dropped")
+
+    # 在事件循环中分发消息
+    def _dispatch(self, message: dict):
+        self.published_count += 1
+        for subscriber in self._subscribers:
+            subscriber.push(message)
+
+    # 订阅消息（在事件循环中调用），订阅者需要实现push(message)方法
+    def subscribe(self, subscriber):
+        if self.loop is None:
+            self.bind(asyncio.get_running_loop())
+        self._subscribers.add(subscriber)
+
+    # 取消订阅
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
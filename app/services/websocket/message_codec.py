@@ -0,0 +1,149 @@
+'''
+点钞数据消息的编码
+1. JSON格式（默认）：与原来的serial_data消息一致，数值转换为字符串，图像为base64编码的PNG
+2. 二进制格式（连接参数format=binary）：一个websocket二进制帧包含一条或多条点钞数据，全部为小端字节序
+    帧头（6字节）：
+        magic       2s  b'BN'
+        version     B   协议版本，当前为3
+        reserved    B   保留，为0
+        count       H   本帧包含的点钞数据条数
+    每条点钞数据：
+        create_at   d   接收时间（Unix时间戳，秒）
+        year        H   验钞启动日期：年
+        month       B   月
+        day         B   日
+        hour        B   验钞启动时间：时
+        minute      B   分
+        second      B   秒
+        tf_flag     H   真伪标志
+        valuta      I   币值
+        fsn_count   H   纸币计数
+        money_flag  4s  币种代码（ASCII，不足4位补0）
+        ver         H   版本号
+        undefine    H   未定义字段
+        char_num    H   冠字号码字符数
+        reserve1    H   保留字
+        flags       B   标志位：bit0为冠字号重复
+        sno             B长度 + ASCII冠字号码
+        machine_number  B长度 + ASCII机具编号
+        currency_name   B长度 + UTF-8币种名称
+        device          B长度 + UTF-8设备标识（串口号）
+        image           H长度 + 96*16的8位灰度原始像素（逐行从上到下，长度为0表示没有图像）
+    其他类型的消息（提示、错误等）仍以JSON文本帧发送
+'''
+
+# 导入系统库
+import struct
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+# 导入第三方库
+
+# 导入自定义库
+
+
+# 定义常量
+MAGIC = b'BN'
+VERSION = 3  # 版本2增加设备标识，版本3增加标志位
+FRAME_HEADER = struct.Struct('<2sBBH')
+NOTE_HEADER = struct.Struct('<dHBBBBBHIH4sHHHHB')
+FLAG_DUPLICATE = 0x01  # 标志位：冠字号重复
+MAX_NOTES_PER_FRAME = 0xFFFF
+_U8 = struct.Struct('<B')
+_U16 = struct.Struct('<H')
+
+
+# 点钞数据转换为JSON格式（与原来的消息格式一致）
+def note_to_json(data: dict, image_data: Optional[str]) -> dict:
+    note = {}
+    for key, value in data.items():
+        if key == 'image':
+            continue
+        if isinstance(value, datetime):
+            note[key] = value.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            note[key] = f"{value}"
+    note['image_data'] = image_data
+    return note
+
+
+def _short_bytes(text: str, encoding: str = 'ascii') -> bytes:
+    raw = (text or '').encode(encoding, errors='replace')[:0xFF]
+    return _U8.pack(len(raw)) + raw
+
+
+# 编码一条点钞数据
+def encode_note(data: dict, device: str = '') -> bytes:
+    note_date = data['date']
+    hour, minute, second = data['time']
+    image = data.get('image') or b''
+    return b''.join((
+        NOTE_HEADER.pack(
+            data['create_at'].timestamp(),
+            note_date.year, note_date.month, note_date.day,
+            hour & 0xFF, minute & 0xFF, second & 0xFF,
+            data['tf_flag'],
+            data['valuta'],
+            data['fsn_count'],
+            data['money_flag'].encode('ascii', errors='replace')[:4],
+            data['ver'],
+            data['undefine'],
+            data['char_num'],
+            data['reserve1'],
+            FLAG_DUPLICATE if data.get('duplicate') else 0,
+        ),
+        _short_bytes(data['sno']),
+        _short_bytes(data['machine_number']),
+        _short_bytes(data['currency_name'], 'utf-8'),
+        _short_bytes(device, 'utf-8'),
+        _U16.pack(len(image)),
+        image,
+    ))
+
+
+# 编码一帧（一条或多条serial_data消息）
+def encode_notes(messages: Iterable[dict]) -> bytes:
+    parts = [encode_note(message['data'], message.get('device', '')) for message in messages]
+    if len(parts) > MAX_NOTES_PER_FRAME:
+        raise ValueError(f"too many notes in one frame: {len(parts)}")
+    return FRAME_HEADER.pack(MAGIC, VERSION, 0, len(parts)) + b''.join(parts)
+
+
+# 解码一帧（供测试和Python客户端使用）
+def decode_notes(frame: bytes) -> List[dict]:
+    magic, version, _, count = FRAME_HEADER.unpack_from(frame, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"unknown frame: magic={magic!r}, version={version}")
+    offset = FRAME_HEADER.size
+    notes = []
+    for _ in range(count):
+        fields = NOTE_HEADER.unpack_from(frame, offset)
+        offset += NOTE_HEADER.size
+        texts = []
+        for encoding in ('ascii', 'ascii', 'utf-8', 'utf-8'):
+            length = frame[offset]
+            texts.append(bytes(frame[offset + 1:offset + 1 + length]).decode(encoding))
+            offset += 1 + length
+        (length,) = _U16.unpack_from(frame, offset)
+        image = bytes(frame[offset + 2:offset + 2 + length])
+        offset += 2 + length
+        notes.append({
+            'create_at': fields[0],
+            'date': fields[1:4],
+            'time': fields[4:7],
+            'tf_flag': fields[7],
+            'valuta': fields[8],
+            'fsn_count': fields[9],
+            'money_flag': fields[10].rstrip(b'\x00').decode('ascii'),
+            'ver': fields[11],
+            'undefine': fields[12],
+            'char_num': fields[13],
+            'reserve1': fields[14],
+            'duplicate': bool(fields[15] & FLAG_DUPLICATE),
+            'sno': texts[0],
+            'machine_number': texts[1],
+            'currency_name': texts[2],
+            'device': texts[3],
+            'image': image,
+        })
+    return notes
@@ -1,36 +1,149 @@
 # 导入系统库
-from loguru import logger
+import asyncio
+import itertools
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
 
 # 导入第三方库
+from loguru import logger
 from fastapi import WebSocket
 
 # 导入自定义库
+from app.services.websocket.broadcast_hub import BroadcastHub
+
+# 定义常量
+DROP_OLDEST = 'drop_oldest'  # 缓冲区已满时丢弃最早的消息
+COALESCE = 'coalesce'        # 同类状态消息只保留最新一条，缓冲区仍满时丢弃最早的消息
+POLICIES = (DROP_OLDEST, COALESCE)
+
+
+# 合并范围：类型、设备及任务id（export_progress的data.id）都相同的消息才合并，
+# 不同设备的提示、不同任务的进度（包括结束状态）不会互相覆盖
+def coalesce_key(message: dict) -> tuple:
+    data = message.get("data")
+    return message.get("type"), message.get("device"), data.get("id") if isinstance(data, dict) else None
+
+
+# 定义websocket客户端
+class WebSocketClient:
+    '''
+    功能：一个websocket连接及其待发送消息的环形缓冲区
+        1. push在事件循环中由广播中心调用，不会阻塞，缓冲区容量固定
+        2. 发送任务通过get_batch等待并取出待发送的消息
+        3. 记录发送、丢弃、合并的消息数和积压情况
+    '''
+    def __init__(self, id: int, websocket: WebSocket, buffer_size: int = 1000,
+                 policy: str = DROP_OLDEST, coalesce_types: Iterable[str] = ()):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow consumer policy: {policy}")
+        self.id = id
+        self.websocket = websocket
+        self.buffer_size = buffer_size
+        self.policy = policy
+        self.coalesce_types = frozenset(coalesce_types)
+        self.connected_at = datetime.now()
+        self.sent_count = 0
+        self.dropped_count = 0
+        self.coalesced_count = 0
+        self.max_pending = 0
+        self.last_lag = 0.0     # 最近一次发送的消息在缓冲区中等待的秒数
+        self._items = deque()   # (消息, 入队时间)
+        self._ready = asyncio.Event()
+
+    # 消息入队（在事件循环中调用）
+    def push(self, message: dict):
+        if self.policy == COALESCE and message.get("type") in self.coalesce_types:
+            key = coalesce_key(message)
+            for i, (pending, enqueued_at) in enumerate(self._items):
+                if pending.get("type") == message["type"] and coalesce_key(pending) == key:
+                    self._items[i] = (message, enqueued_at)
+                    self.coalesced_count += 1
+                    return
+        if len(self._items) >= self.buffer_size:
+            self._items.popleft()
+            self.dropped_count += 1
+        self._items.append((message, time.monotonic()))
+        self.max_pending = max(self.max_pending, len(self._items))
+        self._ready.set()
+
+    # 等待并取出一批消息（最多max_batch条）
+    async def get_batch(self, max_batch: int) -> List[dict]:
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        now = time.monotonic()
+        self.last_lag = now - self._items[0][1]
+        messages = [self._items.popleft()[0] for _ in range(min(max_batch, len(self._items)))]
+        self.sent_count += len(messages)
+        return messages
+
+    @property
+    def pending(self) -> int:
+        return len(self._items)
+
+    @property
+    def lag(self) -> float:
+        """最早一条待发送消息已等待的秒数"""
+        return time.monotonic() - self._items[0][1] if self._items else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "client": f"{self.websocket.client.host}:{self.websocket.client.port}" if self.websocket.client else None,
+            "connected_at": self.connected_at.strftime('%Y-%m-%d %H:%M:%S'),
+            "policy": self.policy,
+            "pending": self.pending,
+            "buffer_size": self.buffer_size,
+            "max_pending": self.max_pending,
+            "sent": self.sent_count,
+            "dropped": self.dropped_count,
+            "coalesced": self.coalesced_count,
+            "lag": round(self.lag, 3),
+            "last_lag": round(self.last_lag, 3),
+        }
 
-# 定义全局变量
 
 # 定义websocket管理器
 class WebSocketManager:
-    def __init__(self):
-        self.active_connection: WebSocket = None
+    '''
+    功能：管理多个websocket连接
+        每个连接作为广播中心的订阅者，拥有独立的缓冲区，
+        慢连接只会丢弃自己的消息，不影响其他连接，内存占用有上限
+    '''
+    def __init__(self, hub: BroadcastHub, buffer_size: int = 1000, policy: str = DROP_OLDEST,
+                 coalesce_types: Iterable[str] = ()):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow consumer policy: {policy}")
+        self.hub = hub
+        self.buffer_size = buffer_size
+        self.policy = policy
+        self.coalesce_types = tuple(coalesce_types)
+        self.clients: Dict[int, WebSocketClient] = {}
+        self._ids = itertools.count(1)
 
     # 添加连接
-    async def connect(self, websocket: WebSocket):
-        if self.active_connection:
-            await self.disconnect()
+    async def connect(self, websocket: WebSocket, policy: Optional[str] = None) -> WebSocketClient:
+        client = WebSocketClient(next(self._ids), websocket, self.buffer_size, policy or self.policy, self.coalesce_types)
         await websocket.accept()
-        self.active_connection = websocket
-        logger.info(f"connect websocket sucessfully : {websocket}")
+        self.clients[client.id] = client
+        self.hub.subscribe(client)
+        logger.info(f"connect websocket sucessfully : {websocket}, clients: {len(self.clients)}")
+        return client
 
     # 移除连接
-    async def disconnect(self):
+    async def disconnect(self, client: WebSocketClient):
+        self.hub.unsubscribe(client)
+        if self.clients.pop(client.id, None) is None:
+            return
         try:
-            if self.active_connection:
-                await self.active_connection.close()
-                self.active_connection = None
-                logger.info(f"disconnect websocket successfully: {self.active_connection}")
+            await client.websocket.close()
+            logger.info(f"disconnect websocket successfully: {client.websocket}, clients: {len(self.clients)}")
         except RuntimeError as e:
-            logger.error(f"disconnect websocket failed: {str(e)}")
+            # 连接已被客户端关闭
+            logger.debug(f"websocket already closed: {str(e)}")
 
-    # def send_data_to_client(self, data: json):
-    #     if self.active_connection:
-    #         await self.active_connection.send_json(data)
\ No newline at end of file
+    # 各连接的发送情况
+    def stats(self) -> List[dict]:
+        return [client.stats() for client in self.clients.values()]
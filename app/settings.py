@@ -1,13 +1,14 @@
 # 导入系统库
 import os
 import sys
-from typing import List
+from typing import Dict, List
 
 # 定义全局变量
 USER_HOME = os.path.expanduser("~")
 STATIC_DIR = os.path.join(os.path.dirname(__file__), 'ui')
 DB_STORE_DIR = os.path.join(USER_HOME, 'AppData', 'Roaming', 'GraceTek', 'DB')
 LOG_STORE_DIR = os.path.join(USER_HOME, 'AppData', 'Roaming', 'GraceTek', 'Log')
+EXPORT_DIR = os.path.join(USER_HOME, 'Desktop', 'GraceTek')
 
 
 # 定义所有配置数据
@@ -24,6 +25,86 @@ class Settings:
         AUTO_FLASH: bool = True
         PREFIX: str = 'sqlite:///' if sys.platform.startswith('win') else 'sqlite:////'
         DATABASE_URL: str = PREFIX + os.path.join(DB_STORE_DIR, 'database.db')
+        # SQLite存储参数（每个连接建立时通过PRAGMA设置）
+        JOURNAL_MODE: str = 'WAL'           # WAL模式下读写互不阻塞
+        SYNCHRONOUS: str = 'NORMAL'         # WAL模式下NORMAL即可保证数据库一致性
+        MMAP_SIZE: int = 256 * 1024 * 1024  # 内存映射读取的大小（字节）
+        CACHE_SIZE: int = -64000            # 页缓存大小，负数表示KB
+        TEMP_STORE: str = 'MEMORY'          # 临时表和索引放在内存中
+        BUSY_TIMEOUT: float = 5.0           # 数据库被锁定时的等待时间（秒）
+        # 连接池参数（接口请求线程、串口接收线程和入库线程共用）
+        POOL_SIZE: int = 10
+        MAX_OVERFLOW: int = 10
+        POOL_TIMEOUT: float = 30.0
+
+    class DB_WRITER:
+        BATCH_SIZE: int = 200           # 每批最多写入的条数
+        FLUSH_INTERVAL_MS: int = 500    # 最长写入间隔（毫秒）
+        QUEUE_SIZE: int = 10000         # 待入库队列容量
+        MAX_RETRIES: int = 3            # 批量写入失败后的重试次数
+        PUT_TIMEOUT: float = 1.0        # 队列已满时最多等待的秒数
+
+    class DEVICES:
+        MAX_DEVICES: int = 8            # 同时采集的设备（串口）数上限
+
+    class SERIAL:
+        TRANSPORT: str = 'thread'       # 接收方式：thread每台设备一个接收线程，asyncio所有设备共用一个事件循环线程
+        READ_TIMEOUT: float = 0.5       # 单次读取的最长等待时间（秒），停止接收时最多等待这么久
+        FRAME_TIMEOUT: float = 2.0      # 未完成的帧超过该时间（秒）仍未收齐则丢弃
+
+    class IMAGE_STORE:
+        BASE_DIR: str = os.path.join(DB_STORE_DIR, 'images')  # 图像包文件目录
+        MAX_PACK_SIZE: int = 256 * 1024 * 1024                # 单个包文件最大字节数
+        ENCODE_WORKERS: int = 2                               # 图像编码线程数
+        ENCODE_CACHE_SIZE: int = 4096                         # 已编码图像的缓存条数
+
+    class WEBSOCKET:
+        QUEUE_SIZE: int = 1000          # 每个连接待发送消息的最大条数（环形缓冲区）
+        POLICY: str = 'drop_oldest'     # 缓冲区已满时的处理方式：drop_oldest丢弃最早的消息，coalesce先合并同类状态消息
+        COALESCE_TYPES: List[str] = ['warning', 'notification', 'stats', 'export_progress']  # coalesce方式下只保留最新一条的消息类型（按设备、任务分别保留）
+        BATCH: bool = False             # 是否将同时到达的多条消息合并为一条batch消息（连接参数batch可覆盖）
+        MAX_BATCH: int = 100            # 每条batch消息（或二进制帧）最多包含的消息条数
+        FORMAT: str = 'json'            # 点钞数据的默认格式：json或binary（连接参数format可覆盖）
+        PER_MESSAGE_DEFLATE: bool = True  # 是否允许permessage-deflate压缩（客户端请求时启用）
+
+    class METRICS:
+        LOG_INTERVAL: float = 10.0      # 采集进度日志的间隔（秒），代替每张纸币一条日志
+        STATS_INTERVAL: float = 1.0     # websocket的stats消息的默认间隔（秒，连接参数stats可覆盖）
+        MIN_STATS_INTERVAL: float = 0.2 # stats消息的最小间隔（秒）
+
+    class EXPORT:
+        OUTPUT_DIR: str = EXPORT_DIR    # 导出文件目录
+        MAX_WORKERS: int = 1            # 同时执行的导出任务数
+        MAX_JOBS: int = 50              # 保留的导出任务记录条数
+        PROGRESS_INTERVAL: float = 0.5  # 导出进度消息的最小间隔（秒）
+        CHUNK_SIZE: int = 5000          # CSV、NDJSON、Parquet、FSN导出时每批从数据库读取的条数
+        NDJSON_COMPRESS_LEVEL: int = 6  # NDJSON导出的gzip压缩级别
+        PARQUET_COMPRESSION: str = 'zstd'  # Parquet导出的压缩算法（需要安装pyarrow）
+
+    class STATS:
+        FLUSH_INTERVAL: float = 1.0     # 点钞汇总写入汇总表并推送变化（money_stats消息）的间隔（秒）
+        ROLLUP_CHUNK_DAYS: int = 1      # 后台重建预汇总表时每个事务统计的天数
+        ROLLUP_PAUSE: float = 0.01      # 重建预汇总表的两个事务之间让出数据库的时间（秒）
+
+    class DUPLICATE:
+        ENABLED: bool = True            # 是否检测重复的冠字号（推送的纸币数据中duplicate为True）
+        CAPACITY: int = 2000000         # 每个币种布隆过滤器的容量（条），每个币种约占CAPACITY * 1.8字节
+        ERROR_RATE: float = 0.001       # 布隆过滤器的误判率（误判时查询点钞记录确认）
+        RECENT_SIZE: int = 50000        # 每个币种在内存中保留的最近冠字号条数（精确判断，不查询点钞记录）
+        STATE_FILE: str = os.path.join(DB_STORE_DIR, 'sno_filter.bin')  # 状态文件，重启后不必扫描全部点钞记录
+        SAVE_INTERVAL: float = 300.0    # 定期保存状态文件的间隔（秒）
+
+    class RETENTION:
+        ENABLED: bool = True            # 是否在后台归档、压缩和清理点钞记录
+        ARCHIVE_DIR: str = os.path.join(DB_STORE_DIR, 'archive')  # 按月归档文件的目录
+        HOT_MONTHS: int = 6             # result表保留当月及之前几个月的记录，更早的按月归档（0表示不归档）
+        COMPRESS_AFTER_MONTHS: int = 12 # 早于几个月的归档文件压缩为.db.gz（0表示不压缩）
+        RETENTION_MONTHS: int = 0       # 早于几个月的记录过期删除（0表示永久保留）
+        BATCH_SIZE: int = 2000          # 归档和删除时每个事务处理的条数
+        PAUSE: float = 0.05             # 两个事务之间让出数据库的时间（秒）
+        INTERVAL: float = 3600.0        # 检查间隔（秒）
+        START_DELAY: float = 60.0       # 启动后首次检查的延迟（秒）
+        CACHE_SIZE: int = 4             # 查询已压缩的分区时保留的解压文件个数
 
     class CORS_MIDDLEWARE:
         ALLOW_METHODS: List[str] = ["*"]
@@ -38,10 +119,19 @@ class Settings:
         DIAGNOSE: bool = True
         TRACEBACK: bool = True
         LOG_NAME: str = os.path.join(LOG_STORE_DIR, 'log.log')
-        RETENTION: int = 5
+        RETENTION: int = 5                  # 保留的旧日志文件个数
+        ROTATION: int = 50 * 1024 * 1024    # 日志文件达到该大小（字节）时轮转
+        QUEUE_SIZE: int = 10000             # ENQUEUE为True时待写入日志的最大条数，队列已满时丢弃新日志
+        JSON: bool = False                  # 是否每条日志输出为一行JSON
+        MODULE_LEVELS: Dict[str, str] = {}  # 按子系统（serial、api、websocket、db、image）或模块名设置级别，例如{'serial': 'WARNING', 'api': 'INFO'}
+        RATE_LIMIT_INTERVAL: float = 10.0   # 重复警告的限流周期（秒）
+        RATE_LIMIT_BURST: int = 5           # 同一位置的警告、错误每个周期最多输出的条数，0表示不限流
 
     class DATA_SOURCE:
         REAL_OR_TEST: str = 'real' # real代表数据是真实数据，test代表数据是从文件中读取的测试数据
+        REPLAY_FILE: str = '' # 回放的采集文件（.txt/.hex为十六进制文本，其他为原始字节）
+        REPLAY_SPEED: str = 'original' # 回放速度：original按波特率计算的原始速度，数字为倍速，max为不限速
+        REPLAY_LOOP: bool = False # 回放结束后是否从头循环回放
 
 def load_app_settings() -> Settings:
     settings = Settings()
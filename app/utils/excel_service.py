@@ -1,97 +1,174 @@
+# 导入系统库
 import os
+import struct
+import tempfile
 from datetime import datetime
-import base64
-import getpass
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+# 导入第三方库
 from openpyxl import Workbook
 from openpyxl.drawing.image import Image
-from io import BytesIO
+from openpyxl.utils import get_column_letter
 from PIL import Image as PILImage  # 需要安装pillow包
 
-def export_to_excel(data, file_name):
-    # 初始化工作簿
-    wb = Workbook()
-    ws = wb.active
-    
-    # 添加表头
-    headers = list(data[0].keys()) if data else []
-    ws.append(headers)
-    
-    # 预设参数
-    DEFAULT_ROW_HEIGHT = 20  # 默认行高（单位：磅）
-    MAX_IMAGE_WIDTH = 200    # 图片最大宽度（像素）
-    PIXELS_PER_POINT = 1.33  # 1磅≈1.33像素
-    
-    # 添加数据行
-    for idx, row in enumerate(data, start=2):
-        # 设置默认行高
-        ws.row_dimensions[idx].height = DEFAULT_ROW_HEIGHT
-        
-        # 处理图片
-        if 'S.N. Image' in row and row['S.N. Image']:
-            try:
-                # 解码图片并获取原始尺寸
-                img_data = base64.b64decode(row['S.N. Image'])
-                pil_img = PILImage.open(BytesIO(img_data))
-                original_width, original_height = pil_img.size
-                
-                # 计算最大允许高度（单位：像素）
-                max_height_pixels = DEFAULT_ROW_HEIGHT * PIXELS_PER_POINT
-                
-                # 计算缩放比例（同时考虑宽度和高度限制）
-                width_scale = MAX_IMAGE_WIDTH / original_width
-                height_scale = max_height_pixels / original_height
-                scale_factor = min(width_scale, height_scale)
-                
-                # 计算目标尺寸
-                target_width = int(original_width * scale_factor)
-                target_height = int(original_height * scale_factor)
-                
-                # 创建Excel图片对象
-                img = Image(BytesIO(img_data))
-                img.width = target_width
-                img.height = target_height
-                
-                # 插入图片并更新标注
-                ws.add_image(img, f'H{idx}')
-                row['S.N. Image'] = f'见H{idx}单元格图片'
-                
-                # 调整列宽适应图片
-                col_letter = 'H'
-                required_col_width = max(
-                    ws.column_dimensions[col_letter].width or 0,
-                    target_width / 7  # 1字符≈7像素
-                )
-                ws.column_dimensions[col_letter].width = required_col_width
-                
-            except Exception as e:
-                print(f"处理第{idx}行图片时出错: {e}")
-                row['S.N. Image'] = '图片加载失败'
-        
-        # 添加数据
-        ws.append(list(row.values()))
-    
-    # 自动调整所有列宽（排除图片列）
-    for col in ws.columns:
-        max_length = 0
-        col_letter = col[0].column_letter
-        if col_letter == 'H':  # 跳过图片列
-            continue
-            
-        for cell in col:
-            try:
-                max_length = max(max_length, len(str(cell.value or "")))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[col_letter].width = adjusted_width
-    
-    # 保存文件
-    user = getpass.getuser()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    desktop_path = os.path.join(f"C:/Users/{user}/Desktop", 'GraceTek')
-    os.makedirs(desktop_path, exist_ok=True)
-    
-    file_path = os.path.join(desktop_path, f'report_{timestamp}.xlsx')
-    wb.save(file_path)
-    
-    return file_path
\ No newline at end of file
+# 导入自定义库
+
+# 定义常量
+DEFAULT_ROW_HEIGHT = 20     # 默认行高（单位：磅）
+MAX_IMAGE_WIDTH = 200       # 图片最大宽度（像素）
+PIXELS_PER_POINT = 1.33     # 1磅≈1.33像素
+PIXELS_PER_CHAR = 7         # 1字符≈7像素
+WIDTH_SAMPLE_ROWS = 500     # 按前多少行数据计算列宽（只写模式下列宽必须在写入第一行之前设置）
+IMAGE_COLUMN = 'S.N. Image'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+# 生成导出文件路径（目录不存在时创建）
+def export_file_path(output_dir: str, prefix: str = 'report', ext: str = 'xlsx') -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(output_dir, f'{prefix}_{timestamp}.{ext}')
+
+
+# 读取图片尺寸：PNG直接读取文件头，其他格式才用PIL打开
+def image_size(data: bytes) -> Tuple[int, int]:
+    if data[:8] == PNG_SIGNATURE and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    with PILImage.open(BytesIO(data)) as img:
+        return img.size
+
+
+# 定义写入临时文件的图片：图片数据在保存工作簿时才读取，不常驻内存，也不需要PIL解码
+class SpooledImage(Image):
+    def __init__(self, spool, offset: int, length: int, width: int, height: int):
+        self.ref = None
+        self.spool = spool
+        self.offset = offset
+        self.length = length
+        self.width = width
+        self.height = height
+        self.format = 'png'
+
+    def _data(self):
+        self.spool.seek(self.offset)
+        return self.spool.read(self.length)
+
+
+# 定义流式Excel写入器
+class ExcelStreamWriter:
+    '''
+    功能：以openpyxl只写模式逐行写入Excel，内存占用与行数基本无关
+        1. 行数据直接写入工作表的临时文件，不保留单元格对象
+        2. 图片只写入一次临时文件，相同图片（按key）复用，显示尺寸按原始尺寸缓存，不逐行用PIL解码
+        3. 列宽在写入行时逐行累计；只写模式下列宽必须在写入第一行之前确定，
+           因此先缓冲前WIDTH_SAMPLE_ROWS行计算列宽，之后的行直接写入
+        4. 行高使用工作表的默认行高，不为每一行单独设置
+    '''
+    def __init__(self, headers: List[str], image_column: Optional[str] = IMAGE_COLUMN,
+                 row_height: float = DEFAULT_ROW_HEIGHT, max_image_width: int = MAX_IMAGE_WIDTH,
+                 width_sample_rows: int = WIDTH_SAMPLE_ROWS):
+        self.headers = list(headers)
+        self.image_index = self.headers.index(image_column) if image_column in self.headers else None
+        self.image_letter = get_column_letter(self.image_index + 1) if self.image_index is not None else None
+        self.row_height = row_height
+        self.max_image_width = max_image_width
+        self.width_sample_rows = width_sample_rows
+
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet()
+        self.ws.sheet_format.defaultRowHeight = row_height
+        self.ws.sheet_format.customHeight = True
+
+        self.row_count = 0
+        self.image_count = 0
+        self.widths = [len(str(header)) for header in self.headers]
+        self.image_width = 0
+        self._sample: Optional[List[list]] = []
+        self._spool = tempfile.TemporaryFile()
+        self._spooled: Dict[str, Tuple[int, int, int, int]] = {}  # key -> (偏移, 长度, 显示宽度, 显示高度)
+        self._scales: Dict[Tuple[int, int], Tuple[int, int]] = {}  # 原始尺寸 -> 显示尺寸
+
+    def append(self, row: Dict[str, Any], image: Optional[bytes] = None, image_key: Optional[str] = None):
+        """
+        写入一行数据
+        :param row: 表头到值的字典，图片列的值会被替换为说明文字
+        :param image: 图片数据（PNG等）
+        :param image_key: 图片的唯一标识（如图像哈希），相同标识的图片只写入一次
+        """
+        self.row_count += 1
+        values = [row.get(header) for header in self.headers]
+        if self.image_index is not None:
+            values[self.image_index] = self._add_image(image, image_key) if image else None
+
+        if self._sample is None:
+            self.ws.append(values)
+            return
+        for i, value in enumerate(values):
+            if i != self.image_index and value is not None:
+                self.widths[i] = max(self.widths[i], len(str(value)))
+        self._sample.append(values)
+        if len(self._sample) >= self.width_sample_rows:
+            self._flush_sample()
+
+    def _add_image(self, image: bytes, key: Optional[str]) -> str:
+        cell = f'{self.image_letter}{self.row_count + 1}'
+        try:
+            spooled = self._spooled.get(key) if key else None
+            if spooled is None:
+                width, height = self._display_size(image_size(image))
+                self._spool.seek(0, os.SEEK_END)
+                spooled = (self._spool.tell(), len(image), width, height)
+                self._spool.write(image)
+                if key:
+                    self._spooled[key] = spooled
+        except Exception:
+            return '图片加载失败'
+        offset, length, width, height = spooled
+        img = SpooledImage(self._spool, offset, length, width, height)
+        self.ws.add_image(img, cell)
+        self.image_count += 1
+        self.image_width = max(self.image_width, width)
+        return f'见{cell}单元格图片'
+
+    # 计算缩放后的显示尺寸（同时考虑宽度和行高限制），相同原始尺寸只计算一次
+    def _display_size(self, size: Tuple[int, int]) -> Tuple[int, int]:
+        scaled = self._scales.get(size)
+        if scaled is None:
+            original_width, original_height = size
+            max_height_pixels = self.row_height * PIXELS_PER_POINT
+            scale_factor = min(self.max_image_width / original_width, max_height_pixels / original_height)
+            scaled = (int(original_width * scale_factor), int(original_height * scale_factor))
+            self._scales[size] = scaled
+        return scaled
+
+    def _flush_sample(self):
+        sample, self._sample = self._sample or [], None
+        for i, width in enumerate(self.widths):
+            letter = get_column_letter(i + 1)
+            if i == self.image_index:
+                # 图片列按图片宽度，之后的图片不会比样本中的更宽（同一设备的图像尺寸相同）
+                width = max(width, self.image_width / PIXELS_PER_CHAR)
+                self.ws.column_dimensions[letter].width = width
+            else:
+                self.ws.column_dimensions[letter].width = width + 2
+        self.ws.append(self.headers)
+        for values in sample:
+            self.ws.append(values)
+
+    def save(self, file_path: str) -> str:
+        """保存工作簿：先写入临时文件，完成后再改名，下载时不会读到不完整的文件"""
+        if self._sample is not None:
+            self._flush_sample()
+        temp_path = file_path + '.part'
+        try:
+            self.wb.save(temp_path)
+            os.replace(temp_path, file_path)
+        finally:
+            self.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return file_path
+
+    def close(self):
+        self._spool.close()
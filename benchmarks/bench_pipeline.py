@@ -0,0 +1,425 @@
+'''
+点钞数据采集链路的吞吐量基准测试
+用合成的1656字节帧（含错误帧和不完整帧）分别测量各环节每秒处理的纸币数和单条延迟（p50/p99）：
+    parse       帧解析（FrameParser，按串口读取大小分块写入）
+    decode      纸币信息解析（decode_banknote）
+    encode      图像编码（ImageEncoder，原始像素 -> PNG -> base64，不命中缓存）
+    push        推送（SerialController.push_data -> 广播中心 -> websocket发送任务，延迟为发布到发送完成）
+    save        入库（SerialController.save_data -> 批量入库线程 -> 图像仓库 + SQLite，延迟为提交到事务提交）
+    serial      端到端（伪终端/loop://串口 -> 接收线程 -> 解析、推送、入库，延迟为写入串口到发布）
+结果以JSON输出到标准输出（可用--output保存），便于不同版本之间比较，例如：
+    python benchmarks/bench_pipeline.py --notes 2000 --output bench.json
+'''
+
+# 导入系统库
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, List
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入第三方库
+import serial
+from loguru import logger
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# 导入自定义库
+from benchmarks.synthetic_frames import SyntheticStream, make_stream
+from app.apis.ws_ctrl_api import send_serial_data
+from app.cores import serial_ctrl
+from app.cores.banknote_model import decode_banknote
+from app.cores.serial_ctrl import SerialController
+from app.extensions import Base, set_sqlite_pragmas, get_broadcast_hub
+from app.models import Result, ImageBlob
+from app.services.database.counters import ensure_result_counter
+from app.services.database.db_writer import BatchWriter
+from app.services.database.sno_index import ensure_sno_index
+from app.services.image.image_encoder import ImageEncoder
+from app.services.image.image_store import ImageStore, ImageStoreConfig
+from app.services.serial.frame_parser import FrameParser, HEADER_LENGTH, LENGTH_FIELD_SIZE
+from app.services.websocket.message_codec import FRAME_HEADER
+from app.services.websocket.websocket_manager import WebSocketClient
+from app.settings import load_app_settings
+
+# 定义全局变量
+settings = load_app_settings()
+STAGES = ('parse', 'decode', 'encode', 'push', 'save', 'serial')
+BODY_OFFSET = HEADER_LENGTH + LENGTH_FIELD_SIZE
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def stage_result(stage: str, notes: int, seconds: float, latencies: List[float], **extra) -> dict:
+    return {
+        "stage": stage,
+        "notes": notes,
+        "seconds": round(seconds, 6),
+        "notes_per_sec": round(notes / seconds, 1) if seconds > 0 else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 4),
+        **extra,
+    }
+
+
+# 计时的批量入库线程：记录每条数据从提交到事务提交的时间
+class TimedBatchWriter(BatchWriter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.put_times = deque()
+        self.latencies: List[float] = []
+
+    def put(self, row, timeout: float = 1.0) -> bool:
+        self.put_times.append(time.perf_counter())
+        return super().put(row, timeout)
+
+    def _insert(self, rows):
+        super()._insert(rows)
+        now = time.perf_counter()
+        self.latencies.extend(now - self.put_times.popleft() for _ in rows)
+
+
+# 模拟websocket连接：记录每条点钞数据发送完成的时间
+class FakeWebSocket:
+    client = None
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.sent_times: List[float] = []
+        self.done = asyncio.Event()
+
+    def _sent(self, count: int):
+        now = time.perf_counter()
+        self.sent_times.extend([now] * count)
+        if len(self.sent_times) >= self.expected:
+            self.done.set()
+
+    async def send_json(self, message: dict):
+        json.dumps(message)
+        if message.get("type") == "batch":
+            self._sent(len(message["data"]))
+        elif message.get("type") == "serial_data":
+            self._sent(1)
+
+    async def send_bytes(self, frame: bytes):
+        self._sent(FRAME_HEADER.unpack_from(frame, 0)[3])
+
+
+# 在独立线程中运行的事件循环（代替uvicorn的事件循环）
+class LoopThread:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="bench-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coro, timeout: float = None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# 基准测试用的数据库和图像仓库（临时目录，与应用数据库的存储参数、索引和触发器一致）
+class BenchDatabase:
+    def __init__(self, base_dir: str):
+        self.engine = create_engine(
+            'sqlite:///' + os.path.join(base_dir, 'bench.db'),
+            connect_args={'check_same_thread': False, 'timeout': settings.DB.BUSY_TIMEOUT},
+        )
+        event.listen(self.engine, 'connect', set_sqlite_pragmas)
+        Base.metadata.create_all(bind=self.engine)
+        ensure_sno_index(self.engine)
+        ensure_result_counter(self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.image_store = ImageStore(ImageBlob, ImageStoreConfig(base_dir=os.path.join(base_dir, 'images')))
+
+    def writer(self) -> TimedBatchWriter:
+        return TimedBatchWriter(
+            self.session_factory,
+            Result,
+            batch_size=settings.DB_WRITER.BATCH_SIZE,
+            flush_interval_ms=settings.DB_WRITER.FLUSH_INTERVAL_MS,
+            queue_size=settings.DB_WRITER.QUEUE_SIZE,
+            max_retries=settings.DB_WRITER.MAX_RETRIES,
+            prepare_rows=self.image_store.prepare_rows,
+        )
+
+    def close(self):
+        self.image_store.close()
+        self.engine.dispose()
+
+
+def bench_parse(stream: SyntheticStream, chunk_size: int) -> dict:
+    parser = FrameParser()
+    latencies = []
+    elapsed = 0.0
+    data = memoryview(stream.data)
+    for i in range(0, len(data), chunk_size):
+        started_at = time.perf_counter()
+        for _ in parser.feed(data[i:i + chunk_size]):
+            latencies.append(time.perf_counter() - started_at)
+        elapsed += time.perf_counter() - started_at
+    return stage_result('parse', parser.frame_count, elapsed, latencies,
+                        chunk_size=chunk_size, resync=parser.resync_count, dropped_bytes=parser.dropped_bytes)
+
+
+def bench_decode(stream: SyntheticStream) -> dict:
+    bodies = [memoryview(frame)[BODY_OFFSET:] for frame in stream.frames]
+    latencies = []
+    for body in bodies:
+        started_at = time.perf_counter()
+        record = decode_banknote(body)
+        record.serial_number, record.parsed_date, record.parsed_time
+        latencies.append(time.perf_counter() - started_at)
+    return stage_result('decode', len(bodies), sum(latencies), latencies)
+
+
+def bench_encode(stream: SyntheticStream) -> dict:
+    images = [decode_banknote(memoryview(frame)[BODY_OFFSET:]).image for frame in stream.frames]
+    encoder = ImageEncoder(max_workers=1, cache_size=1)
+    latencies = []
+    try:
+        for image in images:
+            started_at = time.perf_counter()
+            encoder.encode_base64(image)
+            latencies.append(time.perf_counter() - started_at)
+    finally:
+        encoder.close()
+    return stage_result('encode', len(images), sum(latencies), latencies, cache_hits=encoder.hit_count)
+
+
+def bench_push(stream: SyntheticStream, ws_format: str, batch: bool) -> dict:
+    records = [decode_banknote(memoryview(frame)[BODY_OFFSET:]) for frame in stream.frames]
+    hub = get_broadcast_hub()
+    runner = LoopThread()
+    hub.bind(runner.loop)
+    websocket = FakeWebSocket(len(records))
+
+    async def subscribe() -> WebSocketClient:
+        websocket.done = asyncio.Event()
+        client = WebSocketClient(0, websocket, buffer_size=len(records) + 1)
+        hub.subscribe(client)
+        return client
+
+    client = runner.run(subscribe())
+    task = asyncio.run_coroutine_threadsafe(send_serial_data(client, batch, ws_format == 'binary'), runner.loop)
+    controller = SerialController(device='bench')
+    published_times = []
+    try:
+        started_at = time.perf_counter()
+        for record in records:
+            controller.money_info = record
+            published_times.append(time.perf_counter())
+            controller.push_data()
+        runner.run(asyncio.wait_for(websocket.done.wait(), 60))
+        elapsed = websocket.sent_times[-1] - started_at
+    finally:
+        runner.loop.call_soon_threadsafe(hub.unsubscribe, client)
+        task.cancel()
+        runner.close()
+    latencies = [sent - published for sent, published in zip(websocket.sent_times, published_times)]
+    return stage_result('push', len(records), elapsed, latencies, format=ws_format, batch=batch,
+                        dropped=client.dropped_count)
+
+
+def with_writer(db: BenchDatabase, run: Callable[[], None]) -> TimedBatchWriter:
+    """使用基准测试数据库的入库线程执行run，结束后写入剩余数据"""
+    writer = db.writer()
+    original, serial_ctrl.db_writer = serial_ctrl.db_writer, writer
+    try:
+        run()
+    finally:
+        writer.stop(timeout=60)
+        serial_ctrl.db_writer = original
+    return writer
+
+
+def bench_save(stream: SyntheticStream, db: BenchDatabase) -> dict:
+    records = [decode_banknote(memoryview(frame)[BODY_OFFSET:]) for frame in stream.frames]
+    controller = SerialController(device='bench')
+    started_at = time.perf_counter()
+
+    def run():
+        for record in records:
+            controller.money_info = record
+            controller.save_data()
+
+    writer = with_writer(db, run)
+    elapsed = time.perf_counter() - started_at
+    return stage_result('save', writer.written_count, elapsed, writer.latencies,
+                        batches=writer.batch_count, failed=writer.failed_count)
+
+
+# 串口替身：POSIX系统使用伪终端，其他系统使用pyserial的loop://
+def open_serial_standin(controller: SerialController):
+    param = {'baudrate': 115200, 'bytesize': 8, 'parity': 'N', 'stopbits': 1}
+    if hasattr(os, 'openpty'):
+        master, slave = os.openpty()
+        controller.set_serial_param({'port': os.ttyname(slave), **param})
+        opened = controller.open_connection()
+        os.close(slave)
+        write = lambda data: os.write(master, data)
+        close = lambda: os.close(master)
+        name = 'pty'
+    else:
+        controller.serial_communication.serial_conn = serial.serial_for_url('loop://', do_not_open=True)
+        controller.set_serial_param({'port': 'loop://', **param})
+        opened = controller.open_connection()
+        write = controller.serial_communication.serial_conn.write
+        close = lambda: None
+        name = 'loop'
+    if not opened:
+        raise RuntimeError("failed to open serial stand-in")
+    return name, write, close
+
+
+def bench_serial(stream: SyntheticStream, db: BenchDatabase, chunk_size: int) -> dict:
+    hub = get_broadcast_hub()
+    runner = LoopThread()
+    hub.bind(runner.loop)
+    pushed = {}
+    done = threading.Event()
+
+    # 记录每条点钞数据发布的时间（按冠字号码对应写入时间）
+    class Recorder:
+        def push(self, message: dict):
+            if message.get("type") == "serial_data":
+                pushed[message["data"]["sno"]] = time.perf_counter()
+                if len(pushed) >= len(stream.frames):
+                    done.set()
+
+    recorder = Recorder()
+    runner.loop.call_soon_threadsafe(hub.subscribe, recorder)
+    controller = SerialController(device='bench')
+    standin, write, close = open_serial_standin(controller)
+    written = {}
+    result = {}
+
+    def run():
+        receiver = threading.Thread(target=controller.recv_and_save_data, name="bench-recv", daemon=True)
+        receiver.start()
+        started_at = time.perf_counter()
+        # 写入串口：记录每个有效帧写完的时间
+        data = memoryview(stream.data)
+        ends = {}
+        offset = 0
+        for frame in stream.frames:
+            offset = stream.data.index(frame, offset) + len(frame)
+            ends[offset] = decode_banknote(memoryview(frame)[BODY_OFFSET:]).serial_number
+        end_offsets = sorted(ends)
+        position = 0
+        for i in range(0, len(data), chunk_size):
+            chunk = data[i:i + chunk_size]
+            while chunk:
+                chunk = chunk[write(chunk):]
+            now = time.perf_counter()
+            while position < len(end_offsets) and end_offsets[position] <= i + chunk_size:
+                written[ends[end_offsets[position]]] = now
+                position += 1
+        done.wait(60)
+        result['elapsed'] = time.perf_counter() - started_at
+        controller.close_connection()
+        receiver.join(5)
+
+    try:
+        writer = with_writer(db, run)
+    finally:
+        close()
+        runner.loop.call_soon_threadsafe(hub.unsubscribe, recorder)
+        runner.close()
+    latencies = [pushed[sno] - written[sno] for sno in pushed if sno in written]
+    return stage_result('serial', controller.push_count, result['elapsed'], latencies,
+                        standin=standin, saved=writer.written_count, resync=controller.frame_parser.resync_count)
+
+
+def run_benchmarks(args) -> dict:
+    stream = make_stream(args.notes, args.corrupt_rate, args.partial_rate, args.seed)
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    results = []
+    with tempfile.TemporaryDirectory() as base_dir:
+        db = BenchDatabase(base_dir)
+        try:
+            for stage in stages:
+                if stage == 'parse':
+                    results.append(bench_parse(stream, args.chunk_size))
+                elif stage == 'decode':
+                    results.append(bench_decode(stream))
+                elif stage == 'encode':
+                    results.append(bench_encode(stream))
+                elif stage == 'push':
+                    results.append(bench_push(stream, args.ws_format, args.ws_batch))
+                elif stage == 'save':
+                    results.append(bench_save(stream, db))
+                elif stage == 'serial':
+                    results.append(bench_serial(stream, db, args.chunk_size))
+                else:
+                    raise ValueError(f"unknown stage: {stage}")
+        finally:
+            db.close()
+    return {
+        "benchmark": "pipeline",
+        "app_version": settings.APP.APP_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "params": {
+            "notes": args.notes,
+            "corrupted": stream.corrupted,
+            "partial": stream.partial,
+            "stream_bytes": len(stream.data),
+            "seed": args.seed,
+            "chunk_size": args.chunk_size,
+        },
+        "stages": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the serial acquisition pipeline")
+    parser.add_argument('--notes', type=int, default=2000, help="number of valid frames")
+    parser.add_argument('--corrupt-rate', type=float, default=0.02, help="probability of a corrupted frame before each note")
+    parser.add_argument('--partial-rate', type=float, default=0.02, help="probability of a partial frame before each note")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=4096, help="bytes per serial read/write")
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"comma separated stages: {','.join(STAGES)}")
+    parser.add_argument('--ws-format', choices=('json', 'binary'), default='json')
+    parser.add_argument('--ws-batch', action='store_true', help="merge pending notes into one websocket message")
+    parser.add_argument('--output', help="also write the JSON result to this file")
+    parser.add_argument('--log-level', default='WARNING')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    result = run_benchmarks(args)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    for stage in result["stages"]:
+        print(f"{stage['stage']:>8}: {stage['notes_per_sec']} notes/s, p50 {stage['p50_ms']} ms, p99 {stage['p99_ms']} ms",
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
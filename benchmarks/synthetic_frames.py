@@ -0,0 +1,94 @@
+# 导入系统库
+import os
+import random
+import struct
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.cores.banknote_model import BANKNOTE_STRUCT
+from app.services.serial.frame_parser import HEADER, TAIL, MODE_FLAG, MSG_LENGTH, FRAME_LENGTH
+
+# 定义常量
+IMAGE_SIZE = 96 * 16
+CURRENCIES = ('CNY', 'USD', 'EUR', 'HKD')
+VALUTAS = {'CNY': (10, 20, 50, 100), 'USD': (1, 5, 10, 20, 50, 100), 'EUR': (5, 10, 20, 50), 'HKD': (20, 50, 100)}
+SNO_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+NOTE_TIME = datetime(2025, 1, 1, 9, 30)   # 合成数据的验钞时间（固定，保证数据可复现）
+_PREFIX = struct.Struct('<4sHH')
+
+
+@dataclass
+class SyntheticStream:
+    """合成的串口数据流"""
+    data: bytes
+    frames: List[bytes] = field(default_factory=list)   # 其中的有效帧（按顺序）
+    corrupted: int = 0  # 错误帧数
+    partial: int = 0    # 不完整帧数
+
+
+# 生成一帧有效数据（1656字节），冠字号码和图像各不相同
+def make_frame(rng: random.Random, index: int, now: datetime = NOTE_TIME) -> bytes:
+    currency = rng.choice(CURRENCIES)
+    sno = ''.join(rng.choice(SNO_CHARS) for _ in range(10))
+    machine_number = f"BENCH{index % 100:02d}".ljust(24)
+    body = BANKNOTE_STRUCT.pack(
+        ((now.year - 1980) << 9) + (now.month << 5) + now.day,
+        (now.hour << 11) + (now.minute << 5) + now.second // 2,
+        rng.choice((0, 0, 0, 1)),
+        rng.choice(VALUTAS[currency]),
+        index & 0xFFFF,
+        *(ord(c) for c in currency.ljust(4, '\x00')),
+        1,
+        0,
+        len(sno),
+        *(ord(c) for c in sno.ljust(12, '\x00')),
+        *(ord(c) for c in machine_number),
+        0,
+        0, 0, 0, 0,
+        rng.randbytes(IMAGE_SIZE),
+    )
+    return _PREFIX.pack(HEADER, MSG_LENGTH, MODE_FLAG) + body + TAIL
+
+
+# 生成一帧错误数据（长度、模式标志或结束标志错误）
+def corrupt_frame(rng: random.Random, frame: bytes) -> bytes:
+    data = bytearray(frame)
+    kind = rng.randrange(3)
+    if kind == 0:
+        data[4:6] = struct.pack('<H', MSG_LENGTH + 1)
+    elif kind == 1:
+        data[6:8] = struct.pack('<H', MODE_FLAG + 1)
+    else:
+        data[-len(TAIL):] = b'\x00' * len(TAIL)
+    return bytes(data)
+
+
+def make_stream(count: int, corrupt_rate: float = 0.0, partial_rate: float = 0.0, seed: int = 0) -> SyntheticStream:
+    """
+    生成包含count帧有效数据的串口数据流，其中随机插入错误帧和不完整帧（只有前一部分字节的帧）
+    :param count: 有效帧数
+    :param corrupt_rate: 每帧之前插入一帧错误数据的概率
+    :param partial_rate: 每帧之前插入一帧不完整数据的概率
+    :param seed: 随机数种子，相同参数生成相同的数据
+    """
+    rng = random.Random(seed)
+    stream = SyntheticStream(b'')
+    parts = []
+    for i in range(count):
+        frame = make_frame(rng, i)
+        if rng.random() < corrupt_rate:
+            parts.append(corrupt_frame(rng, make_frame(rng, i)))
+            stream.corrupted += 1
+        if rng.random() < partial_rate:
+            parts.append(make_frame(rng, i)[:rng.randrange(1, FRAME_LENGTH)])
+            stream.partial += 1
+        parts.append(frame)
+        stream.frames.append(frame)
+    stream.data = b''.join(parts)
+    return stream
@@ -8,7 +8,7 @@ from fastapi.responses import HTMLResponse
 
 # 导入自定义库
 from app import create_app
-from app.settings import STATIC_DIR
+from app.settings import STATIC_DIR, load_app_settings
 
 
 # 定义全局变量
@@ -24,4 +24,5 @@ def index():
 # 启动服务
 if __name__ == "__main__":
     # uvicorn.run("main:app", port=8000, reload=False)
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True,
+                ws_per_message_deflate=load_app_settings().WEBSOCKET.PER_MESSAGE_DEFLATE)
@@ -0,0 +1,55 @@
+# 导入系统库
+import unittest
+import struct
+import sys
+import os
+import typing
+from datetime import date
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.services.file.file_opt import read_serial_data_from_file
+from app.cores.banknote_model import decode_banknote, BanknoteInfo, BanknoteRecord, BANKNOTE_STRUCT
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_data')
+
+
+class TestBanknoteModel(unittest.TestCase):
+    def setUp(self):
+        # 去掉起始标志和消息长度，得到帧消息体
+        self.body = read_serial_data_from_file(os.path.join(TEST_DATA_DIR, 'Log1.TXT'))[6:]
+
+    def test_struct_size(self):
+        self.assertEqual(BANKNOTE_STRUCT.size, 1644)
+
+    def test_decode(self):
+        record = decode_banknote(memoryview(self.body))
+        self.assertEqual(record.currency_code, 'CNY')
+        self.assertEqual(record.parsed_currency, '人民币')
+        self.assertEqual(record.valuta, 100)
+        self.assertEqual(record.parsed_date, date(2000, 10, 18))
+        self.assertEqual(record.serial_number.strip(), 'AB66547379')
+        self.assertEqual(len(record.image), 1536)
+        # 解析结果会被缓存
+        self.assertIs(record.serial_number, record.serial_number)
+
+    def test_parsed_date_annotation(self):
+        # 返回类型是日期，不是同名的date字段
+        for cls in (BanknoteInfo, BanknoteRecord):
+            self.assertIs(typing.get_type_hints(cls.parsed_date.fget)['return'], date)
+
+    def test_invalid_currency(self):
+        body = bytearray(self.body)
+        struct.pack_into('<H', body, 2 + 18, ord('1'))
+        with self.assertRaises(ValueError):
+            decode_banknote(body)
+
+    def test_short_data(self):
+        with self.assertRaises(struct.error):
+            decode_banknote(self.body[:100])
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,97 @@
+# 导入系统库
+import unittest
+import asyncio
+import threading
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.services.websocket.broadcast_hub import BroadcastHub
+from app.services.websocket.websocket_manager import WebSocketClient, COALESCE
+
+
+class TestBroadcastHub(unittest.TestCase):
+    def test_publish_from_thread(self):
+        async def run():
+            hub = BroadcastHub()
+            clients = [WebSocketClient(i, None) for i in range(2)]
+            for client in clients:
+                hub.subscribe(client)
+            thread = threading.Thread(target=lambda: [hub.publish({'id': i}) for i in range(5)])
+            thread.start()
+            thread.join()
+            return [await asyncio.wait_for(client.get_batch(10), 1) for client in clients]
+
+        # 每个客户端都收到全部消息
+        for messages in asyncio.run(run()):
+            self.assertEqual([message['id'] for message in messages], list(range(5)))
+
+    def test_publish_before_bind(self):
+        async def run():
+            hub.bind(asyncio.get_running_loop())
+            client = WebSocketClient(1, None)
+            hub.subscribe(client)
+            return await asyncio.wait_for(client.get_batch(10), 1)
+
+        # 事件循环启动前发布的消息在绑定后投递
+        hub = BroadcastHub()
+        hub.publish({'id': 0})
+        self.assertEqual(asyncio.run(run()), [{'id': 0}])
+
+
+class TestWebSocketClient(unittest.TestCase):
+    def test_drop_oldest(self):
+        async def run():
+            for i in range(5):
+                client.push({'id': i})
+            return await client.get_batch(2), await client.get_batch(10)
+
+        client = WebSocketClient(1, None, buffer_size=3)
+        first, rest = asyncio.run(run())
+        self.assertEqual([message['id'] for message in first + rest], [2, 3, 4])
+        self.assertEqual(len(first), 2)
+        self.assertEqual(client.dropped_count, 2)
+        self.assertEqual(client.sent_count, 3)
+
+    def test_coalesce(self):
+        client = WebSocketClient(1, None, buffer_size=3, policy=COALESCE, coalesce_types=['warning'])
+        client.push({'type': 'serial_data', 'data': 1})
+        for i in range(3):
+            client.push({'type': 'warning', 'data': i})
+        client.push({'type': 'serial_data', 'data': 2})
+        messages = asyncio.run(client.get_batch(10))
+        self.assertEqual(messages, [
+            {'type': 'serial_data', 'data': 1},
+            {'type': 'warning', 'data': 2},
+            {'type': 'serial_data', 'data': 2},
+        ])
+        self.assertEqual(client.coalesced_count, 2)
+        self.assertEqual(client.dropped_count, 0)
+
+    def test_coalesce_per_job_and_device(self):
+        client = WebSocketClient(1, None, buffer_size=10, policy=COALESCE,
+                                 coalesce_types=['warning', 'export_progress'])
+        client.push({'type': 'export_progress', 'data': {'id': 'a', 'status': 'running', 'done': 1}})
+        client.push({'type': 'export_progress', 'data': {'id': 'b', 'status': 'done', 'done': 5}})
+        client.push({'type': 'export_progress', 'data': {'id': 'a', 'status': 'done', 'done': 3}})
+        client.push({'type': 'warning', 'device': 'COM1', 'data': 'x'})
+        client.push({'type': 'warning', 'device': 'COM2', 'data': 'y'})
+        client.push({'type': 'warning', 'device': 'COM1', 'data': 'z'})
+        messages = asyncio.run(client.get_batch(10))
+        # 一个任务的结束消息不会被另一个任务的进度覆盖
+        self.assertEqual([(message['data']['id'], message['data']['status']) for message in messages[:2]],
+                         [('a', 'done'), ('b', 'done')])
+        self.assertEqual([(message['device'], message['data']) for message in messages[2:]],
+                         [('COM1', 'z'), ('COM2', 'y')])
+        self.assertEqual(client.coalesced_count, 2)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            WebSocketClient(1, None, policy='block')
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,101 @@
+# 导入系统库
+import unittest
+import sys
+import os
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import Counter, Result
+from app.services.database.counters import ensure_result_counter, get_result_count, RESULT_COUNTER
+
+
+class TestResultCounter(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def add_notes(self, count: int):
+        with self.session_factory() as db:
+            db.add_all([Result(money_flag='CNY', valuta=100, tf_flag=0, sno=f'AB{i:08d}', create_at=datetime(2025, 1, 1))
+                        for i in range(count)])
+            db.commit()
+
+    def counter(self):
+        with self.session_factory() as db:
+            return db.query(Counter.value).filter_by(name=RESULT_COUNTER).scalar()
+
+    def test_created_from_existing_rows(self):
+        self.add_notes(5)
+        ensure_result_counter(self.engine)
+        self.assertEqual(self.counter(), 5)
+        # 重复调用不重新统计，也不重复创建触发器
+        self.add_notes(2)
+        ensure_result_counter(self.engine)
+        self.assertEqual(self.counter(), 7)
+        self.add_notes(1)
+        self.assertEqual(self.counter(), 8)
+
+    def test_insert_and_delete(self):
+        ensure_result_counter(self.engine)
+        self.assertEqual(self.counter(), 0)
+        self.add_notes(3)
+        with self.session_factory() as db:
+            # 批量写入（入库线程使用executemany）
+            db.execute(insert(Result), [{'money_flag': 'USD', 'valuta': 20, 'tf_flag': 1, 'sno': f'CD{i:08d}'}
+                                        for i in range(4)])
+            db.commit()
+            self.assertEqual(get_result_count(db), 7)
+
+            db.delete(db.get(Result, 1))
+            db.execute(delete(Result).where(Result.money_flag == 'USD'))
+            db.commit()
+            self.assertEqual(get_result_count(db), 2)
+
+            # 修改记录不影响计数
+            db.query(Result).update({Result.sno: 'XY00000000'})
+            db.commit()
+            self.assertEqual(get_result_count(db), 2)
+
+            db.execute(delete(Result))
+            db.commit()
+            self.assertEqual(get_result_count(db), 0)
+
+    def test_rollback(self):
+        ensure_result_counter(self.engine)
+        self.add_notes(2)
+        with self.session_factory() as db:
+            db.add(Result(money_flag='CNY', valuta=100, tf_flag=0))
+            db.flush()
+            self.assertEqual(get_result_count(db), 3)
+            db.rollback()
+            self.assertEqual(get_result_count(db), 2)
+
+    def test_missing_counter_falls_back_to_count(self):
+        self.add_notes(3)
+        with self.session_factory() as db:
+            self.assertEqual(get_result_count(db), 3)
+        ensure_result_counter(self.engine)
+        with self.session_factory() as db:
+            db.execute(delete(Counter).where(Counter.name == RESULT_COUNTER))
+            db.commit()
+        # 计数器不存在时触发器不更新任何行，统计仍然准确
+        self.add_notes(2)
+        with self.session_factory() as db:
+            self.assertEqual(get_result_count(db), 5)
+        ensure_result_counter(self.engine)
+        self.assertEqual(self.counter(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# 导入系统库
+import unittest
+import shutil
+import tempfile
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.extensions import config, create_db_engine
+
+
+class TestDbEngine(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.engine = create_db_engine('sqlite:///' + os.path.join(self.temp_dir, 'database.db'))
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def pragmas(self, conn) -> dict:
+        names = ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'temp_store', 'mmap_size')
+        return {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in names}
+
+    def test_pragmas(self):
+        # 连接池中的每个连接建立时都设置存储参数
+        with self.engine.connect() as first, self.engine.connect() as second:
+            for conn in (first, second):
+                pragmas = self.pragmas(conn)
+                self.assertEqual(pragmas['journal_mode'].upper(), config.DB.JOURNAL_MODE)
+                self.assertEqual(pragmas['synchronous'], {'OFF': 0, 'NORMAL': 1, 'FULL': 2}[config.DB.SYNCHRONOUS])
+                self.assertEqual(pragmas['busy_timeout'], int(config.DB.BUSY_TIMEOUT * 1000))
+                self.assertEqual(pragmas['cache_size'], config.DB.CACHE_SIZE)
+                self.assertEqual(pragmas['temp_store'], {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2}[config.DB.TEMP_STORE])
+                # 不支持内存映射的平台上为0
+                self.assertIn(pragmas['mmap_size'], (0, config.DB.MMAP_SIZE))
+
+    def test_pool(self):
+        pool = self.engine.pool
+        self.assertEqual(pool.size(), config.DB.POOL_SIZE)
+        self.assertEqual(pool._max_overflow, config.DB.MAX_OVERFLOW)
+        self.assertEqual(pool._timeout, config.DB.POOL_TIMEOUT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# 导入系统库
+import unittest
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import Result
+from app.services.database.db_writer import BatchWriter
+
+
+class TestBatchWriter(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.events = []
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def count(self) -> int:
+        with self.session_factory() as session:
+            return session.query(Result).count()
+
+    def test_flush_on_stop(self):
+        writer = BatchWriter(self.session_factory, Result, batch_size=50, flush_interval_ms=10000)
+        for i in range(120):
+            self.assertTrue(writer.put({'sno': f'SN{i:08d}', 'money_flag': 'CNY'}))
+        writer.stop()
+        self.assertEqual(self.count(), 120)
+        self.assertEqual(writer.written_count, 120)
+        self.assertGreaterEqual(writer.batch_count, 3)
+
+    def test_bad_row_isolated(self):
+        errors, flushed, dropped = [], [], []
+        writer = BatchWriter(self.session_factory, Result, max_retries=1, retry_interval_ms=1, on_error=errors.append,
+                             on_flush=lambda rows, seconds: flushed.extend(row['sno'] for row in rows),
+                             on_drop=dropped.append)
+        writer.put({'sno': 'GOOD0001'})
+        writer.put({'id': 1, 'sno': 'DUPLICATE'})
+        writer.stop()
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(writer.failed_count, 1)
+        self.assertEqual(len(errors), 1)
+        # 只上报已提交的数据，丢弃的数据交回
+        self.assertEqual(flushed, ['GOOD0001'])
+        self.assertEqual(dropped, [{'id': 1, 'sno': 'DUPLICATE'}])
+
+    def test_prepare_rows_os_error(self):
+        # 写入图像仓库失败（如磁盘已满）时重试，入库线程不退出
+        errors, calls = [], []
+
+        def prepare_rows(session, rows):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise OSError('No space left on device')
+            return rows
+
+        writer = BatchWriter(self.session_factory, Result, max_retries=1, retry_interval_ms=1, on_error=errors.append,
+                             prepare_rows=prepare_rows)
+        writer.put({'sno': 'SN000001'})
+        writer.put({'sno': 'SN000002'})
+        time.sleep(0.7)
+        self.assertTrue(writer._thread.is_alive())
+        writer.stop()
+        self.assertEqual(self.count(), 2)
+        self.assertEqual((writer.failed_count, errors), (0, []))
+
+    def test_prepare_rows_os_error_reported(self):
+        # 持续失败时逐条隔离，通过on_error上报
+        errors = []
+
+        def prepare_rows(session, rows):
+            if any(row['sno'] == 'BAD' for row in rows):
+                raise OSError('Permission denied')
+            return rows
+
+        writer = BatchWriter(self.session_factory, Result, max_retries=1, retry_interval_ms=1, on_error=errors.append,
+                             prepare_rows=prepare_rows)
+        writer.put({'sno': 'GOOD0001'})
+        writer.put({'sno': 'BAD'})
+        writer.stop()
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(writer.failed_count, 1)
+        self.assertEqual(len(errors), 1)
+        self.assertIn('Permission denied', errors[0])
+
+    def test_paused(self):
+        flushed = []
+        writer = BatchWriter(self.session_factory, Result, batch_size=1,
+                             on_flush=lambda rows, seconds: flushed.extend(rows))
+        with writer.paused():
+            writer.put({'sno': 'PAUSED01'})
+            time.sleep(0.2)
+            self.assertEqual((self.count(), flushed), (0, []))
+        writer.stop()
+        self.assertEqual((self.count(), len(flushed)), (1, 1))
+
+    def test_backpressure(self):
+        writer = BatchWriter(self.session_factory, Result, queue_size=10,
+                             on_backpressure=lambda congested, pending, capacity: self.events.append(congested))
+        # 未启动线程时直接写入队列，模拟写入跟不上的情况
+        writer.start = lambda: None
+        for i in range(10):
+            writer.put({'sno': str(i)}, timeout=0)
+        self.assertFalse(writer.put({'sno': 'overflow'}, timeout=0))
+        self.assertEqual(self.events, [True])
+
+    def test_backpressure_concurrent(self):
+        # 多个采集线程和入库线程同时更新背压状态，通知交替出现，不会重复
+        writer = BatchWriter(self.session_factory, Result, batch_size=5, flush_interval_ms=1, queue_size=20,
+                             on_backpressure=lambda congested, pending, capacity: self.events.append(congested))
+
+        def produce(n):
+            for i in range(200):
+                writer.put({'sno': f'{n}-{i}'}, timeout=5)
+
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.stop()
+        self.assertEqual(self.count(), 800)
+        self.assertTrue(self.events)
+        self.assertEqual(self.events, [i % 2 == 0 for i in range(len(self.events))])
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,55 @@
+# 导入系统库
+import unittest
+import sys
+import os
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.cores.serial_ctrl import SerialController
+from app.cores.device_manager import DeviceManager
+
+
+class TestDeviceManager(unittest.TestCase):
+    def setUp(self):
+        # 不打开真实串口，接收线程等待停止
+        patches = [
+            mock.patch.object(SerialController, 'open_connection', lambda controller: True),
+            mock.patch.object(SerialController, 'recv_and_save_data', lambda controller: controller._stopping.wait(5)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.manager = DeviceManager(max_devices=2)
+
+    def tearDown(self):
+        self.manager.stop_all()
+
+    def test_start_and_stop(self):
+        self.assertTrue(self.manager.start({'port': 'COM3'}, owner=1)[0])
+        self.assertTrue(self.manager.start({'port': 'COM4'}, owner=2)[0])
+        # 同一个串口不能重复启动，设备数有上限
+        self.assertFalse(self.manager.start({'port': 'COM3'})[0])
+        self.assertFalse(self.manager.start({'port': 'COM5'})[0])
+
+        stats = {item['device']: item for item in self.manager.stats()}
+        self.assertEqual(set(stats), {'COM3', 'COM4'})
+        self.assertTrue(stats['COM3']['running'])
+
+        self.assertEqual(self.manager.stop_all(owner=1), ['COM3'])
+        self.assertEqual(list(self.manager.sessions), ['COM4'])
+        self.assertFalse(self.manager.stop('COM3'))
+
+    def test_independent_counters(self):
+        self.manager.start({'port': 'COM3'})
+        self.manager.start({'port': 'COM4'})
+        self.manager.sessions['COM3'].controller.push_error('frame error')
+        stats = {item['device']: item for item in self.manager.stats()}
+        self.assertEqual(stats['COM3']['error'], 1)
+        self.assertEqual(stats['COM4']['error'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,156 @@
+# 导入系统库
+import unittest
+import sys
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import Result
+from app.services.database.db_writer import BatchWriter
+from app.services.stats.duplicates import BloomFilter, DuplicateDetector, sno_hash
+
+
+class TestDuplicateDetector(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.dir = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.dir.name, 'sno_filter.bin')
+
+    def tearDown(self):
+        self.dir.cleanup()
+        self.engine.dispose()
+
+    def detector(self, **kwargs) -> DuplicateDetector:
+        options = dict(capacity=1000, error_rate=0.01, recent_size=100, state_file=self.state_file)
+        options.update(kwargs)
+        return DuplicateDetector(Result, self.session_factory, **options)
+
+    def add_results(self, *items):
+        with self.session_factory() as db:
+            db.add_all([Result(money_flag=money_flag, sno=sno, create_at=datetime(2025, 1, 1))
+                        for money_flag, sno in items])
+            db.commit()
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(sno_hash(f'AB{i:08d}'))
+        self.assertTrue(all(sno_hash(f'AB{i:08d}') in bloom for i in range(1000)))
+        false_positives = sum(sno_hash(f'CD{i:08d}') in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_check(self):
+        detector = self.detector()
+        self.assertFalse(detector.check('CNY', 'AB12345678'))
+        self.assertTrue(detector.check('CNY', 'AB12345678'))
+        # 不同币种、未识别的冠字号不算重复
+        self.assertFalse(detector.check('USD', 'AB12345678'))
+        self.assertFalse(detector.check('CNY', '**********'))
+        self.assertFalse(detector.check('CNY', '**********'))
+        self.assertEqual(detector.duplicate_count, 1)
+
+        detector.remove('CNY', 'AB12345678')
+        detector.remove('CNY', 'AB12345678')
+        self.assertFalse(detector.check('CNY', 'AB12345678'))
+
+    def test_history_lookup(self):
+        # 超出最近冠字号条数后由点钞记录确认
+        detector = self.detector(recent_size=10)
+        self.add_results(('CNY', 'AB00000000'))
+        with self.session_factory() as db:
+            detector.warm(db)
+        for i in range(1, 50):
+            detector.check('CNY', f'AB{i:08d}')
+        self.assertTrue(detector.check('CNY', 'AB00000000'))
+        self.assertEqual(detector.lookup_count, 1)
+
+    def test_save_and_load(self):
+        self.add_results(('CNY', 'AB00000001'), ('CNY', 'AB00000002'))
+        detector = self.detector()
+        with self.session_factory() as db:
+            self.assertEqual(detector.rebuild(db), 2)
+        detector.save()
+
+        # 重启后只加入水位之后的点钞记录
+        self.add_results(('CNY', 'AB00000003'))
+        loaded = self.detector()
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.watermark, 2)
+        with self.session_factory() as db:
+            self.assertEqual(loaded.warm(db), 1)
+        for sno in ('AB00000001', 'AB00000002', 'AB00000003'):
+            self.assertTrue(loaded.check('CNY', sno))
+        self.assertEqual(loaded.lookup_count, 0)
+
+        # 容量设置改变后需要重新建立
+        self.assertFalse(self.detector(capacity=5000).load())
+
+    def test_rebuild_keeps_checking(self):
+        # 重建期间接收线程仍在查重：使用原索引判断，期间加入或移除的冠字号在替换索引后保留
+        self.add_results(('CNY', 'AB00000001'), ('CNY', 'AB00000002'))
+        detector = self.detector()
+        results = []
+
+        def during_rebuild():
+            results.append(detector.check('CNY', 'AB00000001'))
+            results.append(detector.check('CNY', 'CD00000001'))
+            results.append(detector.check('CNY', 'EF00000001'))
+            detector.remove('CNY', 'EF00000001')
+
+        with self.session_factory() as db:
+            detector.rebuild(db)
+            self.assertEqual(detector.rebuild(HookSession(db, during_rebuild)), 2)
+        self.assertEqual(results, [True, False, False])
+        self.assertTrue(detector.check('CNY', 'CD00000001'))
+        self.assertFalse(detector.check('CNY', 'EF00000001'))
+        self.assertEqual((detector.watermark, detector.lookup_count), (2, 0))
+
+    def test_dropped_note_forgotten(self):
+        # 入库线程最终丢弃的纸币从最近冠字号中移除，再次扫描时不标记为重复
+        from app.cores import serial_ctrl
+        detector = self.detector()
+        self.add_results(('CNY', 'AB00000001'))
+
+        def prepare_rows(session, rows):
+            if any(row['sno'] == 'CD00000001' for row in rows):
+                raise OSError('No space left on device')
+            return rows
+
+        writer = BatchWriter(self.session_factory, Result, max_retries=0, retry_interval_ms=1,
+                             prepare_rows=prepare_rows, on_drop=serial_ctrl.forget_dropped)
+        with mock.patch.object(serial_ctrl, 'duplicates', detector), \
+                mock.patch.object(serial_ctrl.settings.DUPLICATE, 'ENABLED', True):
+            self.assertFalse(detector.check('CNY', 'CD00000001'))
+            writer.put({'money_flag': 'CNY', 'sno': 'CD00000001'})
+            writer.stop()
+        self.assertEqual(writer.failed_count, 1)
+        self.assertFalse(detector.check('CNY', 'CD00000001'))
+        self.assertEqual(detector.lookup_count, 1)
+
+
+# 第一次查询时调用hook，模拟重建过程中其他线程的操作
+class HookSession:
+    def __init__(self, db, hook):
+        self.db = db
+        self.hook = hook
+
+    def execute(self, *args, **kwargs):
+        if self.hook:
+            hook, self.hook = self.hook, None
+            hook()
+        return self.db.execute(*args, **kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# 导入系统库
+import os
+import sys
+import tempfile
+import unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from openpyxl import load_workbook
+
+# 导入自定义库
+from app.services.image.image_store import raw_to_png
+from app.services.export.export_jobs import ExportJobManager, DONE, FAILED
+from app.utils.excel_service import ExcelStreamWriter, image_size
+
+HEADERS = ['Data&Time', 'Currency.', 'S.N.', 'S.N. Image']
+
+
+class TestExcelStreamWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'report.xlsx')
+        self.pngs = [raw_to_png(bytes([i]) * (96 * 16)) for i in range(3)]
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_rows_images_and_widths(self):
+        writer = ExcelStreamWriter(HEADERS, width_sample_rows=10)
+        for i in range(25):
+            png = self.pngs[i % 3] if i != 5 else None
+            writer.append({'Data&Time': '2025-01-01 09:30:00', 'Currency.': 'CNY', 'S.N.': f'SN{i:08d}'},
+                          png, f'ref{i % 3}' if png else None)
+        writer.save(self.path)
+        self.assertFalse(os.path.exists(self.path + '.part'))
+
+        ws = load_workbook(self.path).active
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), HEADERS)
+        self.assertEqual(len(rows), 26)
+        self.assertEqual(rows[1][2], 'SN00000000')
+        self.assertEqual(rows[1][3], '见D2单元格图片')
+        self.assertIsNone(rows[6][3])
+        self.assertEqual(len(ws._images), 24)
+        # 列宽按样本中最长的值计算
+        self.assertEqual(ws.column_dimensions['A'].width, len('2025-01-01 09:30:00') + 2)
+        self.assertGreater(ws.column_dimensions['D'].width, 20)
+
+    def test_image_size_from_png_header(self):
+        self.assertEqual(image_size(self.pngs[0]), (96, 16))
+
+    def test_bad_image(self):
+        writer = ExcelStreamWriter(HEADERS)
+        writer.append({'S.N.': 'SN1'}, b'not an image')
+        writer.save(self.path)
+        rows = list(load_workbook(self.path).active.iter_rows(values_only=True))
+        self.assertEqual(rows[1][3], '图片加载失败')
+
+
+class TestExportJobManager(unittest.TestCase):
+    def test_job_progress(self):
+        events = []
+        manager = ExportJobManager(progress_interval=0, on_progress=lambda job: events.append((job.status, job.done)))
+
+        def export(job):
+            for i in range(1, 4):
+                job.update(i, 3)
+            return '/tmp/report.xlsx'
+
+        job = manager.wait(manager.submit('excel', export).id, timeout=5)
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.to_dict()['file_name'], 'report.xlsx')
+        self.assertEqual(events[0], ('running', 0))
+        self.assertEqual(events[-1], ('done', 3))
+
+        failed = manager.wait(manager.submit('excel', lambda job: 1 / 0).id, timeout=5)
+        self.assertEqual(failed.status, FAILED)
+        self.assertIn('division', failed.error)
+        manager.close()
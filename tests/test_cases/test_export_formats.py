@@ -0,0 +1,95 @@
+# 导入系统库
+import csv
+import gzip
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, time, datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.cores.banknote_model import BANKNOTE_STRUCT, encode_banknote, decode_banknote
+from app.services.image.image_store import raw_to_png, png_to_raw
+from app.services.export.file_writers import (CsvFileWriter, NdjsonGzFileWriter, ParquetFileWriter, FsnFileWriter,
+                                              read_fsn, parquet_available)
+
+COLUMNS = [('id', 'int'), ('create_at', 'datetime'), ('money_flag', 'str'), ('valuta', 'int')]
+ROWS = [(i, datetime(2025, 1, 1, 9, 30, i % 60), 'CNY', 100) for i in range(1200)]
+
+
+class TestExportFileWriters(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir.name, name)
+
+    def write(self, writer):
+        for i in range(0, len(ROWS), 500):
+            writer.write(ROWS[i:i + 500])
+        path = writer.close()
+        self.assertFalse(os.path.exists(path + '.part'))
+        self.assertEqual(writer.row_count, len(ROWS))
+        return path
+
+    def test_csv(self):
+        path = self.write(CsvFileWriter(self.path('a.csv'), [name for name, _ in COLUMNS]))
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['id', 'create_at', 'money_flag', 'valuta'])
+        self.assertEqual(rows[2], ['1', '2025-01-01 09:30:01', 'CNY', '100'])
+        self.assertEqual(len(rows), len(ROWS) + 1)
+
+    def test_ndjson_gz(self):
+        path = self.write(NdjsonGzFileWriter(self.path('a.ndjson.gz'), [name for name, _ in COLUMNS]))
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), len(ROWS))
+        self.assertEqual(json.loads(lines[1]), {'id': 1, 'create_at': '2025-01-01T09:30:01', 'money_flag': 'CNY', 'valuta': 100})
+
+    @unittest.skipUnless(parquet_available(), 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet
+        path = self.write(ParquetFileWriter(self.path('a.parquet'), COLUMNS))
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.num_rows, len(ROWS))
+        self.assertEqual(table.column('money_flag')[0].as_py(), 'CNY')
+
+    def test_abort_removes_partial_file(self):
+        with self.assertRaises(RuntimeError):
+            with CsvFileWriter(self.path('b.csv'), ['id']) as writer:
+                writer.write([(1,)])
+                raise RuntimeError('failed')
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_fsn_roundtrip(self):
+        image = bytes(range(96)) * 16
+        record = encode_banknote(date(2025, 3, 8), time(14, 5, 30), 1, 100, 7, 'CNY', 2019, 0, 10,
+                                 'AB12345678', 'GT-0001', 0, image)
+        self.assertEqual(len(record), BANKNOTE_STRUCT.size)
+
+        writer = FsnFileWriter(self.path('a.fsn'), BANKNOTE_STRUCT.size)
+        writer.write([record, encode_banknote(None, None, 0, 50, 1, 'USD', 1, 0, 0, '', '', 0)])
+        records = list(read_fsn(writer.close()))
+        self.assertEqual(len(records), 2)
+
+        info = decode_banknote(records[0], 0)
+        self.assertEqual(info.parsed_date, date(2025, 3, 8))
+        self.assertEqual(info.parsed_time, (14, 5, 30))
+        self.assertEqual(info.currency_code, 'CNY')
+        self.assertEqual(info.serial_number.strip(), 'AB12345678')
+        self.assertEqual(info.machine_number_text.rstrip('\x00'), 'GT-0001')
+        self.assertEqual(info.image, image)
+        self.assertEqual(decode_banknote(records[1], 0).image, bytes(96 * 16))
+
+    def test_png_to_raw(self):
+        image = bytes(range(96)) * 16
+        self.assertEqual(png_to_raw(raw_to_png(image)), image)
+        self.assertIsNone(png_to_raw(b'not a png'))
@@ -0,0 +1,62 @@
+# 导入系统库
+import unittest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.services.file.file_opt import read_serial_data_from_file
+from app.services.serial.frame_parser import FrameParser, FRAME_LENGTH, MSG_LENGTH
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_data')
+
+
+class TestFrameParser(unittest.TestCase):
+    def setUp(self):
+        self.frame = read_serial_data_from_file(os.path.join(TEST_DATA_DIR, 'Log1.TXT'))
+        self.errors = []
+        self.parser = FrameParser(on_error=self.errors.append)
+
+    def test_frame_length(self):
+        self.assertEqual(len(self.frame), FRAME_LENGTH)
+
+    def test_whole_frame(self):
+        frames = [bytes(frame) for frame in self.parser.feed(self.frame)]
+        self.assertEqual(frames, [self.frame[6:]])
+        self.assertEqual(len(frames[0]), MSG_LENGTH)
+        self.assertEqual(self.errors, [])
+
+    def test_split_chunks(self):
+        # 按任意大小切分数据块
+        data = self.frame * 3
+        frames = []
+        for i in range(0, len(data), 7):
+            frames.extend(bytes(frame) for frame in self.parser.feed(data[i:i + 7]))
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(self.parser.buffered, 0)
+
+    def test_resync_after_garbage(self):
+        # 错误数据后面的有效帧不能被丢弃
+        data = b'\x01\x02\xAE\xAE' + self.frame[:100] + self.frame + self.frame
+        frames = [bytes(frame) for frame in self.parser.feed(data)]
+        self.assertEqual(len(frames), 2)
+        self.assertGreater(self.parser.resync_count, 0)
+        self.assertTrue(self.errors)
+
+    def test_bad_end_flag(self):
+        broken = self.frame[:-1] + b'\x00'
+        frames = [bytes(frame) for frame in self.parser.feed(broken + self.frame)]
+        self.assertEqual(frames, [self.frame[6:]])
+
+    def test_buffer_reuse(self):
+        # 数据量远大于缓冲区容量时仍然可以逐帧解析
+        parser = FrameParser(capacity=FRAME_LENGTH * 2)
+        count = sum(1 for _ in parser.feed(self.frame * 50))
+        self.assertEqual(count, 50)
+        self.assertEqual(parser.frame_count, 50)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,52 @@
+# 导入系统库
+import unittest
+import asyncio
+import base64
+import io
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from PIL import Image
+
+# 导入自定义库
+from app.services.image.image_encoder import ImageEncoder
+from app.services.image.image_saver import add_bmp_headers
+from app.services.image.image_store import IMAGE_SIZE
+
+
+class TestImageEncoder(unittest.TestCase):
+    def setUp(self):
+        self.encoder = ImageEncoder(max_workers=1, cache_size=2)
+        self.image = bytes(range(256)) * (IMAGE_SIZE // 256)
+
+    def tearDown(self):
+        self.encoder.close()
+
+    def test_same_pixels_as_bmp_path(self):
+        # 直接编码的PNG与原来经过BMP转换的图像像素一致
+        new = self.encoder.encode_base64(self.image)
+        old_pixels = Image.open(io.BytesIO(add_bmp_headers(self.image))).convert('L').tobytes()
+        new_pixels = Image.open(io.BytesIO(base64.b64decode(new))).tobytes()
+        self.assertEqual(old_pixels, new_pixels)
+        self.assertEqual(new_pixels, self.image)
+
+    def test_lru_cache(self):
+        images = [bytes([i]) * IMAGE_SIZE for i in range(3)]
+        for image in images + images[2:]:
+            self.encoder.encode_png(image)
+        self.assertEqual(self.encoder.miss_count, 3)
+        self.assertEqual(self.encoder.hit_count, 1)
+        # 容量为2，最早的图像已被淘汰
+        self.assertIsNone(self.encoder.get(self.encoder.digest(images[0])))
+
+    def test_async(self):
+        first = asyncio.run(self.encoder.encode_base64_async(self.image))
+        second = asyncio.run(self.encoder.encode_base64_async(self.image))
+        self.assertEqual(first, second)
+        self.assertEqual(self.encoder.hit_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
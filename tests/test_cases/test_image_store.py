@@ -0,0 +1,112 @@
+# 导入系统库
+import unittest
+import shutil
+import subprocess
+import tempfile
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import ImageBlob
+from app.services.image.image_store import ImageStore, ImageStoreConfig, IMAGE_SIZE, raw_to_png
+
+
+class TestImageStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        # 每个包文件只能放下两张图像
+        self.store = ImageStore(ImageBlob, ImageStoreConfig(base_dir=self.temp_dir, max_pack_size=IMAGE_SIZE * 2))
+
+    def tearDown(self):
+        self.store.close()
+        self.engine.dispose()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_dedupe_and_read(self):
+        images = [bytes([i]) * IMAGE_SIZE for i in (1, 2, 1, 3)]
+        with self.session_factory() as session:
+            rows = self.store.prepare_rows(session, [{'sno': str(i), 'image': image} for i, image in enumerate(images)])
+            session.commit()
+
+            self.assertNotIn('image', rows[0])
+            self.assertEqual(rows[0]['image_ref'], rows[2]['image_ref'])
+            self.assertEqual(session.query(ImageBlob).count(), 3)
+            self.assertEqual(sorted(os.listdir(self.temp_dir)), ['pack-00001.pack', 'pack-00002.pack'])
+
+            for row, image in zip(rows, images):
+                self.assertEqual(self.store.read(session, row['image_ref']), image)
+            refs = [row['image_ref'] for row in rows]
+            self.assertEqual(len(self.store.read_many(session, refs)), 3)
+            self.assertIsNone(self.store.read(session, '0' * 32))
+
+    def test_prepare_rows_again(self):
+        # 重试时再次处理同一批数据不会重复写入
+        rows = [{'sno': 'A', 'image': b'\x05' * IMAGE_SIZE}]
+        for _ in range(2):
+            with self.session_factory() as session:
+                self.store.prepare_rows(session, rows)
+                session.commit()
+        self.assertEqual(os.path.getsize(os.path.join(self.temp_dir, 'pack-00001.pack')), IMAGE_SIZE)
+        self.assertIn('image', rows[0])
+
+    def test_retry_after_rollback(self):
+        # 入库事务失败后重试同一批数据，复用已写入的位置，包文件不增长
+        rows = [{'sno': str(i), 'image': bytes([i]) * IMAGE_SIZE} for i in (1, 2)]
+        pack = os.path.join(self.temp_dir, 'pack-00001.pack')
+        for _ in range(3):
+            with self.session_factory() as session:
+                self.store.prepare_rows(session, rows)
+                session.rollback()
+        self.assertEqual(os.path.getsize(pack), IMAGE_SIZE * 2)
+        with self.session_factory() as session:
+            prepared = self.store.prepare_rows(session, rows)
+            session.commit()
+            self.assertEqual(os.path.getsize(pack), IMAGE_SIZE * 2)
+            for row, image in zip(prepared, (bytes([1]) * IMAGE_SIZE, bytes([2]) * IMAGE_SIZE)):
+                self.assertEqual(self.store.read(session, row['image_ref']), image)
+        # 已提交的图像不再保留位置
+        with self.session_factory() as session:
+            self.store.prepare_rows(session, rows)
+        self.assertEqual(len(self.store._written), 0)
+
+    def test_written_size(self):
+        store = ImageStore(ImageBlob, ImageStoreConfig(base_dir=self.temp_dir, written_size=2))
+        self.addCleanup(store.close)
+        with self.session_factory() as session:
+            store.prepare_rows(session, [{'image': bytes([i]) * IMAGE_SIZE} for i in range(5)])
+            session.rollback()
+        self.assertEqual(len(store._written), 2)
+
+    def test_raw_to_png(self):
+        self.assertTrue(raw_to_png(b'\x00' * IMAGE_SIZE).startswith(b'\x89PNG'))
+
+
+class TestImageStoreImport(unittest.TestCase):
+    def test_not_created_on_import(self):
+        # 导入串口控制器模块时不打开图像仓库，仓库目录在应用启动时创建
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        base_dir = os.path.join(temp_dir, 'images')
+        code = (
+            "import sys, app.extensions as extensions\n"
+            f"extensions.config.IMAGE_STORE.BASE_DIR = {base_dir!r}\n"
+            "import app.cores.serial_ctrl\n"
+            "sys.exit(0 if extensions.image_store is None else 1)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertFalse(os.path.exists(base_dir))
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
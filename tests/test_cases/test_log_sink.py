@@ -0,0 +1,87 @@
+# 导入系统库
+import unittest
+import json
+import shutil
+import tempfile
+import sys
+import os
+import time
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from loguru import logger
+
+# 导入自定义库
+from app.services.log.log_sink import LogFilter, setup_logging
+
+
+class TestLogSink(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'log.log')
+
+    def tearDown(self):
+        logger.remove()
+        logger.add(sys.stderr)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def read_lines(self):
+        with open(self.path, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def test_module_levels(self):
+        log_filter = LogFilter('INFO', {'serial': 'WARNING', 'app.apis': 'DEBUG'})
+        self.assertEqual(log_filter.module_level('app.services.serial.serial_transport'), logger.level('WARNING').no)
+        self.assertEqual(log_filter.module_level('app.apis.data_ctrl_api'), logger.level('DEBUG').no)
+        self.assertEqual(log_filter.module_level('app.cores.money'), logger.level('INFO').no)
+        self.assertEqual(log_filter.min_level_no, logger.level('DEBUG').no)
+
+    def test_enqueued_json_with_rate_limit(self):
+        sink = setup_logging('INFO', path=self.path, json_format=True, rate_limit_interval=60, rate_limit_burst=2)
+        for i in range(5):
+            logger.warning(f"recv header failed {i}")
+        logger.debug("hidden")
+        logger.info("done")
+        sink.drain()
+        lines = [json.loads(line) for line in self.read_lines()]
+        self.assertEqual([line['message'] for line in lines], ['recv header failed 0', 'recv header failed 1', 'done'])
+        self.assertEqual(lines[0]['level'], 'WARNING')
+        self.assertEqual(sink.filter.suppressed_count, 3)
+
+    def test_bounded_queue(self):
+        sink = setup_logging('INFO', fmt='{message}', path=self.path, queue_size=1, rate_limit_burst=0)
+        # 写入线程被阻塞时队列只能放下一条，其余丢弃
+        with sink._lock:
+            for i in range(50):
+                logger.info(f"note {i}")
+        sink.drain()
+        logger.remove()
+        lines = self.read_lines()
+        self.assertGreater(sink.dropped_count, 0)
+        self.assertIn(f"log queue is full, {sink.dropped_count} log messages dropped", lines)
+
+    def test_wakeup_on_new_records(self):
+        sink = setup_logging('INFO', fmt='{message}', path=self.path, rate_limit_burst=0)
+        logger.info("first")
+        sink.drain()
+        # 队列为空时写入线程等待唤醒，不定时轮询
+        time.sleep(0.1)
+        self.assertFalse(sink._wakeup.is_set())
+        with mock.patch.object(sink._wakeup, 'set', wraps=sink._wakeup.set) as wakeup:
+            # 写入线程被阻塞时队列不为空，之后的日志不再唤醒
+            with sink._lock:
+                for i in range(50):
+                    logger.info(f"note {i}")
+            sink.drain()
+            self.assertLessEqual(wakeup.call_count, 2)
+        self.assertEqual(self.read_lines(), ['first'] + [f"note {i}" for i in range(50)])
+        # 停止时唤醒等待中的写入线程
+        started = time.monotonic()
+        logger.remove()
+        self.assertFalse(sink._thread.is_alive())
+        self.assertLess(time.monotonic() - started, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# 导入系统库
+import unittest
+import json
+import sys
+import os
+from datetime import date, datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.services.websocket.message_codec import encode_notes, decode_notes, note_to_json
+
+
+def make_note(sno: str) -> dict:
+    return {
+        'date': date(2000, 10, 18),
+        'time': (3, 6, 36),
+        'tf_flag': 1,
+        'valuta': 100,
+        'fsn_count': 2645,
+        'money_flag': 'CNY',
+        'ver': 2005,
+        'undefine': 100,
+        'char_num': 12,
+        'sno': sno,
+        'machine_number': '',
+        'reserve1': 9,
+        'image': bytes(range(256)) * 6,
+        'currency_name': '人民币',
+        'create_at': datetime(2025, 3, 15, 11, 52, 43),
+    }
+
+
+class TestMessageCodec(unittest.TestCase):
+    def test_round_trip(self):
+        notes = decode_notes(encode_notes([
+            {'type': 'serial_data', 'device': 'COM3', 'data': make_note('AB66547379')},
+            {'type': 'serial_data', 'device': 'COM4', 'data': dict(make_note('W302B26632'), duplicate=True)},
+        ]))
+        self.assertEqual(len(notes), 2)
+        note = notes[1]
+        self.assertEqual(note['sno'], 'W302B26632')
+        self.assertEqual(note['device'], 'COM4')
+        self.assertEqual(note['date'], (2000, 10, 18))
+        self.assertEqual(note['time'], (3, 6, 36))
+        self.assertEqual(note['valuta'], 100)
+        self.assertEqual(note['money_flag'], 'CNY')
+        self.assertEqual(note['currency_name'], '人民币')
+        self.assertEqual(note['image'], make_note('')['image'])
+        self.assertEqual(note['create_at'], datetime(2025, 3, 15, 11, 52, 43).timestamp())
+        self.assertTrue(note['duplicate'])
+        self.assertFalse(notes[0]['duplicate'])
+
+    def test_smaller_than_json(self):
+        note = make_note('AB66547379')
+        binary = encode_notes([{'type': 'serial_data', 'device': 'COM3', 'data': note}])
+        # JSON格式的图像是base64编码的PNG，这里只按原始像素base64估算，二进制格式仍然更小
+        text = json.dumps(note_to_json(note, 'A' * (len(note['image']) * 4 // 3)), ensure_ascii=False)
+        self.assertLess(len(binary), len(text.encode()))
+
+    def test_json_format(self):
+        data = note_to_json(make_note('AB66547379'), 'png')
+        self.assertEqual(data['date'], '2000-10-18')
+        self.assertEqual(data['time'], '(3, 6, 36)')
+        self.assertEqual(data['valuta'], '100')
+        self.assertEqual(data['create_at'], '2025-03-15 11:52:43')
+        self.assertEqual(data['image_data'], 'png')
+        self.assertNotIn('image', data)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
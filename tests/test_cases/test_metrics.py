@@ -0,0 +1,83 @@
+# 导入系统库
+import unittest
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.services.metrics.metrics import Metric, MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_render(self):
+        notes = self.registry.counter('notes_total', 'Notes', ['device', 'stage'])
+        notes.labels('COM1', 'recv').inc()
+        notes.labels(device='COM1', stage='recv').inc(2)
+        self.assertIs(self.registry.counter('notes_total', 'Notes', ['device', 'stage']), notes)
+        text = self.registry.render()
+        self.assertIn('# TYPE notes_total counter', text)
+        self.assertIn('notes_total{device="COM1",stage="recv"} 3', text)
+        with self.assertRaises(ValueError):
+            notes.labels('COM1')
+
+    def test_histogram(self):
+        latency = self.registry.histogram('latency_seconds', 'Latency', buckets=(0.001, 0.01, 0.1))
+        for value in (0.0005, 0.005, 0.005, 0.05, 1.0):
+            latency.observe(value)
+        lines = self.registry.render().splitlines()
+        self.assertIn('latency_seconds_bucket{le="0.001"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="0.01"} 3', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 5', lines)
+        self.assertIn('latency_seconds_count 5', lines)
+        snapshot = self.registry.snapshot()['latency_seconds']['value']
+        self.assertEqual(snapshot['count'], 5)
+        self.assertTrue(0.001 <= snapshot['p50'] <= 0.01)
+
+    def test_callback(self):
+        pending = [3]
+        self.registry.callback('queue_pending', 'Pending', lambda: [((), pending[0])])
+        self.assertIn('queue_pending 3', self.registry.render())
+        pending[0] = 5
+        self.assertEqual(self.registry.snapshot()['queue_pending'], {'value': 5})
+
+    def test_histogram_render_consistent(self):
+        # 输出期间其他线程仍在记录，每次输出的分桶累计、总和与次数一致
+        latency = self.registry.histogram('latency_seconds', 'Latency', buckets=(0.001, 0.01, 0.1))
+        stopping = threading.Event()
+
+        def observe():
+            while not stopping.is_set():
+                latency.observe(0.005)
+
+        thread = threading.Thread(target=observe)
+        thread.start()
+        try:
+            for _ in range(200):
+                lines = dict(line.rsplit(' ', 1) for line in latency.render())
+                count = int(lines['latency_seconds_count'])
+                self.assertEqual(int(lines['latency_seconds_bucket{le="+Inf"}']), count)
+                self.assertAlmostEqual(float(lines['latency_seconds_sum']), count * 0.005)
+        finally:
+            stopping.set()
+            thread.join()
+
+    def test_metric_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Metric('untyped', 'Untyped')
+
+        class Incomplete(Metric):
+            def _new_child(self):
+                return None
+
+        with self.assertRaises(TypeError):
+            Incomplete('incomplete', 'Incomplete')
+
+
+if __name__ == '__main__':
+    unittest.main()
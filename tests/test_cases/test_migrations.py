@@ -0,0 +1,75 @@
+# 导入系统库
+import unittest
+import shutil
+import tempfile
+import sys
+import os
+from datetime import date, time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine, inspect
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import Result
+from app.services.database.migrations import ResultMigration, LEGACY_TABLE, SCHEMA_VERSION, get_schema_version
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_data')
+
+
+class TestResultMigration(unittest.TestCase):
+    def setUp(self):
+        # 复制版本1的数据库，避免修改测试数据
+        self.temp_dir = tempfile.mkdtemp()
+        db_file = os.path.join(self.temp_dir, 'database.db')
+        shutil.copy(os.path.join(TEST_DATA_DIR, 'database.db'), db_file)
+        self.engine = create_engine(f'sqlite:///{db_file}')
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_upgrade(self):
+        migration = ResultMigration(self.engine, Result, batch_size=100, pause=0)
+        migration.prepare()
+        Base.metadata.create_all(bind=self.engine)
+        migration.start()
+        migration._thread.join()
+
+        with self.engine.connect() as conn:
+            self.assertEqual(get_schema_version(conn), SCHEMA_VERSION)
+            self.assertNotIn(LEGACY_TABLE, inspect(conn).get_table_names())
+            index_names = {index['name'] for index in inspect(conn).get_indexes('result')}
+            self.assertIn('ix_result_create_at_tf_flag', index_names)
+            row = conn.execute(Result.__table__.select().where(Result.id == 1)).mappings().one()
+            count = conn.exec_driver_sql('SELECT count(*) FROM result').scalar()
+
+        self.assertEqual(count, 657)
+        self.assertEqual(row['date'], date(2000, 10, 24))
+        self.assertEqual(row['time'], time(22, 50, 30))
+        self.assertEqual(row['tf_flag'], 0)
+        self.assertEqual(row['valuta'], 1)
+
+    def test_upgrade_twice(self):
+        # 已升级的数据库不再处理
+        migrations = []
+        for _ in range(2):
+            migration = ResultMigration(self.engine, Result, batch_size=100, pause=0)
+            migration.prepare()
+            Base.metadata.create_all(bind=self.engine)
+            migration.start()
+            # 等待后台迁移完成后再次升级
+            if migration._thread is not None:
+                migration._thread.join()
+            migrations.append(migration)
+        self.assertEqual(migrations[0].migrated_count, 657)
+        self.assertEqual(migrations[1].migrated_count, 0)
+        self.assertIsNone(migrations[1]._thread)
+        with self.engine.connect() as conn:
+            self.assertNotIn(LEGACY_TABLE, inspect(conn).get_table_names())
+            self.assertEqual(conn.exec_driver_sql('SELECT count(*) FROM result').scalar(), 657)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,82 @@
+# 导入系统库
+import unittest
+import tempfile
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from app.services.file.file_opt import read_serial_data_from_file
+from app.services.serial.data_source import ReplayDataSource, parse_speed
+from app.services.serial.frame_parser import FrameParser
+from app.services.serial.serial_model import SerialParameters
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_data')
+
+
+def replay_all(source: ReplayDataSource) -> bytes:
+    data = b''
+    while True:
+        try:
+            data += source.read_available(1000)
+        except EOFError:
+            return data
+
+
+class TestReplayDataSource(unittest.TestCase):
+    def setUp(self):
+        self.frame = read_serial_data_from_file(os.path.join(TEST_DATA_DIR, 'Log1.TXT'))
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_speed(self):
+        self.assertEqual(parse_speed('original'), 1.0)
+        self.assertEqual(parse_speed('max'), 0.0)
+        self.assertEqual(parse_speed('2.5'), 2.5)
+        with self.assertRaises(ValueError):
+            parse_speed(-1)
+
+    def test_hex_file(self):
+        source = ReplayDataSource(os.path.join(TEST_DATA_DIR, 'Log1.TXT'), speed='max')
+        self.assertTrue(source.open_connection())
+        frames = list(FrameParser().feed(replay_all(source)))
+        self.assertEqual(len(frames), 1)
+        source.close_connection()
+        self.assertFalse(source.is_connected())
+
+    def test_raw_file_mmap(self):
+        path = os.path.join(self.tmp.name, 'capture.bin')
+        with open(path, 'wb') as f:
+            f.write(self.frame * 5)
+        source = ReplayDataSource(path, speed='max')
+        self.assertTrue(source.open_connection())
+        self.assertEqual(replay_all(source), self.frame * 5)
+        self.assertEqual(source.replayed_bytes, len(self.frame) * 5)
+        source.close_connection()
+
+    def test_paced_replay(self):
+        # 115200波特率下原始速度约11520字节/秒，10倍速回放5帧（约8.3KB）约需0.07秒
+        path = os.path.join(self.tmp.name, 'capture.bin')
+        with open(path, 'wb') as f:
+            f.write(self.frame * 5)
+        source = ReplayDataSource(path, speed=10, read_timeout=0.05)
+        source.set_serial_parm(SerialParameters(port='replay', baudrate=115200))
+        self.assertTrue(source.open_connection())
+        started_at = time.monotonic()
+        self.assertEqual(replay_all(source), self.frame * 5)
+        self.assertGreater(time.monotonic() - started_at, 0.05)
+        source.close_connection()
+
+    def test_missing_file(self):
+        source = ReplayDataSource(os.path.join(self.tmp.name, 'missing.bin'))
+        self.assertFalse(source.open_connection())
+        self.assertFalse(source.is_connected())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,287 @@
+# 导入系统库
+import unittest
+import sys
+import os
+import base64
+import tempfile
+from datetime import datetime
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi import HTTPException
+from starlette.requests import Request
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import ArchivePartition, Counter, Result, RollupDay, Summary
+from app.services.database.counters import ensure_result_counter, RESULT_COUNTER
+from app.services.database.rollups import ensure_rollups, query_rollups
+from app.services.database.retention import (ArchiveStore, RetentionManager, delete_in_batches, add_months,
+                                              OPEN, SEALED, COMPRESSED)
+from app.schemas.money import SearchSchema
+from app.services.stats.aggregator import SummaryAggregator
+from app.services.stats.duplicates import DuplicateDetector
+
+NOW = datetime(2025, 6, 15)
+
+
+class RetentionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        ensure_result_counter(self.engine)
+        ensure_rollups(self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = ArchiveStore(Result, self.dir.name, cache_size=1)
+        with self.session_factory() as db:
+            for month, count in ((1, 30), (2, 20), (6, 10)):
+                db.add_all([Result(money_flag='CNY', valuta=100, tf_flag=0, machine_number='M1',
+                                   sno=f'AB{month}{i:07d}', create_at=datetime(2025, month, 1 + i % 28, 9, 30))
+                            for i in range(count)])
+            db.commit()
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+        self.engine.dispose()
+
+    def manager(self, **kwargs) -> RetentionManager:
+        options = dict(hot_months=2, compress_after_months=0, retention_months=0, batch_size=7, pause=0)
+        options.update(kwargs)
+        return RetentionManager(self.engine, Result, ArchivePartition, self.store, **options)
+
+    def total(self) -> int:
+        with self.engine.connect() as conn:
+            rows, _ = query_rollups(conn, datetime(2025, 1, 1), datetime(2026, 1, 1))
+        return rows[0]['count'] if rows else 0
+
+
+class TestRetention(RetentionTestCase):
+    def test_add_months(self):
+        self.assertEqual(add_months(datetime(2025, 1, 1), -2), datetime(2024, 11, 1))
+        self.assertEqual(add_months(datetime(2025, 11, 1), 3), datetime(2026, 2, 1))
+
+    def test_archive(self):
+        manager = self.manager()
+        stats = manager.run_once(NOW)
+        self.assertEqual((stats['archived'], stats['sealed']), (50, 2))
+        with self.session_factory() as db:
+            self.assertEqual(db.query(Result).count(), 10)
+            self.assertEqual(db.query(Counter.value).filter_by(name=RESULT_COUNTER).scalar(), 10)
+            partitions = manager.partitions(db)
+            self.assertEqual([(p.month, p.row_count, p.state) for p in partitions],
+                             [('2025-02', 20, SEALED), ('2025-01', 30, SEALED)])
+            self.assertEqual([p.month for p in manager.partitions(db, datetime(2025, 1, 5), datetime(2025, 1, 6))],
+                             ['2025-01'])
+            with manager.session(partitions[0]) as session:
+                self.assertEqual(session.query(Result).count(), 20)
+        # 归档的记录仍计入预汇总
+        self.assertEqual(self.total(), 60)
+        self.assertEqual(manager.floor(), datetime(2025, 3, 1))
+        self.assertEqual(manager.run_once(NOW)['archived'], 0)
+
+    def test_compress_and_delete_record(self):
+        manager = self.manager(compress_after_months=4)
+        self.assertEqual(manager.run_once(NOW)['compressed'], 1)
+        self.assertTrue(os.path.exists(self.store.path('2025-01', True)))
+        self.assertFalse(os.path.exists(self.store.path('2025-01')))
+        with self.session_factory() as db:
+            partition = manager.partitions(db)[-1]
+            self.assertEqual(partition.state, COMPRESSED)
+            with manager.session(partition) as session:
+                record_id = session.query(Result.id).order_by(Result.id).first()[0]
+
+        row = manager.delete_record(record_id)
+        self.assertEqual(row['sno'], 'AB10000000')
+        self.assertIsNone(manager.delete_record(record_id))
+        self.assertEqual(self.total(), 59)
+        with self.session_factory() as db:
+            partition = manager.partitions(db)[-1]
+            self.assertEqual((partition.state, partition.row_count), (SEALED, 29))
+
+    def test_purge(self):
+        self.manager().run_once(NOW)
+        manager = self.manager(retention_months=4)
+        self.assertEqual(manager.run_once(NOW)['purged'], 30)
+        with self.session_factory() as db:
+            self.assertEqual([p.month for p in manager.partitions(db)], ['2025-02'])
+        self.assertFalse(os.path.exists(self.store.path('2025-01')))
+        self.assertEqual(self.total(), 30)
+
+    def test_delete_in_batches(self):
+        self.assertEqual(delete_in_batches(self.engine, 'id <= :max_id', {'max_id': 40}, batch_size=7, pause=0), 40)
+        with self.session_factory() as db:
+            self.assertEqual(db.query(Result).count(), 20)
+        self.assertEqual(self.total(), 20)
+
+    def test_duplicates_in_archive(self):
+        manager = self.manager(compress_after_months=4)
+        manager.run_once(NOW)
+        detector = DuplicateDetector(Result, self.session_factory, capacity=1000, error_rate=0.01, recent_size=5,
+                                     archives=manager.archive_sessions)
+        with self.session_factory() as db:
+            # 归档分区（含已压缩的1月）的冠字号也加入索引
+            self.assertEqual(detector.rebuild(db), 60)
+        # 超出最近冠字号条数后按冠字号查询result表和各归档分区确认
+        self.assertTrue(detector.check('CNY', 'AB10000005'))
+        self.assertTrue(detector.check('CNY', 'AB20000005'))
+        self.assertTrue(detector.check('CNY', 'AB60000005'))
+        self.assertFalse(detector.check('USD', 'AB10000006'))
+        self.assertGreaterEqual(detector.lookup_count, 3)
+
+    def test_summary_rebuild_keeps_archived_days(self):
+        manager = self.manager()
+        manager.run_once(NOW)
+        aggregator = SummaryAggregator(Summary, self.session_factory, flush_interval=60)
+        with self.session_factory() as db:
+            aggregator.rebuild(db, Result, floor=manager.floor(), rollup_model=RollupDay)
+        aggregator.stop()
+        self.assertEqual(aggregator.count(('day', '2025-01-02', 'CNY', 100, 0)), 2)
+        self.assertEqual(aggregator.count(('day', '2025-06-02', 'CNY', 100, 0)), 1)
+        self.assertEqual(aggregator.count(('machine', 'M1', 'CNY', 100, 0)), 60)
+
+
+# 跨分区的接口（归档后1月已压缩、2月已整理、6月在result表中）
+class TestArchiveQueries(RetentionTestCase):
+    def setUp(self):
+        super().setUp()
+        from app import extensions
+        with self.session_factory() as db:
+            db.query(Result).filter_by(id=3).update({'image_data': base64.b64encode(b'png-3').decode('ascii')})
+            db.commit()
+        self.retention = self.manager(compress_after_months=4)
+        self.retention.run_once(NOW)
+        self.aggregator = SummaryAggregator(Summary, self.session_factory, flush_interval=60)
+        self.detector = DuplicateDetector(Result, self.session_factory, capacity=1000, error_rate=0.01,
+                                          archives=self.retention.archive_sessions)
+        patches = [
+            mock.patch.object(extensions, 'retention_manager', self.retention),
+            mock.patch.object(extensions, 'summary_aggregator', self.aggregator),
+            mock.patch.object(extensions, 'duplicate_detector', self.detector),
+            mock.patch('app.cores.money.engine', self.engine),
+            mock.patch('app.cores.money.SessionLocal', self.session_factory),
+            mock.patch('app.cores.export.SessionLocal', self.session_factory),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.aggregator.stop)
+
+    def search(self, **kwargs) -> SearchSchema:
+        return SearchSchema(**dict({'q': '', 'code': 'all'}, **kwargs))
+
+    def test_open_partition_not_counted_twice(self):
+        from app.cores import export, money
+        # 模拟2月的最后一批已写入归档文件、尚未从result表删除（归档中断）
+        with self.store.session('2025-02') as session:
+            rows = [dict(row) for row in session.execute(select(Result.__table__).order_by(Result.id.desc()).limit(5))
+                    .mappings()]
+        with self.session_factory() as db:
+            db.execute(insert(Result.__table__), rows)
+            db.query(ArchivePartition).filter_by(month='2025-02').update(
+                {'state': OPEN, 'row_count': 15, 'max_id': min(row['id'] for row in rows) - 1})
+            db.commit()
+            data = self.search(date_range=['2025-02-01 00:00:00', '2025-02-28 23:59:59'])
+            self.assertEqual(export.count_search(data, db), 20)
+            self.assertEqual(sum(len(rows) for rows in export.iter_column_chunks(data, db, ['id'], 7)), 20)
+            self.assertEqual(money.searchMoney(data, db)['total'], 20)
+            self.assertEqual(money.getMoneyPages(0, 100, db)['total'], 60)
+            self.assertEqual(len(money.getMoneyPages(0, 100, db)['data']), 60)
+
+    def test_pages_across_partitions(self):
+        from app.cores import money
+        with self.session_factory() as db:
+            # 按偏移量翻页：跳过整个1月分区，跨越2月分区和result表的边界
+            page = money.getMoneyPages(45, 10, db)
+            self.assertEqual([row['id'] for row in page['data']], list(range(46, 56)))
+            self.assertEqual((page['total'], page['next_cursor']), (60, 55))
+            page = money.getMoneyPages(25, 10, db)
+            self.assertEqual([row['id'] for row in page['data']], list(range(26, 36)))
+            # 按游标翻页与按偏移量结果相同
+            page = money.getMoneyPages(0, 10, db, after=45)
+            self.assertEqual([row['id'] for row in page['data']], list(range(46, 56)))
+            page = money.getMoneyPages(0, 10, db, after=page['next_cursor'])
+            self.assertEqual([row['id'] for row in page['data']], list(range(56, 61)))
+            self.assertIsNone(page['next_cursor'])
+
+    def test_search_archived_month(self):
+        from app.cores import money
+        data = self.search(date_range=['2025-01-01 00:00:00', '2025-01-31 23:59:59'])
+        with self.session_factory() as db:
+            # 只打开1月的分区
+            self.assertEqual([partition.month for partition in money.search_partitions(data, db)], ['2025-01'])
+            result = money.searchMoney(data, db)
+            self.assertEqual([row['id'] for row in result['data']], list(range(30, 0, -1)))
+            # 归档分区按LIKE查询冠字号
+            result = money.searchMoney(self.search(q='AB1000002', date_range=data.date_range), db)
+            self.assertEqual([row['sno'] for row in result['data']],
+                             ['AB10000029', 'AB10000028', 'AB10000027', 'AB10000026', 'AB10000025',
+                              'AB10000024', 'AB10000023', 'AB10000022', 'AB10000021', 'AB10000020'])
+
+    def test_search_merge_by_id(self):
+        from app.cores import money
+        with self.session_factory() as db:
+            # 按id倒序合并result表和各分区，每页15条，依次跨越result表/2月、2月/1月的边界
+            ids, cursor = [], None
+            while True:
+                result = money.searchMoney(self.search(limit=15, cursor=cursor), db)
+                ids.append([row['id'] for row in result['data']])
+                cursor = result['next_cursor']
+                if cursor is None:
+                    break
+            self.assertEqual(ids[0], list(range(60, 45, -1)))
+            self.assertEqual(ids[1], list(range(45, 30, -1)))
+            self.assertEqual(sum(ids, []), list(range(60, 0, -1)))
+            # 流式返回与分页结果一致
+            chunks = list(money.iter_search_chunks(self.search(limit=25), db, size=10))
+            self.assertEqual([item.id for items in chunks for item in items], list(range(60, 35, -1)))
+
+    def test_delete_and_image_in_compressed_partition(self):
+        from app.cores import money
+        request = Request({'type': 'http', 'headers': []})
+        with self.session_factory() as db:
+            self.assertEqual(self.retention.find(db, 3).state, COMPRESSED)
+            response = money.getMoneyImage(3, request, db)
+            self.assertEqual(response.body, b'png-3')
+            self.assertEqual(money.deleteMoney(4, db), {'detail': '删除成功'})
+            with self.assertRaises(HTTPException) as context:
+                money.deleteMoney(4, db)
+            self.assertEqual(context.exception.status_code, 404)
+            partition = self.retention.find(db, 3)
+            self.assertEqual((partition.state, partition.row_count), (SEALED, 29))
+            self.assertEqual(money.getMoneyImage(3, request, db).body, b'png-3')
+        self.assertEqual(self.total(), 59)
+
+    def test_export_counts(self):
+        from app.cores import export
+        with self.session_factory() as db:
+            self.assertEqual(export.count_search(self.search(), db), 60)
+            data = self.search(date_range=['2025-02-01 00:00:00', '2025-06-30 23:59:59'])
+            self.assertEqual(export.count_search(data, db), 30)
+            rows = [row for rows in export.iter_column_chunks(data, db, ['id', 'sno'], 7) for row in rows]
+            self.assertEqual([row[0] for row in rows], list(range(60, 30, -1)))
+            self.assertEqual(export.count_search(self.search(q='AB2000001'), db), 10)
+
+    def test_delete_all(self):
+        from app.cores import money
+        from app.extensions import get_export_jobs
+        with self.session_factory() as db:
+            self.aggregator.rebuild(db, Result, floor=self.retention.floor(), rollup_model=RollupDay)
+            result = money.deleteAllMoney(db)
+        job = get_export_jobs().wait(result['job']['id'], 10)
+        self.assertEqual((job.status, job.kind, job.done), ('done', 'delete', 10))
+        with self.session_factory() as db:
+            self.assertEqual(db.query(Result).count(), 0)
+            self.assertEqual(db.query(Counter.value).filter_by(name=RESULT_COUNTER).scalar(), 0)
+            self.assertEqual(self.retention.partitions(db), [])
+        self.assertEqual(self.total(), 0)
+        self.assertEqual(self.aggregator.snapshot('machine'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# 导入系统库
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import Result, RollupDay, RollupHour, RollupMinute
+from app.services.database.rollups import ensure_rollups, clear_rollups, plan_query, query_rollups, RollupRebuilder
+
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def add_notes(self):
+        with self.session_factory() as db:
+            for i in range(6):
+                db.add(Result(money_flag='CNY', valuta=100, tf_flag=0, machine_number='M1',
+                              create_at=datetime(2025, 1, 1, 9, 30, 15) + timedelta(minutes=20 * i)))
+            db.add(Result(money_flag='USD', valuta=20, tf_flag=1, machine_number='M2',
+                          create_at=datetime(2025, 1, 2, 23, 59, 59)))
+            db.commit()
+
+    def query(self, start, end, interval=None, group_by=(), filters=None):
+        with self.engine.connect() as conn:
+            return query_rollups(conn, start, end, interval, group_by, filters)
+
+    def test_plan_uses_coarsest_grain(self):
+        plan = plan_query(datetime(2025, 1, 1, 9, 30, 15), datetime(2025, 3, 1))
+        self.assertEqual([source for source, _, _ in plan], ['result', 'minute', 'hour', 'day'])
+        self.assertEqual(plan[-1][1:], (datetime(2025, 1, 2), datetime(2025, 3, 1)))
+        # 按小时分段时不能使用天粒度
+        plan = plan_query(datetime(2025, 1, 1), datetime(2025, 1, 3), 'hour')
+        self.assertEqual(plan, [('hour', datetime(2025, 1, 1), datetime(2025, 1, 3))])
+
+    def test_triggers_maintain_rollups(self):
+        ensure_rollups(self.engine)
+        self.add_notes()
+        with self.session_factory() as db:
+            self.assertEqual(db.query(RollupMinute).count(), 7)
+            self.assertEqual(db.query(RollupHour).count(), 4)
+            self.assertEqual({(row.bucket, row.count) for row in db.query(RollupDay)},
+                             {('2025-01-01 00:00:00', 6), ('2025-01-02 00:00:00', 1)})
+
+            db.query(Result).filter(Result.money_flag == 'USD').delete()
+            db.commit()
+            self.assertEqual(db.query(RollupDay).filter(RollupDay.money_flag == 'USD').one().count, 0)
+
+    def test_query(self):
+        ensure_rollups(self.engine)
+        self.add_notes()
+        rows, plan = self.query(datetime(2025, 1, 1), datetime(2026, 1, 1), group_by=['money_flag'])
+        self.assertEqual(rows, [{'bucket': None, 'money_flag': 'CNY', 'count': 6, 'amount': 600},
+                                {'bucket': None, 'money_flag': 'USD', 'count': 1, 'amount': 20}])
+        self.assertEqual([piece['source'] for piece in plan], ['day'])
+
+        rows, _ = self.query(datetime(2025, 1, 1, 9, 50, 15), datetime(2025, 1, 1, 11, 10, 15), 'hour',
+                             filters={'machine_number': 'M1'})
+        self.assertEqual(rows, [{'bucket': '2025-01-01 09:00:00', 'count': 1, 'amount': 100},
+                                {'bucket': '2025-01-01 10:00:00', 'count': 3, 'amount': 300}])
+
+    def test_rebuild(self):
+        self.add_notes()
+        self.assertTrue(ensure_rollups(self.engine))
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO rollup_day VALUES ('2024-01-01 00:00:00', 'M1', 'CNY', 100, 0, 9)"))
+        rebuilder = RollupRebuilder(self.engine, pause=0)
+        rebuilder.request()
+        rebuilder.wait(5)
+        self.assertEqual(rebuilder.rebuild_count, 1)
+        self.assertFalse(ensure_rollups(self.engine))
+        rows, _ = self.query(datetime(2024, 1, 1), datetime(2026, 1, 1), 'day')
+        self.assertEqual([(row['bucket'], row['count']) for row in rows],
+                         [('2025-01-01 00:00:00', 6), ('2025-01-02 00:00:00', 1)])
+
+        with self.engine.begin() as conn:
+            clear_rollups(conn)
+            conn.execute(text('DELETE FROM result'))
+        self.assertEqual(self.query(datetime(2024, 1, 1), datetime(2026, 1, 1))[0], [])
@@ -0,0 +1,124 @@
+# 导入系统库
+import asyncio
+import json
+import unittest
+import sys
+import os
+from datetime import datetime
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import Result
+from app.schemas.money import SearchSchema, MAX_SEARCH_LIMIT
+from app.cores import money
+
+NOTE_TIME = datetime(2025, 3, 1, 9, 30)
+
+
+class TestSearchCursor(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        # 没有归档分区，只查询result表
+        retention = mock.Mock()
+        retention.partitions.return_value = []
+        patches = [
+            mock.patch.object(money, 'get_retention_manager', lambda: retention),
+            mock.patch.object(money, 'SessionLocal', self.session_factory),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        # 多条记录的创建时间相同（同一秒内点钞）
+        with self.session_factory() as db:
+            db.add_all([Result(money_flag='CNY', valuta=100, tf_flag=i % 2, machine_number='M1', sno=f'AB{i:08d}',
+                               create_at=NOTE_TIME if i % 3 else datetime(2025, 3, 1, 9, i))
+                        for i in range(1, 26)])
+            db.commit()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def search(self, **kwargs) -> SearchSchema:
+        return SearchSchema(**dict({'q': '', 'code': 'all'}, **kwargs))
+
+    def test_limit_bounds(self):
+        for limit in (0, -1, MAX_SEARCH_LIMIT + 1):
+            with self.assertRaises(ValidationError):
+                self.search(limit=limit)
+        self.assertEqual(self.search(limit=MAX_SEARCH_LIMIT).limit, MAX_SEARCH_LIMIT)
+        self.assertIsNone(self.search().limit)
+
+    def test_cursor_pages(self):
+        ids, cursors = [], []
+        cursor = None
+        with self.session_factory() as db:
+            while True:
+                page = money.searchMoney(self.search(cursor=cursor, limit=10), db)
+                ids.extend(row['id'] for row in page['data'])
+                cursor = page['next_cursor']
+                cursors.append(cursor)
+                if cursor is None:
+                    break
+        # 按id倒序翻页，创建时间相同的记录不会重复或遗漏
+        self.assertEqual(ids, list(range(25, 0, -1)))
+        self.assertEqual(cursors, [16, 6, None])
+
+    def test_full_last_page(self):
+        with self.session_factory() as db:
+            page = money.searchMoney(self.search(cursor=11, limit=10), db)
+            self.assertEqual([row['id'] for row in page['data']], list(range(10, 0, -1)))
+            # 本页已满时返回游标，下一页为空
+            self.assertEqual(page['next_cursor'], 1)
+            page = money.searchMoney(self.search(cursor=1, limit=10), db)
+            self.assertEqual((page['data'], page['total'], page['next_cursor']), ([], 0, None))
+
+    def test_cursor_with_filters(self):
+        data = self.search(date_range=['2025-03-01 09:30:00', '2025-03-01 09:30:00'], code='1', cursor=20, limit=3)
+        with self.session_factory() as db:
+            page = money.searchMoney(data, db)
+        self.assertEqual([row['id'] for row in page['data']], [19, 17, 13])
+        self.assertEqual(page['next_cursor'], 13)
+
+    def test_chunks(self):
+        with self.session_factory() as db:
+            chunks = list(money.iter_search_chunks(self.search(cursor=20, limit=9), db, size=4))
+        self.assertEqual([[item.id for item in items] for items in chunks],
+                         [[19, 18, 17, 16], [15, 14, 13, 12], [11]])
+
+    def stream(self, data: SearchSchema) -> list:
+        response = money.searchMoney(data, None)
+        self.assertEqual(response.media_type, 'application/x-ndjson')
+
+        async def read():
+            return ''.join([chunk async for chunk in response.body_iterator])
+
+        return [json.loads(line) for line in asyncio.run(read()).splitlines()]
+
+    def test_stream(self):
+        rows = self.stream(self.search(stream=True))
+        self.assertEqual([row['id'] for row in rows], list(range(25, 0, -1)))
+        self.assertEqual(rows[0]['create_at'], NOTE_TIME.isoformat())
+        self.assertEqual(rows[0]['image_url'], f"{money.config.APP.GLOBAL_API_PREFIX}/money/image/25")
+        # 流式返回同样支持游标和条数
+        rows = self.stream(self.search(stream=True, cursor=20, limit=7))
+        self.assertEqual([row['id'] for row in rows], list(range(19, 12, -1)))
+
+    def test_stream_validates_before_response(self):
+        with self.assertRaises(HTTPException) as context:
+            money.searchMoney(self.search(stream=True, date_range=['bad', 'range']), None)
+        self.assertEqual(context.exception.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+# 导入系统库
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from benchmarks.synthetic_frames import make_frame
+from app.cores import serial_ctrl
+from app.cores.serial_ctrl import SerialController
+from app.services.serial.serial_transport import AsyncSerialReader, SerialEventLoop
+
+
+# 模拟串口：数据写入缓冲区，同时通过socket通知可读（支持add_reader）
+class FakePort:
+    def __init__(self):
+        self._signal, self._notify = socket.socketpair()
+        self._signal.setblocking(False)
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self.is_open = True
+
+    def fileno(self) -> int:
+        return self._signal.fileno()
+
+    def feed(self, data: bytes):
+        with self._cond:
+            self._buffer += data
+            self._cond.notify_all()
+        self._notify.send(b'\0')
+
+    @property
+    def in_waiting(self) -> int:
+        with self._cond:
+            return len(self._buffer)
+
+    def read(self, size: int) -> bytes:
+        with self._cond:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        # 清除可读通知
+        try:
+            while self._signal.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        return data
+
+    def wait(self, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._buffer, timeout)
+
+    def close(self):
+        self.is_open = False
+        self._signal.close()
+        self._notify.close()
+
+
+# 没有文件描述符的串口（Windows的COM口），读取器在线程池中读取
+class NoFdPort(FakePort):
+    def fileno(self) -> int:
+        raise ValueError("no fileno")
+
+
+# 模拟串口通信对象（SerialCommunication中读取器和控制器用到的接口）
+class FakeCommunication:
+    def __init__(self, port: FakePort, read_timeout: float = 0.05):
+        self.serial_conn = port
+        self.read_timeout = read_timeout
+
+    def read_available(self, max_size: int = 4096) -> bytes:
+        port = self.serial_conn
+        if not port.wait(self.read_timeout):
+            return b''
+        return port.read(min(port.in_waiting, max_size))
+
+    def is_connected(self) -> bool:
+        return self.serial_conn.is_open
+
+    def close_connection(self):
+        self.serial_conn.is_open = False
+
+
+class TestSerialEventLoop(unittest.TestCase):
+    def setUp(self):
+        self.serial_loop = SerialEventLoop()
+        self.addCleanup(self.serial_loop.stop)
+
+    def test_run_and_restart(self):
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+
+        self.assertEqual(self.serial_loop.run(add(1, 2), timeout=2), 3)
+        loop = self.serial_loop.loop
+        self.serial_loop.stop()
+        self.assertTrue(loop.is_closed())
+        self.assertIsNone(self.serial_loop.loop)
+        # 停止后再次使用时重新启动
+        self.assertEqual(self.serial_loop.run(add(2, 3), timeout=2), 5)
+        self.assertIsNot(self.serial_loop.loop, loop)
+
+    def test_spawn_and_cancel(self):
+        started = threading.Event()
+
+        async def forever():
+            started.set()
+            await asyncio.sleep(3600)
+
+        task = self.serial_loop.spawn(forever())
+        self.assertTrue(started.wait(2))
+        self.assertFalse(task.done())
+        self.serial_loop.cancel(task)
+        self.assertTrue(task.cancelled())
+
+
+class TestAsyncSerialReader(unittest.TestCase):
+    def setUp(self):
+        self.serial_loop = SerialEventLoop()
+        self.addCleanup(self.serial_loop.stop)
+
+    def read_twice(self, port: FakePort):
+        reader = AsyncSerialReader(FakeCommunication(port), max_size=4)
+
+        async def read():
+            reader.open()
+            try:
+                fd = reader._fd
+                port.feed(b'abcdef')
+                first = await reader.read(1.0)
+                second = await reader.read(1.0)
+                # 没有数据时超时返回空数据
+                empty = await reader.read(0.05)
+                return fd, first, second, empty
+            finally:
+                reader.close()
+
+        try:
+            return self.serial_loop.run(read(), timeout=5)
+        finally:
+            port.close()
+
+    def test_read_with_fd(self):
+        fd, first, second, empty = self.read_twice(FakePort())
+        self.assertIsNotNone(fd)
+        # 每次最多读取max_size字节，剩余的数据下次读取
+        self.assertEqual(first, b'abcd')
+        self.assertEqual(second, b'ef')
+        self.assertEqual(empty, b'')
+
+    def test_read_in_thread_pool(self):
+        fd, first, second, empty = self.read_twice(NoFdPort())
+        self.assertIsNone(fd)
+        self.assertEqual(first, b'abcd')
+        self.assertEqual(second, b'ef')
+        self.assertEqual(empty, b'')
+
+
+class TestAsyncRecv(unittest.TestCase):
+    def setUp(self):
+        self.rows = []
+        self.messages = []
+        patches = [
+            mock.patch.object(serial_ctrl.settings.SERIAL, 'READ_TIMEOUT', 0.05),
+            mock.patch.object(serial_ctrl.settings.SERIAL, 'FRAME_TIMEOUT', 0.2),
+            mock.patch.object(serial_ctrl.db_writer, 'put',
+                              lambda row, timeout=None: self.rows.append((row, timeout)) or True),
+            mock.patch.object(serial_ctrl.broadcast_hub, 'publish', self.messages.append),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.serial_loop = SerialEventLoop()
+        self.addCleanup(self.serial_loop.stop)
+        self.port = FakePort()
+        self.addCleanup(self.port.close)
+        self.controller = SerialController(device='FAKE')
+        self.controller.serial_communication = FakeCommunication(self.port)
+        # 记录查重执行的线程
+        self.dedup_threads = []
+        self.controller.check_duplicate = lambda: self.dedup_threads.append(threading.current_thread().name) or True
+
+    def wait_for(self, condition, timeout: float = 3.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_frames_and_partial_frame_timeout(self):
+        controller = self.controller
+        rng = random.Random(1)
+        frames = [make_frame(rng, i) for i in range(3)]
+        task = self.serial_loop.spawn(controller.recv_and_save_data_async())
+        self.addCleanup(self.serial_loop.cancel, task)
+
+        # 两帧完整数据和半帧数据
+        self.port.feed(frames[0] + frames[1] + frames[2][:len(frames[2]) // 2])
+        self.assertTrue(self.wait_for(lambda: controller.save_count == 2))
+        self.assertEqual(controller.frame_parser.buffered, len(frames[2]) // 2)
+        # 入库不等待队列，查重不在串口事件循环线程中执行
+        self.assertEqual([timeout for _, timeout in self.rows], [0, 0])
+        self.assertEqual(len(self.dedup_threads), 2)
+        self.assertNotIn('serial-loop', self.dedup_threads)
+
+        # 超过FRAME_TIMEOUT仍未收齐的帧被丢弃
+        self.assertTrue(self.wait_for(lambda: controller.frame_parser.buffered == 0))
+        self.assertEqual(controller.error_count, 1)
+        self.assertTrue(any('incomplete frame timeout' in str(message.get('data')) for message in self.messages))
+
+        # 之后的完整帧正常解析
+        self.port.feed(frames[2])
+        self.assertTrue(self.wait_for(lambda: controller.save_count == 3))
+
+        controller._stopping.set()
+        self.serial_loop.cancel(task)
+        self.assertTrue(task.done())
+        self.assertEqual(controller.recv_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
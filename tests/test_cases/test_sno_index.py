@@ -0,0 +1,118 @@
+# 导入系统库
+import unittest
+import sys
+import os
+from datetime import datetime
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import Result
+from app.services.database import sno_index
+from app.services.database.sno_index import ensure_sno_index, sno_filter, SNO_INDEX_TABLE
+
+
+class TestSnoIndex(unittest.TestCase):
+    def setUp(self):
+        # 索引是否可用是模块级状态，测试结束后恢复，不影响其他测试的内存数据库
+        patch = mock.patch.object(sno_index, '_index_enabled', False)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def add_notes(self, *snos):
+        with self.session_factory() as db:
+            for sno in snos:
+                db.add(Result(money_flag='CNY', valuta=100, tf_flag=0, sno=sno, create_at=datetime(2025, 1, 1)))
+            db.commit()
+
+    def search(self, q: str, use_index: bool = True):
+        condition = sno_filter(Result, q, use_index=use_index)
+        with self.session_factory() as db:
+            snos = sorted(row.sno for row in db.query(Result).filter(condition))
+        return snos, str(condition.compile(self.engine))
+
+    def test_match(self):
+        # 创建索引前已有的记录在创建时重建索引
+        self.add_notes('AB12345678', 'CD12399999')
+        self.assertTrue(ensure_sno_index(self.engine))
+        self.add_notes('ab98712345', 'XY00000000')
+
+        snos, sql = self.search('1234')
+        self.assertIn('MATCH', sql)
+        self.assertEqual(snos, ['AB12345678', 'ab98712345'])
+        # 不区分大小写，与LIKE一致
+        self.assertEqual(self.search('AB9')[0], ['ab98712345'])
+        # 双引号按普通字符处理
+        self.assertEqual(self.search('"AB')[0], [])
+
+    def test_triggers(self):
+        self.assertTrue(ensure_sno_index(self.engine))
+        # 重复调用不重建
+        self.assertTrue(ensure_sno_index(self.engine))
+        self.add_notes('AB12345678', 'CD12345678')
+        with self.session_factory() as db:
+            db.query(Result).filter(Result.sno == 'AB12345678').delete()
+            db.query(Result).filter(Result.sno == 'CD12345678').update({Result.sno: 'EF00000000'})
+            db.commit()
+            self.assertEqual(db.query(Result).count(), 1)
+        self.assertEqual(self.search('12345')[0], [])
+        self.assertEqual(self.search('F000')[0], ['EF00000000'])
+
+    def test_short_query_uses_like(self):
+        self.assertTrue(ensure_sno_index(self.engine))
+        self.add_notes('AB12345678', 'CD12399999')
+        snos, sql = self.search('12')
+        self.assertNotIn('MATCH', sql)
+        self.assertIn('LIKE', sql)
+        self.assertEqual(snos, ['AB12345678', 'CD12399999'])
+
+    def test_empty_query(self):
+        self.add_notes('AB12345678')
+        snos, sql = self.search('')
+        self.assertNotIn('LIKE', sql)
+        self.assertEqual(snos, ['AB12345678'])
+
+    def test_archive_uses_like(self):
+        # 归档分区没有全文索引
+        self.assertTrue(ensure_sno_index(self.engine))
+        self.add_notes('AB12345678')
+        snos, sql = self.search('1234', use_index=False)
+        self.assertNotIn('MATCH', sql)
+        self.assertEqual(snos, ['AB12345678'])
+
+    def test_fts5_unavailable(self):
+        execute = Connection.exec_driver_sql
+
+        def exec_driver_sql(conn, statement, *args, **kwargs):
+            if 'fts5' in statement:
+                raise OperationalError(statement, {}, Exception('no such module: fts5'))
+            return execute(conn, statement, *args, **kwargs)
+
+        with mock.patch.object(Connection, 'exec_driver_sql', exec_driver_sql):
+            self.assertFalse(ensure_sno_index(self.engine))
+        with self.engine.connect() as conn:
+            self.assertFalse(conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE name = ?", (SNO_INDEX_TABLE,)).fetchall())
+        # 退回LIKE全表扫描，记录仍能写入和查询
+        self.add_notes('AB12345678', 'CD00000000')
+        snos, sql = self.search('1234')
+        self.assertNotIn('MATCH', sql)
+        self.assertEqual(snos, ['AB12345678'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# 导入系统库
+import unittest
+import sys
+import os
+import threading
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 导入自定义库
+from app.extensions import Base
+from app.models import Result, Summary
+from app.services.stats.aggregator import SummaryAggregator
+
+
+class TestSummaryAggregator(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.deltas = []
+        self.aggregator = SummaryAggregator(Summary, self.session_factory, flush_interval=60,
+                                            on_delta=lambda seq, items, reset: self.deltas.append((seq, items, reset)))
+
+    def tearDown(self):
+        self.aggregator.stop()
+        self.engine.dispose()
+
+    def add_notes(self):
+        for _ in range(3):
+            self.aggregator.add('COM1@1', '2025-01-01', 'M1', 'CNY', 100, 0)
+        self.aggregator.add('COM1@1', '2025-01-01', 'M1', 'CNY', 50, 1)
+        self.aggregator.add('COM2@1', '2025-01-01', 'M2', 'USD', 20, 0)
+
+    def test_snapshot(self):
+        self.add_notes()
+        day = self.aggregator.snapshot('day', '2025-01-01')['2025-01-01']
+        self.assertEqual(day['count'], 5)
+        self.assertEqual(day['amount'], 370)
+        self.assertEqual(day['by_currency']['CNY'], {'count': 4, 'amount': 350})
+        self.assertEqual(day['by_tf_flag'], {'0': 4, '1': 1})
+        self.assertEqual(set(self.aggregator.snapshot('machine')), {'M1', 'M2'})
+        self.assertEqual(self.aggregator.snapshot('session', 'COM2@1')['COM2@1']['count'], 1)
+
+    def test_flush_and_load(self):
+        self.add_notes()
+        self.aggregator.flush()
+        seq, items, reset = self.deltas[-1]
+        self.assertEqual(len(items), 9)
+        self.assertFalse(reset)
+
+        # 没有变化时不再写入和推送
+        self.aggregator.flush()
+        self.assertEqual(len(self.deltas), 1)
+
+        loaded = SummaryAggregator(Summary, self.session_factory)
+        with self.session_factory() as db:
+            loaded.load(db)
+        self.assertEqual(loaded.snapshot('day'), self.aggregator.snapshot('day'))
+
+    def test_rebuild_and_remove(self):
+        with self.session_factory() as db:
+            db.add_all([Result(money_flag='CNY', valuta=100, tf_flag=0, machine_number='M1',
+                               create_at=datetime(2025, 1, 1, 9, 30)) for _ in range(4)])
+            db.add(Result(money_flag='CNY', valuta=100, tf_flag=0, machine_number='M1',
+                          create_at=datetime(2025, 1, 2, 9, 30)))
+            db.commit()
+            self.aggregator.rebuild(db, Result)
+        self.assertEqual(self.aggregator.count(('day', '2025-01-01', 'CNY', 100, 0)), 4)
+        self.assertEqual(self.aggregator.count(('machine', 'M1', 'CNY', 100, 0)), 5)
+
+        self.aggregator.remove('2025-01-01', 'M1', 'CNY', 100, 0)
+        self.assertEqual(self.aggregator.count(('day', '2025-01-01', 'CNY', 100, 0)), 3)
+        self.assertEqual(self.aggregator.count(('machine', 'M1', 'CNY', 100, 0)), 4)
+
+    def test_rebuild_keeps_sessions_and_concurrent_adds(self):
+        self.add_notes()
+        with self.session_factory() as db:
+            db.add(Result(money_flag='CNY', valuta=100, tf_flag=0, machine_number='M1',
+                          create_at=datetime(2025, 1, 1, 9, 30)))
+            db.commit()
+
+        # 统计查询进行中另一个线程调用add和remove
+        started, resume = threading.Event(), threading.Event()
+
+        class BlockingSession:
+            def __init__(self, db):
+                self.db = db
+
+            def execute(self, *args, **kwargs):
+                started.set()
+                resume.wait(5)
+                return self.db.execute(*args, **kwargs)
+
+        def rebuild():
+            with self.session_factory() as db:
+                self.aggregator.rebuild(BlockingSession(db), Result)
+
+        thread = threading.Thread(target=rebuild)
+        thread.start()
+        started.wait(5)
+        for _ in range(200):
+            self.aggregator.add('COM1@1', '2025-01-01', 'M1', 'CNY', 100, 0)
+        self.aggregator.remove('2025-01-01', 'M1', 'CNY', 100, 0)
+        resume.set()
+        thread.join(5)
+
+        # 会话级别不受影响；日期和机具编号级别 = 点钞记录(1) + 变化(+200 -1)
+        self.assertEqual(self.aggregator.count(('session', 'COM1@1', 'CNY', 100, 0)), 203)
+        self.assertEqual(self.aggregator.count(('day', '2025-01-01', 'CNY', 100, 0)), 200)
+        self.assertEqual(self.aggregator.count(('machine', 'M1', 'CNY', 100, 0)), 200)
+        # 点钞记录中没有的条目置为0
+        self.assertEqual(self.aggregator.count(('machine', 'M2', 'USD', 20, 0)), 0)
+        self.aggregator.flush()
+        loaded = SummaryAggregator(Summary, self.session_factory)
+        with self.session_factory() as db:
+            loaded.load(db)
+        self.assertEqual(loaded.snapshot('day'), self.aggregator.snapshot('day'))
+        self.assertEqual(loaded.snapshot('session'), self.aggregator.snapshot('session'))
+
+    def test_clear(self):
+        self.add_notes()
+        self.aggregator.flush()
+        with self.session_factory() as db:
+            self.aggregator.clear(db)
+            db.commit()
+            self.assertEqual(db.query(Summary).count(), 0)
+        self.assertEqual(self.aggregator.snapshot('day'), {})
+        self.assertTrue(self.deltas[-1][2])
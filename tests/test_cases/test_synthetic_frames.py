@@ -0,0 +1,38 @@
+# 导入系统库
+import unittest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+
+# 导入自定义库
+from benchmarks.synthetic_frames import make_stream
+from app.cores.banknote_model import decode_banknote
+from app.services.serial.frame_parser import FrameParser, FRAME_LENGTH
+
+
+class TestSyntheticFrames(unittest.TestCase):
+    def test_valid_frames(self):
+        stream = make_stream(20, seed=1)
+        self.assertEqual(len(stream.data), FRAME_LENGTH * 20)
+        frames = [decode_banknote(frame) for frame in FrameParser().feed(stream.data)]
+        self.assertEqual(len(frames), 20)
+        self.assertEqual(len({frame.serial_number for frame in frames}), 20)
+
+    def test_corrupted_and_partial_frames(self):
+        # 错误帧和不完整帧被丢弃，有效帧全部解析出来
+        stream = make_stream(200, corrupt_rate=0.2, partial_rate=0.2, seed=2)
+        self.assertGreater(stream.corrupted, 0)
+        self.assertGreater(stream.partial, 0)
+        parser = FrameParser()
+        frames = [bytes(frame) for frame in parser.feed(stream.data)]
+        self.assertEqual(frames, [frame[6:] for frame in stream.frames])
+        self.assertGreater(parser.resync_count, 0)
+
+    def test_reproducible(self):
+        self.assertEqual(make_stream(5, 0.5, 0.5, seed=3).data, make_stream(5, 0.5, 0.5, seed=3).data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# 导入系统库
+import unittest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 导入第三方库
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+# 导入自定义库
+from app.extensions import get_ws_manager, get_rdbms
+from app.apis import ws_ctrl_api
+from app.services.websocket.broadcast_hub import BroadcastHub
+from app.services.websocket.websocket_manager import WebSocketManager, COALESCE
+
+
+class TestWebSocketApi(unittest.TestCase):
+    def setUp(self):
+        self.manager = WebSocketManager(BroadcastHub())
+        app = FastAPI()
+        app.include_router(ws_ctrl_api.router)
+        app.dependency_overrides[get_ws_manager] = lambda: self.manager
+        app.dependency_overrides[get_rdbms] = lambda: None
+        self.client = TestClient(app)
+
+    def test_unknown_policy_rejected(self):
+        with self.assertRaises(WebSocketDisconnect) as context:
+            with self.client.websocket_connect('/ws?policy=block'):
+                pass
+        self.assertEqual(context.exception.code, 1008)
+        self.assertEqual(self.manager.clients, {})
+
+    def test_policy(self):
+        with self.client.websocket_connect(f'/ws?policy={COALESCE}') as websocket:
+            self.assertEqual([client.policy for client in self.manager.clients.values()], [COALESCE])
+            websocket.send_json({'cmd': 'heart'})
+            self.assertEqual(websocket.receive_json(), {'type': 'heart', 'data': 'pong'})
+
+
+if __name__ == '__main__':
+    unittest.main()